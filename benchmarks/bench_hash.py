@@ -0,0 +1,50 @@
+"""Block hashing benchmark
+
+Compares hashing the concatenated serialization of a block, as get_hash did
+before, with feeding its parts to the hasher. Run with:
+
+    python -m benchmarks.bench_hash
+"""
+import hashlib
+import timeit
+from ucn.block.data.basic_block import BasicBlock
+from ucn.block.store.base_store import BaseBlockStore
+
+SIZES = [64 * 1024, 1024 * 1024, 8 * 1024 * 1024, 32 * 1024 * 1024]
+
+
+def concatenated_hash(block: BasicBlock) -> str:
+    block_bin = (
+        b"%b/n" % block.protocol.encode("utf8")
+        + b"%b/n" % block.previous_block_hash.encode("utf8")
+        + b"%b" % block.data
+    )
+    return f"sha256:{hashlib.sha256(block_bin).hexdigest()}"
+
+
+def main():
+    print(f"{'size':>10} {'concatenated':>14} {'streaming':>12} {'speedup':>8}")
+    for size in SIZES:
+        block = BasicBlock(
+            protocol="bench_protocol",
+            previous_block_hash="sha256:" + "0" * 64,
+            data=b"\x5a" * size,
+        )
+        assert concatenated_hash(block) == BaseBlockStore.get_hash(block)
+        number = max(1, 256 * 1024 * 1024 // size)
+        concatenated = min(
+            timeit.repeat(lambda: concatenated_hash(block), number=number, repeat=5)
+        )
+        streaming = min(
+            timeit.repeat(
+                lambda: BaseBlockStore.get_hash(block), number=number, repeat=5
+            )
+        )
+        print(
+            f"{size // 1024:>8}Ki {concatenated / number * 1000:>12.3f}ms "
+            f"{streaming / number * 1000:>10.3f}ms {concatenated / streaming:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
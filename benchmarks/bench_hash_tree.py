@@ -0,0 +1,96 @@
+"""Hash tree construction benchmark
+
+Builds a tree over 10^6 leaves with the digest buffer builder, and compares
+it with the previous construction, which consumed every level by unpacking
+the head of the remaining list, on smaller trees. Also compares the memory
+held by the HashNode map of make_tree with a CompactHashTree, and reports
+the size and verification time of single and batch proofs. Run with:
+
+    python -m benchmarks.bench_hash_tree
+"""
+import os
+import random
+import time
+import tracemalloc
+from ucn.hash_tree.builder import build_levels, hash_leaves, root_hash
+from ucn.hash_tree.compact import CompactHashTree
+from ucn.hash_tree.node import HashNode, make_tree
+from ucn.hash_tree.proof import verify_many
+
+LEAF_COUNT = 10**6
+QUADRATIC_LEAF_COUNTS = [10**3, 10**4, 3 * 10**4]
+
+
+def quadratic_root(data_list: list[bytes]) -> str:
+    node_list = [HashNode.hash(data) for data in sorted(data_list)]
+    hight = 0
+    while len(node_list) > 1:
+        hight += 1
+        base_node_list, node_list = node_list, []
+        while base_node_list:
+            l_node, *base_node_list = base_node_list
+            r_node = None
+            if base_node_list:
+                r_node, *base_node_list = base_node_list
+            node_list.append(HashNode.init_node(hight, l_node, r_node).hash_str)
+    return node_list[0]
+
+
+def buffer_root(data_list: list[bytes]) -> str:
+    return root_hash(build_levels(hash_leaves(data_list)))
+
+
+def main():
+    for count in QUADRATIC_LEAF_COUNTS:
+        data_list = [os.urandom(32) for _ in range(count)]
+        start = time.perf_counter()
+        expected_root = quadratic_root(data_list)
+        quadratic_time = time.perf_counter() - start
+        start = time.perf_counter()
+        assert buffer_root(data_list) == expected_root
+        buffer_time = time.perf_counter() - start
+        print(
+            f"{count:>8} leaves: list unpacking {quadratic_time * 1000:>9.1f}ms, "
+            f"digest buffers {buffer_time * 1000:>7.1f}ms"
+        )
+
+    data_list = [os.urandom(32) for _ in range(LEAF_COUNT)]
+    start = time.perf_counter()
+    leaves = hash_leaves(data_list)
+    leaves_time = time.perf_counter() - start
+    start = time.perf_counter()
+    levels = build_levels(leaves)
+    levels_time = time.perf_counter() - start
+    print(
+        f"{LEAF_COUNT:>8} leaves: leaf hashing {leaves_time * 1000:.1f}ms, "
+        f"levels {levels_time * 1000:.1f}ms, "
+        f"{sum(map(len, levels)) / 2**20:.1f}MiB of digests, root {root_hash(levels)}"
+    )
+
+    for name, build in [
+        ("node map", lambda: make_tree(data_list)[1]),
+        ("compact tree", lambda: CompactHashTree.from_data(data_list)),
+    ]:
+        tracemalloc.start()
+        tree = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del tree
+        print(f"{LEAF_COUNT:>8} leaves: {name} holds {size / 2**20:.1f}MiB")
+
+    data_list.sort()
+    tree = CompactHashTree.from_data(data_list)
+    for proven_count in [1, 100, 10000]:
+        indices = sorted(random.sample(range(LEAF_COUNT), proven_count))
+        proof = tree.prove_many(indices)
+        start = time.perf_counter()
+        assert verify_many(tree.root, [data_list[i] for i in indices], proof)
+        verify_time = time.perf_counter() - start
+        print(
+            f"{proven_count:>8} proven leaves: {len(proof.to_bytes())} bytes, "
+            f"{len(proof.siblings)} siblings, verified in {verify_time * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Block header scan benchmark
+
+Compares scanning a payload-heavy chain with iter_blocks and with
+iter_headers, which never reads the payloads. Run with:
+
+    python -m benchmarks.bench_headers
+"""
+import os
+import tempfile
+import time
+from ucn.block.store.engine import create_block_store_engine
+from ucn.block.store.local_store import LocalBlockStore
+
+BLOCK_COUNT = 1000
+DATA_SIZE = 256 * 1024
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_block_store_engine(os.path.join(directory, "blocks.db"))
+        store = LocalBlockStore(engine)
+        for _ in range(BLOCK_COUNT):
+            store.add_block("bench_protocol", os.urandom(DATA_SIZE))
+
+        start = time.perf_counter()
+        block_links = [block.previous_block_hash for block in store.iter_blocks()]
+        blocks_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        header_links = [header.previous_block_hash for header in store.iter_headers()]
+        headers_time = time.perf_counter() - start
+
+        assert block_links == header_links
+        print(
+            f"{BLOCK_COUNT} blocks of {DATA_SIZE // 1024}Ki: "
+            f"iter_blocks {blocks_time * 1000:.1f}ms, "
+            f"iter_headers {headers_time * 1000:.1f}ms "
+            f"({blocks_time / headers_time:.1f}x)"
+        )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
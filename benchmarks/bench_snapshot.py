@@ -0,0 +1,61 @@
+"""Chain snapshot bootstrap benchmark
+
+Compares building a store by replaying add_block with importing a snapshot
+file, with and without verifying the block hashes, against reading the
+snapshot file. Run with:
+
+    python -m benchmarks.bench_snapshot
+"""
+import os
+import tempfile
+import time
+from ucn.block.store.engine import THROUGHPUT_PROFILE, create_block_store_engine
+from ucn.block.store.local_store import LocalBlockStore
+
+BLOCK_COUNT = 5000
+DATA_SIZE = 16 * 1024
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+
+        def new_store(name):
+            engine = create_block_store_engine(
+                os.path.join(directory, f"{name}.db"), THROUGHPUT_PROFILE
+            )
+            return LocalBlockStore(engine)
+
+        source = new_store("source")
+        data_list = [os.urandom(DATA_SIZE) for _ in range(BLOCK_COUNT)]
+
+        start = time.perf_counter()
+        for data in data_list:
+            source.add_block("bench_protocol", data)
+        timings = {"add_block replay": time.perf_counter() - start}
+
+        path = os.path.join(directory, "chain.snapshot")
+        source.export_chain(path)
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            while f.read(1024 * 1024):
+                pass
+        timings["read snapshot file"] = time.perf_counter() - start
+
+        for verify in (True, False):
+            store = new_store(f"import_{verify}")
+            start = time.perf_counter()
+            store.import_chain(path, verify=verify)
+            timings[f"import_chain(verify={verify})"] = time.perf_counter() - start
+            assert store.get_latest_block_hash() == source.get_latest_block_hash()
+
+        print(f"{BLOCK_COUNT} blocks of {DATA_SIZE // 1024}Ki, {size / 2**20:.1f}MiB")
+        for name, seconds in timings.items():
+            print(
+                f"{name:>28} {seconds * 1000:>9.1f}ms {size / 2**20 / seconds:>8.1f}MiB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
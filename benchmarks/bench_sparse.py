@@ -0,0 +1,68 @@
+"""Sparse Merkle tree update benchmark
+
+Applies the same key updates one at a time and in batches, in memory and in
+the block store database, and reports the number of node hashes each needs
+and the number of nodes stored.
+Run with:
+
+    python -m benchmarks.bench_sparse
+"""
+import time
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.store.models import SMTNodeModel
+from ucn.block.store.state_tree import SQLSMTStorage
+from ucn.hash_tree import sparse
+from ucn.hash_tree.sparse import SparseMerkleTree
+
+KEY_COUNT = 10000
+BATCH_SIZES = [1, 100, 10000]
+
+
+def main():
+    items = {f"ucn://account/{i}": b"balance=%d" % i for i in range(KEY_COUNT)}
+    keys = list(items)
+    hash_count = 0
+    hash_node = sparse._hash_node
+
+    def counting_hash_node(*args):
+        nonlocal hash_count
+        hash_count += 1
+        return hash_node(*args)
+
+    sparse._hash_node = counting_hash_node
+    for backend in ["memory", "sqlite"]:
+        for batch_size in BATCH_SIZES:
+            if backend == "sqlite" and batch_size == 1:
+                continue
+            store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+            hash_count = 0
+            start = time.perf_counter()
+            with Session(store.engine) as session:
+                tree = SparseMerkleTree(
+                    SQLSMTStorage(session, "accounts") if backend == "sqlite" else None
+                )
+                for offset in range(0, KEY_COUNT, batch_size):
+                    tree.update(
+                        {key: items[key] for key in keys[offset : offset + batch_size]}
+                    )
+                session.commit()
+                seconds = time.perf_counter() - start
+                root = tree.root
+                if backend == "sqlite":
+                    node_count = session.scalar(
+                        select(func.count()).select_from(SMTNodeModel)
+                    )
+                else:
+                    node_count = len(tree.storage.nodes)
+            print(
+                f"{backend:>6} batches of {batch_size:>5}: {seconds * 1000:>9.1f}ms, "
+                f"{hash_count} node hashes, {node_count} nodes, root {root}"
+            )
+            store.engine.dispose()
+    sparse._hash_node = hash_node
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Block store benchmark suite
+
+Measures every backend at each chain length and payload size:
+
+    append          add_blocks in batches of --batch-size
+    get_by_hash     get_block of random stored hashes
+    get_by_index    get_block_by_index of random indices
+    tip             get_latest_block_hash and get_block_count
+    scan_blocks     iter_blocks over the whole chain
+    scan_headers    iter_headers over the whole chain
+    truncate        truncate_by_index of the last tenth of the chain
+
+Results are printed and written as JSON, and two result files are compared
+with --compare to catch regressions between releases:
+
+    python -m benchmarks.bench_store --counts 10000 100000 --output new.json
+    python -m benchmarks.bench_store --compare old.json new.json
+
+Runs whose chain would hold more than --max-bytes of payload are skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterator
+import sqlalchemy
+from ucn.block.data.basic_block import BasicBlock
+from ucn.block.store.base_store import BaseBlockStore
+from ucn.block.store.cache_store import CachedBlockStore
+from ucn.block.store.engine import THROUGHPUT_PROFILE, create_block_store_engine
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.store.segment_store import SegmentBlockStore
+
+BACKENDS: dict[str, Callable[[str], BaseBlockStore]] = {
+    "local": lambda directory: LocalBlockStore(
+        create_block_store_engine(
+            os.path.join(directory, "blocks.db"), THROUGHPUT_PROFILE
+        )
+    ),
+    "segment": lambda directory: SegmentBlockStore(directory),
+    "cached": lambda directory: CachedBlockStore(
+        LocalBlockStore(
+            create_block_store_engine(
+                os.path.join(directory, "blocks.db"), THROUGHPUT_PROFILE
+            )
+        )
+    ),
+}
+# Random lookups and tip reads per run
+LOOKUP_COUNT = 1000
+TIP_COUNT = 10000
+
+
+def iter_chain(count: int, data_size: int, batch_size: int) -> Iterator[list]:
+    # Linked batches of blocks with incompressible payloads
+    rng = random.Random(count ^ data_size)
+    pool = rng.randbytes(data_size + 4096)
+    previous_block_hash = ""
+    for batch_start in range(0, count, batch_size):
+        batch = []
+        for i in range(batch_start, min(batch_start + batch_size, count)):
+            offset = i % 4096
+            block = BasicBlock(
+                protocol="bench_protocol",
+                previous_block_hash=previous_block_hash,
+                data=pool[offset : offset + data_size],
+            )
+            previous_block_hash = BaseBlockStore.get_hash(block)
+            batch.append(block)
+        yield batch
+
+
+def run(backend: str, count: int, data_size: int, batch_size: int) -> list[dict]:
+    results = []
+
+    def record(operation: str, ops: int, seconds: float, payload_bytes: int = 0):
+        result = {
+            "backend": backend,
+            "block_count": count,
+            "data_size": data_size,
+            "operation": operation,
+            "ops": ops,
+            "seconds": seconds,
+            "ops_per_second": ops / seconds if seconds else None,
+            "mib_per_second": payload_bytes / 2**20 / seconds if seconds else None,
+        }
+        results.append(result)
+        print(
+            f"{backend:>8} {count:>8} {data_size:>7}B {operation:>13} "
+            f"{result['ops_per_second'] or 0:>12.1f} ops/s"
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = BACKENDS[backend](directory)
+
+        # Only the store calls are timed, not building and hashing the blocks
+        seconds = 0.0
+        for batch in iter_chain(count, data_size, batch_size):
+            start = time.perf_counter()
+            store.add_blocks(batch)
+            seconds += time.perf_counter() - start
+        record("append", count, seconds, count * data_size)
+
+        rng = random.Random(count)
+        indices = [rng.randrange(count) for _ in range(LOOKUP_COUNT)]
+        block_hashes = [store.get_header_by_index(i).block_hash for i in indices]
+
+        start = time.perf_counter()
+        for block_hash in block_hashes:
+            store.get_block(block_hash)
+        record("get_by_hash", LOOKUP_COUNT, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for block_index in indices:
+            store.get_block_by_index(block_index)
+        record("get_by_index", LOOKUP_COUNT, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(TIP_COUNT):
+            store.get_latest_block_hash()
+            store.get_block_count()
+        record("tip", TIP_COUNT, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scanned = sum(1 for _ in store.iter_blocks())
+        record("scan_blocks", scanned, time.perf_counter() - start, count * data_size)
+
+        start = time.perf_counter()
+        scanned = sum(1 for _ in store.iter_headers())
+        record("scan_headers", scanned, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        removed = store.truncate_by_index(count - count // 10)
+        record("truncate", removed, time.perf_counter() - start)
+
+        if hasattr(store, "close"):
+            store.close()
+        elif hasattr(store, "engine"):
+            store.engine.dispose()
+    return results
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> int:
+    # Print operations slower than the baseline by more than threshold, and
+    # return their number
+    def load(path):
+        with open(path) as f:
+            return {
+                (r["backend"], r["block_count"], r["data_size"], r["operation"]): r
+                for r in json.load(f)["results"]
+            }
+
+    baseline = load(baseline_path)
+    regressions = 0
+    for key, result in load(current_path).items():
+        previous = baseline.get(key)
+        if not previous or not previous["ops_per_second"]:
+            continue
+        change = result["ops_per_second"] / previous["ops_per_second"] - 1
+        regressed = change < -threshold
+        regressions += regressed
+        print(
+            f"{' '.join(map(str, key)):>48} {change:>+8.1%}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Block store benchmark suite")
+    parser.add_argument(
+        "--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS)
+    )
+    parser.add_argument(
+        "--counts", nargs="+", type=int, default=[10**4, 10**5, 10**6]
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=[64, 1024, 16384])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-bytes", type=int, default=2 * 1024**3)
+    parser.add_argument("--output", default="bench_store.json")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        help="compare two result files instead of running",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown reported as a regression by --compare",
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare, args.threshold) else 0
+
+    results = []
+    for backend in args.backends:
+        for count in args.counts:
+            for data_size in args.sizes:
+                if count * data_size > args.max_bytes:
+                    print(f"skipping {backend} {count} x {data_size}B")
+                    continue
+                results.extend(run(backend, count, data_size, args.batch_size))
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "metadata": {
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "python": sys.version,
+                    "platform": platform.platform(),
+                    "sqlalchemy": sqlalchemy.__version__,
+                    "sqlite": sqlite3.sqlite_version,
+                },
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import create_engine
+from ucn.block.store.accumulator import verify_block_proof
+from ucn.block.store.local_store import LocalBlockStore
+from .test_local_store import _make_chain
+
+
+@pytest.fixture
+def engine():
+    """Provide an in-memory database shared by the stores of a test."""
+    return create_engine("sqlite:///:memory:")
+
+
+def test_prove_blocks(engine):
+    """
+    Test that every block is proven against the chain root it was added under.
+    """
+    store = LocalBlockStore(engine, accumulate=True)
+    assert store.get_chain_root() is None
+    blocks = _make_chain(store, 6)
+    store.add_blocks(blocks[:3])
+    root = store.get_chain_root()
+    store.add_blocks(blocks[3:])
+
+    assert store.get_chain_root(3) == root
+    assert store.get_chain_root() != root
+    for block_index, block in enumerate(blocks):
+        proof = store.prove_block(block_index)
+        assert verify_block_proof(store.get_chain_root(), block, proof)
+        assert not verify_block_proof(root, block, proof)
+    proof = store.prove_block(1, 3)
+    assert verify_block_proof(root, blocks[1], proof)
+    assert not verify_block_proof(root, blocks[2], proof)
+
+
+def test_accumulator_catches_up(engine):
+    """
+    Test that the root is the same whether blocks were accumulated on write or not.
+    """
+    blocks = _make_chain(LocalBlockStore(engine), 9)
+    LocalBlockStore(engine, chain_name="lazy").add_blocks(blocks)
+    accumulated = LocalBlockStore(engine, chain_name="eager", accumulate=True)
+    accumulated.add_blocks(blocks[:4])
+    accumulated.add_blocks(blocks[4:])
+
+    lazy = LocalBlockStore(engine, chain_name="lazy", accumulate=True)
+    assert lazy.get_chain_root() == accumulated.get_chain_root()
+    assert lazy.prove_block(7) == accumulated.prove_block(7)
+
+
+def test_truncate_accumulated_chain(engine):
+    """
+    Test that truncating blocks also drops them from the accumulator.
+    """
+    store = LocalBlockStore(engine, accumulate=True)
+    blocks = _make_chain(store, 8)
+    store.add_blocks(blocks[:5])
+    root = store.get_chain_root()
+    store.add_blocks(blocks[5:])
+
+    store.truncate_by_index(5)
+    assert store.get_chain_root() == root
+    with pytest.raises(IndexError):
+        store.prove_block(5)
+    store.add_blocks(blocks[5:])
+    assert verify_block_proof(store.get_chain_root(), blocks[7], store.prove_block(7))
@@ -0,0 +1,203 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from ucn.block.store.async_local_store import AsyncLocalBlockStore
+from ucn.block.error import InvalidPreviousBlockHashError, MissingGenesisBlockError
+from .test_local_store import _make_chain
+
+
+@pytest.fixture
+def async_block_store():
+    """Provide a fresh AsyncLocalBlockStore with an in-memory database for each test."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    yield AsyncLocalBlockStore(engine)
+    asyncio.run(engine.dispose())
+
+
+def test_add_and_retrieve_blocks(async_block_store):
+    """
+    Test adding blocks and retrieving them by hash and by index.
+    """
+
+    async def run():
+        genesis_block_hash = await async_block_store.add_block(
+            "test_protocol", b"test_data", ""
+        )
+        block_hash = await async_block_store.add_block("test_protocol", b"test_data")
+
+        block = await async_block_store.get_block(block_hash)
+        assert block.previous_block_hash == genesis_block_hash
+        assert block == await async_block_store.get_block_by_index(1)
+        assert block == await async_block_store.get_block_by_index(-1)
+        assert async_block_store.get_hash(block) == block_hash
+        assert await async_block_store.get_block("non_existent_hash") is None
+        assert await async_block_store.get_block_count() == 2
+
+    asyncio.run(run())
+
+
+def test_add_blocks_and_iterate(async_block_store):
+    """
+    Test adding a batch of blocks and streaming them back in pages.
+    """
+    blocks = _make_chain(async_block_store, 7)
+
+    async def run():
+        added_block_hashes = await async_block_store.add_blocks(blocks)
+        assert added_block_hashes == [
+            async_block_store.get_hash(block) for block in blocks
+        ]
+        assert [
+            block async for block in async_block_store.iter_blocks(batch_size=3)
+        ] == blocks
+        assert [
+            block async for block in async_block_store.iter_blocks(2, 5, 2)
+        ] == blocks[2:5]
+        assert [
+            item
+            async for item in async_block_store.iter_blocks_by_protocol(
+                "test_protocol", 5, 1
+            )
+        ] == [(5, blocks[5]), (6, blocks[6])]
+
+    asyncio.run(run())
+
+
+def test_iter_non_positive_batch_size(async_block_store):
+    """
+    Test that a page size below one is rejected instead of looping forever.
+    """
+
+    async def run():
+        await async_block_store.add_blocks(_make_chain(async_block_store, 3))
+        with pytest.raises(ValueError):
+            [block async for block in async_block_store.iter_blocks(batch_size=0)]
+        with pytest.raises(ValueError):
+            [
+                item
+                async for item in async_block_store.iter_blocks_by_protocol(
+                    "test_protocol", batch_size=0
+                )
+            ]
+
+    asyncio.run(run())
+
+
+def test_invalid_blocks(async_block_store):
+    """
+    Test that invalid links raise the same errors as the synchronous store.
+    """
+
+    async def run():
+        with pytest.raises(MissingGenesisBlockError):
+            await async_block_store.add_block("test_protocol", b"test_data", "hash")
+        await async_block_store.add_block("test_protocol", b"test_data", "")
+        with pytest.raises(InvalidPreviousBlockHashError):
+            await async_block_store.add_block("test_protocol", b"test_data", "")
+
+    asyncio.run(run())
+
+
+def test_concurrent_add_block(async_block_store):
+    """
+    Test that concurrent writers on the event loop each append one linked block.
+    """
+
+    async def run():
+        await async_block_store.add_block("test_protocol", b"genesis", "")
+        block_hashes = await asyncio.gather(
+            *(
+                async_block_store.add_block("test_protocol", b"test_data_%d" % i)
+                for i in range(10)
+            )
+        )
+        assert len(set(block_hashes)) == 10
+        assert await async_block_store.get_block_count() == 11
+
+        previous_block_hash = ""
+        async for block in async_block_store.iter_blocks():
+            assert block.previous_block_hash == previous_block_hash
+            previous_block_hash = async_block_store.get_hash(block)
+
+    asyncio.run(run())
+
+
+def test_remove_and_truncate(async_block_store):
+    """
+    Test removing blocks and truncating the chain.
+    """
+    blocks = _make_chain(async_block_store, 6)
+
+    async def run():
+        added_block_hashes = await async_block_store.add_blocks(blocks)
+
+        assert await async_block_store.remove_block(added_block_hashes[4]) == blocks[4:]
+        assert await async_block_store.truncate_by_index(2) == 2
+        assert await async_block_store.remove_block_by_index(5) == []
+        assert await async_block_store.get_block_count() == 2
+        assert await async_block_store.get_latest_block_hash() == added_block_hashes[1]
+
+        removed_blocks = []
+
+        async def callback(block):
+            removed_blocks.append(block)
+
+        assert await async_block_store.truncate(added_block_hashes[1], callback) == 1
+        assert removed_blocks == blocks[1:2]
+
+    asyncio.run(run())
+
+
+def test_read_compressed_blocks(tmp_path):
+    """
+    Test that blocks compressed by a LocalBlockStore are decompressed transparently.
+    """
+    from sqlalchemy import create_engine
+    from ucn.block.store.local_store import LocalBlockStore
+    from ucn.block.store.codec import PayloadCodec, train_dictionary
+
+    data_list = [b"test_data_%d " % i * 20 for i in range(3)]
+    path = tmp_path / "blocks.db"
+    store = LocalBlockStore(
+        create_engine(f"sqlite:///{path}"),
+        codec=PayloadCodec("zdict", dictionary=train_dictionary(data_list)),
+    )
+    block_hashes = [store.add_block("test_protocol", data) for data in data_list]
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async_store = AsyncLocalBlockStore(engine)
+        assert (await async_store.get_block(block_hashes[1])).data == data_list[1]
+        assert [block.data async for block in async_store.iter_blocks()] == data_list
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_read_and_remove_deduplicated_blocks(tmp_path):
+    """
+    Test that payloads shared by a deduplicating LocalBlockStore are read and released.
+    """
+    from sqlalchemy import create_engine, func, select
+    from ucn.block.store.local_store import LocalBlockStore
+    from ucn.block.store.models import PayloadBlobModel
+
+    data_list = [b"test_data", b"other_data", b"test_data"]
+    path = tmp_path / "blocks.db"
+    store = LocalBlockStore(create_engine(f"sqlite:///{path}"), deduplicate=True)
+    block_hashes = [store.add_block("test_protocol", data) for data in data_list]
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async_store = AsyncLocalBlockStore(engine)
+        assert (await async_store.get_block(block_hashes[2])).data == data_list[2]
+        removed_blocks = await async_store.remove_block_by_index(1)
+        assert [block.data for block in removed_blocks] == data_list[1:]
+        async with engine.connect() as connection:
+            blob_count = await connection.scalar(
+                select(func.count()).select_from(PayloadBlobModel)
+            )
+        assert blob_count == 1
+        await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import create_engine
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.store.cache_store import CachedBlockStore
+from .test_local_store import (  # noqa: F401
+    _make_chain,
+    test_add_and_retrieve_genesis_block,
+    test_add_and_retrieve_non_genesis_block,
+    test_retrieve_non_existent_block,
+    test_add_and_retrieve_block_by_index,
+    test_block_hash,
+    test_remove_block,
+    test_remove_block_by_index,
+    test_add_block_after_removal,
+    test_get_latest_block_by_index,
+    test_add_block_automatic_latest_hash,
+    test_add_blocks,
+    test_iter_blocks,
+    test_iter_blocks_by_protocol,
+    test_block_headers,
+    test_truncate_by_index,
+    test_truncate_with_callback,
+)
+
+
+@pytest.fixture
+def local_block_store():
+    """Provide a CachedBlockStore in front of a fresh in-memory LocalBlockStore."""
+    engine = create_engine("sqlite:///:memory:")
+    return CachedBlockStore(LocalBlockStore(engine), max_entries=4)
+
+
+def test_cache_hits_and_misses(local_block_store):
+    """
+    Test that repeated lookups by hash and by index are served from the cache.
+    """
+    added_block_hashes = local_block_store.add_blocks(_make_chain(local_block_store, 3))
+
+    local_block_store.get_block_by_index(1)
+    local_block_store.get_block_by_index(1)
+    # The block cached by index is also found by its hash
+    local_block_store.get_block(added_block_hashes[1])
+    local_block_store.get_block(added_block_hashes[2])
+
+    cache_info = local_block_store.cache_info()
+    assert (cache_info.hits, cache_info.misses, cache_info.entries) == (2, 2, 2)
+
+
+def test_cache_entry_bound(local_block_store):
+    """
+    Test that the least recently used blocks are evicted beyond max_entries.
+    """
+    local_block_store.add_blocks(_make_chain(local_block_store, 6))
+
+    for i in range(6):
+        local_block_store.get_block_by_index(i)
+    assert local_block_store.cache_info().entries == 4
+
+    # Index 0 and 1 were evicted, index 5 is still cached
+    local_block_store.get_block_by_index(5)
+    local_block_store.get_block_by_index(0)
+    cache_info = local_block_store.cache_info()
+    assert (cache_info.hits, cache_info.misses) == (1, 7)
+
+
+def test_cache_byte_bound():
+    """
+    Test that the cache stays below max_bytes and skips blocks larger than it.
+    """
+    store = CachedBlockStore(
+        LocalBlockStore(create_engine("sqlite:///:memory:")), max_bytes=10
+    )
+    store.add_block("test_protocol", b"12345", "")
+    store.add_block("test_protocol", b"123456")
+    store.add_block("test_protocol", b"12345678901")
+
+    for i in range(3):
+        store.get_block_by_index(i)
+
+    cache_info = store.cache_info()
+    assert cache_info.entries == 1
+    assert cache_info.size_bytes == 6
+
+
+@pytest.mark.parametrize(
+    "remove",
+    [
+        lambda store, hashes: store.remove_block(hashes[2]),
+        lambda store, hashes: store.remove_block_by_index(2),
+        lambda store, hashes: store.truncate(hashes[2]),
+        lambda store, hashes: store.truncate_by_index(2),
+    ],
+)
+def test_cache_invalidated_by_removal(local_block_store, remove):
+    """
+    Test that removed blocks are no longer served from the cache,
+    and that replacement blocks at the same index are returned instead.
+    """
+    added_block_hashes = local_block_store.add_blocks(_make_chain(local_block_store, 4))
+    for i in range(4):
+        local_block_store.get_block_by_index(i)
+    local_block_store.get_block(added_block_hashes[3])
+
+    remove(local_block_store, added_block_hashes)
+
+    for block_hash in added_block_hashes[2:]:
+        assert local_block_store.get_block(block_hash) is None
+    new_block_hash = local_block_store.add_block("test_protocol", b"new_data")
+    assert local_block_store.get_block_by_index(2) == local_block_store.get_block(
+        new_block_hash
+    )
+    assert local_block_store.get_block_by_index(-1).data == b"new_data"
@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import create_engine, inspect
+from ucn.block.store.chain_registry import ChainRegistry
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.error import InvalidChainNameError
+from .test_local_store import _make_chain
+
+
+def test_dynamic_chain_tables():
+    """
+    Test that stores of different chains in one database keep their blocks apart.
+    """
+    engine = create_engine("sqlite:///:memory:")
+    blocks_store = LocalBlockStore(engine)
+    ledger_store = LocalBlockStore(engine, chain_name="ledger")
+
+    blocks_store.add_blocks(_make_chain(blocks_store, 3))
+    ledger_hashes = ledger_store.add_blocks(
+        _make_chain(ledger_store, 2, protocol="ledger_protocol")
+    )
+
+    assert blocks_store.get_block_count() == 3
+    assert ledger_store.get_block_count() == 2
+    assert (
+        LocalBlockStore(engine, "ledger").get_latest_block_hash() == ledger_hashes[-1]
+    )
+    assert blocks_store.get_block(ledger_hashes[0]) is None
+
+
+@pytest.mark.parametrize("chain_name", ["", "1chain", "chain; DROP", "block_keys"])
+def test_invalid_chain_name(chain_name):
+    """
+    Test that names unusable as table or file names are rejected.
+    """
+    with pytest.raises(InvalidChainNameError):
+        ChainRegistry().get_store(chain_name)
+
+
+def test_registry_shared_database():
+    """
+    Test that a registry without a directory hands out one store per chain.
+    """
+    registry = ChainRegistry()
+    accounts_store = registry.get_store("accounts")
+    accounts_store.add_blocks(_make_chain(accounts_store, 2))
+
+    assert registry.get_store("accounts") is accounts_store
+    assert registry.get_store("data").get_block_count() == 0
+    assert registry.chain_names() == ["accounts", "data"]
+    registry.close()
+
+
+def test_registry_parallel_chain_files(tmp_path):
+    """
+    Test that chains in their own database files are written in parallel and reopened.
+    """
+    chain_names = ["accounts", "ledger", "data"]
+    registry = ChainRegistry(tmp_path)
+
+    def write_chain(chain_name):
+        store = registry.get_store(chain_name)
+        for i in range(20):
+            store.add_block(chain_name, b"%s_%d" % (chain_name.encode(), i))
+        return store.get_latest_block_hash()
+
+    with ThreadPoolExecutor(len(chain_names)) as executor:
+        latest_hashes = list(executor.map(write_chain, chain_names))
+    registry.close()
+
+    for chain_name in chain_names:
+        table_names = inspect(
+            create_engine(f"sqlite:///{tmp_path / chain_name}.db")
+        ).get_table_names()
+        assert chain_name in table_names
+        assert not (set(chain_names) - {chain_name}) & set(table_names)
+
+    reopened = ChainRegistry(tmp_path)
+    assert reopened.chain_names() == sorted(chain_names)
+    for chain_name, latest_hash in zip(chain_names, latest_hashes):
+        store = reopened.get_store(chain_name)
+        assert store.get_block_count() == 20
+        assert store.get_latest_block_hash() == latest_hash
+        assert store.verify(max_workers=1) is None
+    reopened.close()
@@ -0,0 +1,66 @@
+import os
+import pytest
+from ucn.block.error import UnknownCodecError
+from ucn.block.store.codec import PayloadCodec, decode_payload, train_dictionary
+
+SAMPLES = [
+    b'{"account_url":"Base85://account-%d","protocol":"profile","data":"value-%d"}'
+    % (i, i * 7)
+    for i in range(200)
+]
+
+
+@pytest.fixture(params=["zlib", "lzma", "zdict"])
+def codec(request):
+    """Provide each codec, the zdict codec with a dictionary trained on the samples."""
+    if request.param == "zdict":
+        return PayloadCodec("zdict", dictionary=train_dictionary(SAMPLES[:100]))
+    return PayloadCodec(request.param)
+
+
+def test_codec_round_trip(codec):
+    """
+    Test that compressed payloads decode to the original data.
+    """
+    data = b"".join(SAMPLES)
+
+    tag, payload = codec.encode(data)
+
+    assert tag == codec.tag
+    assert len(payload) < len(data)
+    assert decode_payload(tag, payload, {codec.dictionary_id: codec.dictionary}) == data
+
+
+def test_incompressible_payload_stored_raw(codec):
+    """
+    Test that a payload which would not get smaller is kept raw without a tag.
+    """
+    data = os.urandom(64)
+
+    assert codec.encode(data) == (None, data)
+    assert decode_payload(None, data) == data
+
+
+def test_trained_dictionary_helps_small_payloads():
+    """
+    Test that a trained dictionary compresses small payloads better than plain zlib.
+    """
+    zdict_codec = PayloadCodec("zdict", dictionary=train_dictionary(SAMPLES[:100]))
+    zlib_codec = PayloadCodec("zlib")
+
+    zdict_size = sum(len(zdict_codec.encode(sample)[1]) for sample in SAMPLES[100:])
+    zlib_size = sum(len(zlib_codec.encode(sample)[1]) for sample in SAMPLES[100:])
+
+    assert zdict_size < zlib_size * 0.7
+
+
+def test_unknown_codec():
+    """
+    Test errors for unknown codecs and missing dictionaries.
+    """
+    with pytest.raises(UnknownCodecError):
+        PayloadCodec("brotli")
+    with pytest.raises(UnknownCodecError):
+        decode_payload("brotli", b"")
+    with pytest.raises(UnknownCodecError):
+        decode_payload("zdict:0000", b"")
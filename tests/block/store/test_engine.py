@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import pytest
+from sqlalchemy import text
+from ucn.block.store.engine import (
+    create_async_block_store_engine,
+    create_block_store_engine,
+    DURABLE_PROFILE,
+    THROUGHPUT_PROFILE,
+)
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.store.async_local_store import AsyncLocalBlockStore
+
+
+@pytest.mark.parametrize(
+    "profile, synchronous",
+    [(DURABLE_PROFILE, 2), (THROUGHPUT_PROFILE, 1)],
+)
+def test_file_engine_pragmas(tmp_path, profile, synchronous):
+    """
+    Test that file-backed engines are configured by the given profile.
+    """
+    engine = create_block_store_engine(tmp_path / "blocks.db", profile)
+
+    with engine.connect() as connection:
+        assert connection.scalar(text("PRAGMA journal_mode")) == "wal"
+        assert connection.scalar(text("PRAGMA synchronous")) == synchronous
+        assert connection.scalar(text("PRAGMA mmap_size")) == profile.mmap_size
+        assert connection.scalar(text("PRAGMA cache_size")) == profile.cache_size
+
+
+def test_reader_not_blocked_by_writer(tmp_path):
+    """
+    Test that a reader sees committed blocks while a write transaction is open.
+    """
+    engine = create_block_store_engine(tmp_path / "blocks.db")
+    store = LocalBlockStore(engine)
+    block_hash = store.add_block("test_protocol", b"test_data", "")
+
+    with engine.connect() as writer:
+        writer.execute(text("BEGIN IMMEDIATE"))
+        writer.execute(
+            text(
+                "INSERT INTO blocks (protocol, data, block_hash, previous_block_hash, block_index) "
+                "VALUES ('test_protocol', x'00', 'pending', :previous_hash, 1)"
+            ),
+            {"previous_hash": block_hash},
+        )
+        # Read from another pooled connection while the write is uncommitted
+        assert store.get_block(block_hash).data == b"test_data"
+        assert store.get_block("pending") is None
+        writer.rollback()
+
+
+def test_memory_engine_shared_between_threads():
+    """
+    Test that the in-memory engine is the same database for every thread.
+    """
+    store = LocalBlockStore(create_block_store_engine())
+    block_hash = store.add_block("test_protocol", b"test_data", "")
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(store.get_block(block_hash)))
+    thread.start()
+    thread.join()
+
+    assert result[0].data == b"test_data"
+
+
+def test_memory_engine_concurrent_threads():
+    """
+    Test that concurrent writers and readers on the in-memory engine lose no blocks.
+    """
+    engine = create_block_store_engine()
+    store = LocalBlockStore(engine)
+    other_store = LocalBlockStore(engine, chain_name="other_chain")
+    store.add_block("test_protocol", b"genesis", "")
+    errors = []
+
+    def write(target):
+        try:
+            for i in range(100):
+                target.add_block("test_protocol", b"data_%d" % i)
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            for _ in range(300):
+                block_count = store.get_block_count()
+                assert store.get_block_by_index(block_count - 1) is not None
+                assert store.get_header_by_index(block_count // 2) is not None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(store,)) for _ in range(4)]
+    threads += [threading.Thread(target=write, args=(other_store,)) for _ in range(2)]
+    threads += [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert store.get_block_count() == 401
+    assert other_store.get_block_count() == 200
+    assert store.verify(max_workers=1) is None
+
+
+def test_memory_engines_are_separate():
+    """
+    Test that every in-memory engine is its own database and survives dispose.
+    """
+    engine = create_block_store_engine()
+    store = LocalBlockStore(engine)
+    store.add_block("test_protocol", b"test_data", "")
+    assert LocalBlockStore(create_block_store_engine()).get_block_count() == 0
+
+    engine.dispose()
+    assert LocalBlockStore(engine).get_block_count() == 1
+
+
+def test_async_file_engine(tmp_path):
+    """
+    Test that the aiosqlite engine is configured by the profile and usable by the async store.
+    """
+
+    async def run():
+        engine = create_async_block_store_engine(tmp_path / "blocks.db")
+        store = AsyncLocalBlockStore(engine)
+        block_hash = await store.add_block("test_protocol", b"test_data", "")
+        async with engine.connect() as connection:
+            assert (await connection.scalar(text("PRAGMA journal_mode"))) == "wal"
+        assert (await store.get_block(block_hash)).data == b"test_data"
+        await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,117 @@
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine
+from ucn.block.store.group_commit import GroupCommitQueue
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.error import InvalidPreviousBlockHashError
+
+
+def test_queued_writes_are_committed_together():
+    """
+    Test that writes submitted while a commit is running are committed in one group,
+    and that each caller gets its own result or exception.
+    """
+    first_commit_started = threading.Event()
+    release_first_commit = threading.Event()
+    groups = []
+
+    def commit(items):
+        groups.append(items)
+        if len(groups) == 1:
+            first_commit_started.set()
+            release_first_commit.wait()
+        return [ValueError(item) if item < 0 else item * 10 for item in items]
+
+    queue = GroupCommitQueue(commit)
+    results = {}
+
+    def submit(item):
+        try:
+            results[item] = queue.submit(item)
+        except ValueError as e:
+            results[item] = e
+
+    leader = threading.Thread(target=submit, args=(0,))
+    leader.start()
+    first_commit_started.wait()
+    followers = [threading.Thread(target=submit, args=(i,)) for i in (1, -2, 3)]
+    for follower in followers:
+        follower.start()
+    # Wait until every follower is queued behind the running commit
+    while len(queue._pending) < 3:
+        time.sleep(0.001)
+    release_first_commit.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert len(groups) == 2
+    assert groups[0] == [0]
+    assert sorted(groups[1]) == [-2, 1, 3]
+    assert results[0] == 0 and results[1] == 10 and results[3] == 30
+    assert isinstance(results[-2], ValueError)
+
+
+def test_concurrent_add_block(tmp_path):
+    """
+    Test that concurrent writers without an explicit parent each append one block
+    and that the resulting chain is linked.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'blocks.db'}")
+    store = LocalBlockStore(engine)
+    store.add_block("test_protocol", b"genesis", "")
+
+    block_hashes = []
+
+    def writer(writer_no):
+        for i in range(20):
+            block_hashes.append(
+                store.add_block("test_protocol", b"data_%d_%d" % (writer_no, i))
+            )
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(block_hashes)) == 160
+    assert store.get_block_count() == 161
+    previous_block_hash = ""
+    for block in store.iter_blocks():
+        assert block.previous_block_hash == previous_block_hash
+        previous_block_hash = store.get_hash(block)
+    assert previous_block_hash == store.get_latest_block_hash()
+
+
+def test_concurrent_add_block_with_same_parent(tmp_path):
+    """
+    Test that only one of several writers extending the same parent succeeds,
+    and the others get an InvalidPreviousBlockHashError.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'blocks.db'}")
+    store = LocalBlockStore(engine)
+    genesis_block_hash = store.add_block("test_protocol", b"genesis", "")
+
+    results = []
+
+    def writer(writer_no):
+        try:
+            results.append(
+                store.add_block(
+                    "test_protocol", b"data_%d" % writer_no, genesis_block_hash
+                )
+            )
+        except InvalidPreviousBlockHashError as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len([result for result in results if isinstance(result, str)]) == 1
+    assert store.get_block_count() == 2
+    with pytest.raises(InvalidPreviousBlockHashError):
+        store.add_block("test_protocol", b"data", genesis_block_hash)
@@ -1,6 +1,7 @@
 import pytest
 from sqlalchemy import create_engine
 from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.data.basic_block import BasicBlock
 from ucn.block.error import InvalidPreviousBlockHashError, MissingGenesisBlockError
 
 
@@ -171,6 +172,26 @@ def test_block_hash(local_block_store):
         previous_hash = added_block_hash
 
 
+@pytest.mark.parametrize("size", [0, 1, 4 * 1024 * 1024])
+def test_streaming_block_hash(size):
+    """
+    Test that hashing a block part by part matches hashing its serialization,
+    also for data given as a memoryview.
+    """
+    import hashlib
+
+    data = bytes(range(256)) * (size // 256) + b"x" * (size % 256)
+    block = BasicBlock(protocol="test_protocol", previous_block_hash="", data=data)
+    expected_hash = (
+        "sha256:" + hashlib.sha256(b"test_protocol/n" + b"/n" + data).hexdigest()
+    )
+
+    assert block.serialize() == b"test_protocol/n/n" + data
+    assert LocalBlockStore.get_hash(block) == expected_hash
+    block.data = memoryview(data)
+    assert LocalBlockStore.get_hash(block) == expected_hash
+
+
 def test_remove_block(local_block_store):
     """
     Test removing a block by its hash.
@@ -301,3 +322,504 @@ def test_add_block_automatic_latest_hash(local_block_store):
 
     # The previous_block_hash of the new block should be the hash of the genesis block
     assert new_block.previous_block_hash == genesis_block_hash
+
+
+def _make_chain(store, count, previous_hash="", protocol="test_protocol"):
+    """Build a list of linked blocks following previous_hash without storing them."""
+    blocks = []
+    for i in range(count):
+        block = BasicBlock(
+            protocol=protocol,
+            previous_block_hash=previous_hash,
+            data=b"test_data_%d" % i,
+        )
+        blocks.append(block)
+        previous_hash = store.get_hash(block)
+    return blocks
+
+
+def test_add_blocks(local_block_store):
+    """
+    Test adding a batch of linked blocks in one call.
+    The returned hashes should match the hashes of the blocks, in order.
+    """
+    blocks = _make_chain(local_block_store, 5)
+
+    added_block_hashes = local_block_store.add_blocks(blocks)
+
+    assert added_block_hashes == [local_block_store.get_hash(block) for block in blocks]
+    assert local_block_store.get_block_count() == 5
+    for i, block in enumerate(blocks):
+        assert local_block_store.get_block_by_index(i) == block
+
+
+def test_add_blocks_after_existing_chain(local_block_store):
+    """
+    Test appending a batch after blocks added one by one.
+    """
+    genesis_block_hash = local_block_store.add_block("test_protocol", b"test_data", "")
+    blocks = _make_chain(local_block_store, 3, genesis_block_hash)
+
+    added_block_hashes = local_block_store.add_blocks(blocks)
+
+    assert local_block_store.get_block_count() == 4
+    assert local_block_store.get_latest_block_hash() == added_block_hashes[-1]
+    assert local_block_store.add_block("test_protocol", b"test_data") is not None
+
+
+def test_add_blocks_with_broken_link(local_block_store):
+    """
+    Test adding a batch where one block does not link to the previous one.
+    An InvalidPreviousBlockHashError should be raised and nothing should be written.
+    """
+    blocks = _make_chain(local_block_store, 4)
+    blocks[2] = BasicBlock("test_protocol", "invalid_previous_block_hash", b"test_data")
+
+    with pytest.raises(InvalidPreviousBlockHashError):
+        local_block_store.add_blocks(blocks)
+
+    assert local_block_store.get_block_count() == 0
+
+
+def test_add_blocks_without_genesis_block(local_block_store):
+    """
+    Test adding a batch that does not start with a genesis block to an empty store.
+    A MissingGenesisBlockError should be raised.
+    """
+    blocks = _make_chain(local_block_store, 2, "previous_block_hash")
+
+    with pytest.raises(MissingGenesisBlockError):
+        local_block_store.add_blocks(blocks)
+
+
+def test_add_blocks_empty(local_block_store):
+    """
+    Test adding an empty batch.
+    """
+    assert local_block_store.add_blocks([]) == []
+    assert local_block_store.get_block_count() == 0
+
+
+def test_tip_tracks_add_and_remove(local_block_store):
+    """
+    Test that the cached tip follows blocks being added and removed.
+    """
+    assert local_block_store.get_tip().block_count == 0
+    assert local_block_store.get_latest_block_hash() == ""
+
+    added_block_hashes = local_block_store.add_blocks(_make_chain(local_block_store, 3))
+    tip = local_block_store.get_tip()
+    assert (tip.block_index, tip.block_hash, tip.block_count) == (
+        2,
+        added_block_hashes[-1],
+        3,
+    )
+
+    local_block_store.remove_block_by_index(1)
+    tip = local_block_store.get_tip()
+    assert (tip.block_index, tip.block_hash, tip.block_count) == (
+        0,
+        added_block_hashes[0],
+        1,
+    )
+    assert local_block_store.get_block_count() == 1
+
+
+def test_stale_tip_is_checked_against_database(local_block_store):
+    """
+    Test that a tip cached by one store is checked against the database
+    when another store sharing the same engine changes the chain.
+    """
+    other_store = LocalBlockStore(local_block_store.engine)
+    added_block_hashes = local_block_store.add_blocks(_make_chain(local_block_store, 3))
+    assert other_store.get_latest_block_hash() == added_block_hashes[-1]
+
+    # Another writer appends a block
+    local_block_store.add_block("test_protocol", b"test_data")
+    with pytest.raises(InvalidPreviousBlockHashError):
+        other_store.add_block("test_protocol", b"test_data", added_block_hashes[-1])
+    assert other_store.get_block_count() == 4
+
+    # Another writer truncates the chain
+    local_block_store.remove_block_by_index(2)
+    new_block_hash = other_store.add_block(
+        "test_protocol", b"other_data", added_block_hashes[1]
+    )
+    assert other_store.get_block_by_index(2) == other_store.get_block(new_block_hash)
+    assert local_block_store.refresh_tip().block_hash == new_block_hash
+
+
+@pytest.mark.parametrize(
+    "start_index, end_index, batch_size",
+    [
+        (0, None, 1000),
+        (0, None, 3),
+        (2, 8, 2),
+        (5, None, 1),
+        (10, None, 4),
+        (3, 3, 4),
+    ],
+)
+def test_iter_blocks(local_block_store, start_index, end_index, batch_size):
+    """
+    Test streaming a range of blocks with various page sizes.
+    """
+    blocks = _make_chain(local_block_store, 10)
+    local_block_store.add_blocks(blocks)
+
+    streamed_blocks = list(
+        local_block_store.iter_blocks(start_index, end_index, batch_size)
+    )
+
+    assert streamed_blocks == blocks[start_index:end_index]
+
+
+def test_iter_blocks_stop_early(local_block_store):
+    """
+    Test that a partially consumed iterator can be closed and does not block writes.
+    """
+    local_block_store.add_blocks(_make_chain(local_block_store, 5))
+
+    block_iterator = local_block_store.iter_blocks(batch_size=2)
+    next(block_iterator)
+    block_iterator.close()
+
+    assert local_block_store.add_block("test_protocol", b"test_data") is not None
+
+
+@pytest.mark.parametrize("batch_size", [0, -1])
+def test_iter_non_positive_batch_size(local_block_store, batch_size):
+    """
+    Test that a page size below one is rejected instead of looping forever.
+    """
+    local_block_store.add_blocks(_make_chain(local_block_store, 3))
+
+    with pytest.raises(ValueError):
+        list(local_block_store.iter_blocks(batch_size=batch_size))
+    with pytest.raises(ValueError):
+        list(local_block_store.iter_headers(batch_size=batch_size))
+    with pytest.raises(ValueError):
+        list(
+            local_block_store.iter_blocks_by_protocol(
+                "test_protocol", batch_size=batch_size
+            )
+        )
+
+
+def test_truncate_by_index(local_block_store):
+    """
+    Test truncating the chain from an index without collecting the removed blocks.
+    """
+    added_block_hashes = local_block_store.add_blocks(_make_chain(local_block_store, 6))
+
+    assert local_block_store.truncate_by_index(2) == 4
+
+    assert local_block_store.get_block_count() == 2
+    assert local_block_store.get_latest_block_hash() == added_block_hashes[1]
+    for block_hash in added_block_hashes[2:]:
+        assert local_block_store.get_block(block_hash) is None
+
+
+def test_truncate_with_callback(local_block_store):
+    """
+    Test truncating the chain from a block hash while streaming the removed blocks.
+    """
+    blocks = _make_chain(local_block_store, 6)
+    added_block_hashes = local_block_store.add_blocks(blocks)
+
+    removed_blocks = []
+    removed_count = local_block_store.truncate(
+        added_block_hashes[3], removed_blocks.append
+    )
+
+    assert removed_count == 3
+    assert removed_blocks == blocks[3:]
+    assert local_block_store.get_block_count() == 3
+
+
+def test_truncate_non_existent_block(local_block_store):
+    """
+    Test truncating from a block hash that does not exist in the store.
+    """
+    local_block_store.add_blocks(_make_chain(local_block_store, 3))
+
+    assert local_block_store.truncate("non_existent_hash") == 0
+    assert local_block_store.get_block_count() == 3
+
+
+def test_truncate_callback_error_keeps_blocks(local_block_store):
+    """
+    Test that nothing is removed when the callback raises.
+    """
+    local_block_store.add_blocks(_make_chain(local_block_store, 3))
+
+    def callback(block):
+        raise RuntimeError("callback failed")
+
+    with pytest.raises(RuntimeError):
+        local_block_store.truncate_by_index(1, callback)
+
+    assert local_block_store.get_block_count() == 3
+
+
+@pytest.mark.parametrize("since_index, batch_size", [(0, 1000), (0, 2), (4, 1), (9, 3)])
+def test_iter_blocks_by_protocol(local_block_store, since_index, batch_size):
+    """
+    Test streaming only the blocks of one protocol from an index.
+    """
+    previous_hash = ""
+    blocks = []
+    for i in range(9):
+        blocks += _make_chain(
+            local_block_store,
+            1,
+            previous_hash,
+            ["account", "account_addon", "bill"][i % 3],
+        )
+        previous_hash = local_block_store.get_hash(blocks[-1])
+    local_block_store.add_blocks(blocks)
+
+    streamed_blocks = list(
+        local_block_store.iter_blocks_by_protocol(
+            "account_addon", since_index, batch_size
+        )
+    )
+
+    assert streamed_blocks == [(i, blocks[i]) for i in (1, 4, 7) if i >= since_index]
+    assert list(local_block_store.iter_blocks_by_protocol("unknown")) == []
+
+
+def test_protocol_index_used(local_block_store):
+    """
+    Test that protocol queries are answered from the (protocol, block_index) index.
+    """
+    from sqlalchemy import text
+
+    with local_block_store.engine.connect() as connection:
+        plan = connection.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT block_index FROM blocks "
+                "WHERE protocol = 'account' AND block_index >= 0 ORDER BY block_index"
+            )
+        ).all()
+
+    assert "ix_blocks_protocol_block_index" in str(plan)
+
+
+def test_block_headers(local_block_store):
+    """
+    Test that block headers describe the blocks and load them on demand.
+    """
+    blocks = _make_chain(local_block_store, 5)
+    added_block_hashes = local_block_store.add_blocks(blocks)
+
+    headers = list(local_block_store.iter_headers(batch_size=2))
+    assert [header.block_index for header in headers] == list(range(5))
+    assert [header.block_hash for header in headers] == added_block_hashes
+    assert [header.previous_block_hash for header in headers] == [
+        block.previous_block_hash for block in blocks
+    ]
+    assert [header.data_size for header in headers] == [
+        len(block.data) for block in blocks
+    ]
+    assert headers[3].load_block() == blocks[3]
+    assert [header.block_index for header in local_block_store.iter_headers(1, 3)] == [
+        1,
+        2,
+    ]
+
+    assert local_block_store.get_header(added_block_hashes[2]) == headers[2]
+    assert local_block_store.get_header_by_index(2) == headers[2]
+    assert local_block_store.get_header_by_index(-1) == headers[4]
+    assert local_block_store.get_header("non_existent_block_hash") is None
+    assert local_block_store.get_header_by_index(5) is None
+
+    local_block_store.truncate_by_index(3)
+    assert headers[3].load_block() is None
+
+
+def test_verify_checkpoint(local_block_store, monkeypatch):
+    """
+    Test that verification resumes after the last checkpoint
+    and that a full audit starts from the genesis block.
+    """
+    from ucn.block.store import local_store
+
+    verified_ranges = []
+    verify_chain = local_store.verify_chain
+
+    def recording_verify_chain(store, start_index, end_index, *args):
+        verified_ranges.append((start_index, end_index))
+        return verify_chain(store, start_index, end_index, *args)
+
+    monkeypatch.setattr(local_store, "verify_chain", recording_verify_chain)
+
+    added_block_hashes = local_block_store.add_blocks(_make_chain(local_block_store, 5))
+    assert local_block_store.get_checkpoint() is None
+    assert local_block_store.verify(max_workers=1) is None
+    assert local_block_store.get_checkpoint().block_hash == added_block_hashes[-1]
+
+    local_block_store.add_block("test_protocol", b"test_data")
+    local_block_store.add_block("test_protocol", b"test_data")
+    assert local_block_store.verify(max_workers=1) is None
+    assert local_block_store.audit(max_workers=1) is None
+
+    assert verified_ranges == [(0, 5), (5, 7), (0, 7)]
+    assert local_block_store.get_checkpoint().block_index == 6
+
+
+def test_verify_checkpoint_with_corruption(local_block_store):
+    """
+    Test that corruption before the checkpoint is only found by a full audit,
+    and that the checkpoint only covers blocks verified before a bad block.
+    """
+    from sqlalchemy import update
+
+    local_block_store.add_blocks(_make_chain(local_block_store, 5))
+    local_block_store.verify(max_workers=1)
+    local_block_store.add_blocks(
+        _make_chain(local_block_store, 5, local_block_store.get_latest_block_hash())
+    )
+    with local_block_store.engine.begin() as connection:
+        for block_index in (2, 7):
+            connection.execute(
+                update(local_block_store.BLOCK_MODEL)
+                .where(local_block_store.BLOCK_MODEL.block_index == block_index)
+                .values(data=b"corrupted")
+            )
+
+    assert local_block_store.verify(max_workers=1) == 7
+    assert local_block_store.get_checkpoint().block_index == 6
+    assert local_block_store.audit(max_workers=1) == 2
+
+
+def test_checkpoint_digest(local_block_store):
+    """
+    Test that a checkpoint is ignored when it was signed with another key.
+    """
+    local_block_store.add_blocks(_make_chain(local_block_store, 3))
+    local_block_store.verify(max_workers=1)
+
+    other_store = LocalBlockStore(local_block_store.engine, checkpoint_key=b"key")
+
+    assert local_block_store.get_checkpoint().block_index == 2
+    assert other_store.get_checkpoint() is None
+
+
+def test_truncate_moves_checkpoint(local_block_store):
+    """
+    Test that truncating below the checkpoint moves it to the new tip.
+    """
+    added_block_hashes = local_block_store.add_blocks(_make_chain(local_block_store, 5))
+    local_block_store.verify(max_workers=1)
+
+    local_block_store.truncate_by_index(3)
+    assert local_block_store.get_checkpoint().block_hash == added_block_hashes[2]
+
+    local_block_store.truncate_by_index(0)
+    assert local_block_store.get_checkpoint() is None
+
+
+@pytest.mark.parametrize("codec_name", ["zlib", "lzma", "zdict"])
+def test_compressed_store(codec_name):
+    """
+    Test that compressed payloads are read back transparently with unchanged hashes,
+    also by a store opened without a codec.
+    """
+    from sqlalchemy import select
+    from ucn.block.store.codec import PayloadCodec, train_dictionary
+
+    data_list = [b"test_data_%d " % i * 20 for i in range(5)]
+    dictionary = train_dictionary(data_list) if codec_name == "zdict" else None
+    engine = create_engine("sqlite:///:memory:")
+    store = LocalBlockStore(
+        engine, codec=PayloadCodec(codec_name, dictionary=dictionary)
+    )
+    raw_store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+
+    block_hashes = [store.add_block("test_protocol", data) for data in data_list]
+    raw_block_hashes = [
+        raw_store.add_block("test_protocol", data) for data in data_list
+    ]
+
+    assert block_hashes == raw_block_hashes
+    reader = LocalBlockStore(engine)
+    for block_hash, data in zip(block_hashes, data_list):
+        assert store.get_block(block_hash).data == data
+        assert reader.get_block(block_hash).data == data
+        assert reader.get_header(block_hash).data_size == len(data)
+    assert [block.data for block in reader.iter_blocks()] == data_list
+    with engine.connect() as connection:
+        stored_rows = connection.execute(
+            select(store.BLOCK_MODEL.codec, store.BLOCK_MODEL.data)
+        ).all()
+    assert all(codec is not None for codec, _ in stored_rows)
+    assert sum(len(payload) for _, payload in stored_rows) < sum(map(len, data_list))
+
+
+def test_upgrade_table_without_codec_column(tmp_path):
+    """
+    Test that a block table created before the codec column existed is upgraded.
+    """
+    from sqlalchemy import text
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'blocks.db'}")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE blocks (protocol VARCHAR, data BLOB, block_hash VARCHAR, "
+                "previous_block_hash VARCHAR, block_index INTEGER PRIMARY KEY)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO blocks VALUES ('test_protocol', x'74657374', 'hash', '', 0)"
+            )
+        )
+
+    store = LocalBlockStore(engine)
+
+    assert store.get_block("hash").data == b"test"
+    assert store.get_header("hash").data_size == 4
+    assert store.add_block("test_protocol", b"test_data") is not None
+
+
+def test_deduplicated_store():
+    """
+    Test that identical payloads are stored once with unchanged hashes, and that a
+    shared payload is only deleted with the last block referring to it.
+    """
+    from sqlalchemy import select
+    from ucn.block.store.codec import PayloadCodec
+    from ucn.block.store.models import PayloadBlobModel
+
+    data_list = [b"shared_data" * 10, b"other_data", b"shared_data" * 10] * 2
+    engine = create_engine("sqlite:///:memory:")
+    store = LocalBlockStore(engine, codec=PayloadCodec("zlib"), deduplicate=True)
+    raw_store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+
+    block_hashes = [store.add_block("test_protocol", data) for data in data_list]
+    raw_block_hashes = [
+        raw_store.add_block("test_protocol", data) for data in data_list
+    ]
+
+    assert block_hashes == raw_block_hashes
+    assert [block.data for block in store.iter_blocks()] == data_list
+    assert store.get_block(block_hashes[2]).data == data_list[2]
+
+    def ref_counts():
+        with engine.connect() as connection:
+            return sorted(
+                connection.execute(select(PayloadBlobModel.ref_count)).scalars()
+            )
+
+    assert ref_counts() == [2, 4]
+
+    removed_blocks = store.remove_block_by_index(3)
+    assert [block.data for block in removed_blocks] == data_list[3:]
+    assert ref_counts() == [1, 2]
+
+    store.truncate_by_index(1)
+    assert ref_counts() == [1]
+    store.truncate_by_index(0)
+    assert ref_counts() == []
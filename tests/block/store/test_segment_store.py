@@ -0,0 +1,155 @@
+import pytest
+from ucn.block.store.segment_store import SegmentBlockStore
+from .test_local_store import (  # noqa: F401
+    _make_chain,
+    test_add_and_retrieve_genesis_block,
+    test_add_and_retrieve_non_genesis_block,
+    test_retrieve_non_existent_block,
+    test_add_and_retrieve_block_by_index,
+    test_add_block_with_invalid_previous_hash,
+    test_add_multiple_genesis_blocks,
+    test_add_block_with_duplicate_hash,
+    test_add_block_without_genesis_block,
+    test_block_hash,
+    test_remove_block,
+    test_remove_block_by_index,
+    test_add_block_after_removal,
+    test_get_latest_block_by_index,
+    test_add_block_automatic_latest_hash,
+    test_add_blocks,
+    test_add_blocks_after_existing_chain,
+    test_add_blocks_with_broken_link,
+    test_add_blocks_without_genesis_block,
+    test_add_blocks_empty,
+    test_iter_blocks,
+    test_iter_blocks_by_protocol,
+    test_block_headers,
+    test_truncate_by_index,
+    test_truncate_with_callback,
+    test_truncate_non_existent_block,
+    test_truncate_callback_error_keeps_blocks,
+)
+
+
+@pytest.fixture
+def local_block_store(tmp_path):
+    """Provide a fresh SegmentBlockStore in a temporary directory for each test."""
+    store = SegmentBlockStore(tmp_path / "blocks")
+    yield store
+    store.close()
+
+
+def test_block_data_is_memoryview(local_block_store):
+    """
+    Test that block data is returned as a zero-copy memoryview.
+    """
+    block_hash = local_block_store.add_block("test_protocol", b"test_data", "")
+
+    block = local_block_store.get_block(block_hash)
+
+    assert isinstance(block.data, memoryview)
+    assert block.data.readonly
+    assert block.data == b"test_data"
+
+
+def test_reopen_store(tmp_path):
+    """
+    Test that blocks and truncations are restored when the store is opened again.
+    """
+    store = SegmentBlockStore(tmp_path, segment_size=64)
+    added_block_hashes = store.add_blocks(_make_chain(store, 6))
+    store.truncate_by_index(4)
+    new_block_hash = store.add_block("test_protocol", b"new_data")
+    store.close()
+
+    reopened_store = SegmentBlockStore(tmp_path, segment_size=64)
+
+    assert reopened_store.get_block_count() == 5
+    assert reopened_store.get_latest_block_hash() == new_block_hash
+    assert reopened_store.get_block(added_block_hashes[4]) is None
+    assert [
+        reopened_store.get_hash(block) for block in reopened_store.iter_blocks()
+    ] == added_block_hashes[:4] + [new_block_hash]
+    reopened_store.close()
+
+
+def test_segment_rollover(tmp_path):
+    """
+    Test that a new segment file is started once the active one is full.
+    """
+    store = SegmentBlockStore(tmp_path, segment_size=64)
+    blocks = _make_chain(store, 5)
+    for block in blocks:
+        store.add_blocks([block])
+
+    assert len(list(tmp_path.glob("*.seg"))) > 1
+    assert list(store.iter_blocks()) == blocks
+    store.close()
+
+
+def test_torn_record_is_dropped(tmp_path):
+    """
+    Test that a record cut short by a crash is dropped when the store is opened.
+    """
+    store = SegmentBlockStore(tmp_path)
+    added_block_hashes = store.add_blocks(_make_chain(store, 3))
+    store.close()
+    segment_path = next(tmp_path.glob("*.seg"))
+    segment_path.write_bytes(segment_path.read_bytes()[:-4])
+
+    reopened_store = SegmentBlockStore(tmp_path)
+
+    assert reopened_store.get_block_count() == 2
+    assert reopened_store.get_latest_block_hash() == added_block_hashes[1]
+    assert reopened_store.add_block("test_protocol", b"test_data") is not None
+    reopened_store.close()
+
+
+def test_sealed_segment_indexes(tmp_path, monkeypatch):
+    """
+    Test that full segments are loaded from their index files without being scanned.
+    """
+    store = SegmentBlockStore(tmp_path, segment_size=64)
+    blocks = _make_chain(store, 6)
+    for block in blocks:
+        store.add_blocks([block])
+    store.truncate_by_index(5)
+    store.close()
+    segment_count = len(list(tmp_path.glob("*.seg")))
+    assert len(list(tmp_path.glob("*.idx"))) == segment_count - 1
+
+    scanned_paths = []
+    scan_segment = SegmentBlockStore._scan_segment
+    monkeypatch.setattr(
+        SegmentBlockStore,
+        "_scan_segment",
+        staticmethod(lambda path: scanned_paths.append(path) or scan_segment(path)),
+    )
+    reopened_store = SegmentBlockStore(tmp_path, segment_size=64)
+    assert scanned_paths == [sorted(tmp_path.glob("*.seg"))[-1]]
+    assert list(reopened_store.iter_blocks()) == blocks[:5]
+    assert reopened_store.get_block(store.get_hash(blocks[2])) == blocks[2]
+    assert reopened_store.get_block("not_a_block_hash") is None
+    reopened_store.close()
+
+
+@pytest.mark.parametrize("damage", ["remove", "stale"])
+def test_damaged_segment_index_is_rebuilt(tmp_path, damage):
+    """
+    Test that a missing or outdated segment index is replaced by a scan of its segment.
+    """
+    store = SegmentBlockStore(tmp_path, segment_size=64)
+    blocks = _make_chain(store, 4)
+    for block in blocks:
+        store.add_blocks([block])
+    store.close()
+    index_path = sorted(tmp_path.glob("*.idx"))[0]
+    if damage == "remove":
+        index_path.unlink()
+    else:
+        index_path.write_bytes(index_path.read_bytes()[:-1])
+
+    reopened_store = SegmentBlockStore(tmp_path, segment_size=64)
+    assert list(reopened_store.iter_blocks()) == blocks
+    assert index_path.exists()
+    reopened_store.close()
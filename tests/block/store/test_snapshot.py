@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import create_engine
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.store.segment_store import SegmentBlockStore
+from ucn.block.store.snapshot import ChainSnapshot, export_chain, import_chain
+from ucn.block.error import InvalidPreviousBlockHashError, SnapshotError
+from .test_local_store import _make_chain
+
+
+@pytest.fixture
+def local_block_store():
+    """Provide a LocalBlockStore holding a chain of 10 blocks."""
+    store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+    store.add_blocks(_make_chain(store, 10))
+    return store
+
+
+def _new_store():
+    return LocalBlockStore(create_engine("sqlite:///:memory:"))
+
+
+@pytest.mark.parametrize("verify", [True, False])
+def test_export_and_import_chain(local_block_store, tmp_path, verify):
+    """
+    Test that a chain imported from a snapshot is identical to the exported one.
+    """
+    path = str(tmp_path / "chain.snapshot")
+    assert local_block_store.export_chain(path) == 10
+
+    store = _new_store()
+    assert store.import_chain(path, verify=verify, batch_size=3) == 10
+    assert list(store.iter_blocks()) == list(local_block_store.iter_blocks())
+    assert list(store.iter_headers()) == list(local_block_store.iter_headers())
+    assert store.get_latest_block_hash() == local_block_store.get_latest_block_hash()
+    assert store.verify(max_workers=1) is None
+
+
+def test_import_chain_range(local_block_store, tmp_path):
+    """
+    Test that a snapshot of a range continues a chain holding the blocks before it.
+    """
+    path = str(tmp_path / "chain.snapshot")
+    assert local_block_store.export_chain(path, 4, 8) == 4
+
+    store = _new_store()
+    with pytest.raises(InvalidPreviousBlockHashError):
+        store.import_chain(path)
+    assert store.get_block_count() == 0
+
+    store.add_blocks(local_block_store.iter_blocks(0, 4))
+    assert store.import_chain(path) == 4
+    assert list(store.iter_blocks()) == list(local_block_store.iter_blocks(0, 8))
+
+
+def test_snapshot_hash_index(local_block_store, tmp_path):
+    """
+    Test that blocks are looked up by hash in a snapshot file.
+    """
+    path = str(tmp_path / "chain.snapshot")
+    local_block_store.export_chain(path)
+    block_hash = local_block_store.get_header_by_index(6).block_hash
+
+    with ChainSnapshot(path) as snapshot:
+        assert snapshot.start_index == 0
+        assert snapshot.block_count == 10
+        assert snapshot.get_block(block_hash) == local_block_store.get_block(block_hash)
+        assert snapshot.get_block("non_existent_block_hash") is None
+
+
+def test_import_corrupted_snapshot(local_block_store, tmp_path):
+    """
+    Test that a damaged or tampered snapshot is rejected without importing anything.
+    """
+    path = tmp_path / "chain.snapshot"
+    local_block_store.export_chain(str(path))
+    content = bytearray(path.read_bytes())
+    content[100] ^= 1
+    path.write_bytes(content)
+
+    store = _new_store()
+    with pytest.raises(SnapshotError):
+        store.import_chain(str(path))
+    assert store.get_block_count() == 0
+
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(SnapshotError):
+        store.import_chain(str(path))
+
+
+def test_import_chain_into_segment_store(local_block_store, tmp_path):
+    """
+    Test that snapshots are imported into other stores through add_blocks.
+    """
+    path = str(tmp_path / "chain.snapshot")
+    local_block_store.export_chain(path)
+
+    store = SegmentBlockStore(tmp_path / "segments")
+    assert import_chain(store, path, batch_size=4) == 10
+    assert list(store.iter_blocks()) == list(local_block_store.iter_blocks())
+
+    assert export_chain(store, str(tmp_path / "copy.snapshot"), 2) == 8
+    store.close()
@@ -0,0 +1,51 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from ucn.block.store import state_tree
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.store.state_tree import SQLSMTStorage
+from ucn.hash_tree.sparse import EMPTY_ROOT, SparseMerkleTree, verify
+
+
+def _items(count: int) -> dict[str, bytes]:
+    return {f"ucn://account/{i}": b"balance=%d" % i for i in range(count)}
+
+
+def test_state_tree_in_block_store_database(monkeypatch):
+    """
+    Test that a tree stored in the block store database matches an in-memory tree.
+    """
+    monkeypatch.setattr(state_tree, "LOOKUP_BATCH_SIZE", 7)
+    store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+    memory_tree = SparseMerkleTree()
+    memory_tree.update(_items(30))
+    memory_tree.update({"ucn://account/4": None, "ucn://account/5": b"balance=0"})
+
+    with Session(store.engine) as session:
+        tree = SparseMerkleTree(SQLSMTStorage(session, "accounts"))
+        tree.update(_items(30))
+        session.commit()
+    with Session(store.engine) as session:
+        tree = SparseMerkleTree(SQLSMTStorage(session, "accounts"))
+        tree.update({"ucn://account/4": None, "ucn://account/5": b"balance=0"})
+        session.commit()
+
+    with Session(store.engine) as session:
+        tree = SparseMerkleTree(SQLSMTStorage(session, "accounts"))
+        assert tree.root == memory_tree.root
+        assert tree.get("ucn://account/5") == b"balance=0"
+        assert tree.get("ucn://account/4") is None
+        assert verify(
+            tree.root, "ucn://account/7", b"balance=7", tree.prove("ucn://account/7")
+        )
+        assert SparseMerkleTree(SQLSMTStorage(session, "bills")).root == EMPTY_ROOT
+
+
+def test_uncommitted_state_is_discarded():
+    """
+    Test that updates are only persisted with the session.
+    """
+    store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+    with Session(store.engine) as session:
+        SparseMerkleTree(SQLSMTStorage(session, "accounts")).update(_items(3))
+    with Session(store.engine) as session:
+        assert SparseMerkleTree(SQLSMTStorage(session, "accounts")).root == EMPTY_ROOT
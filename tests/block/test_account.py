@@ -0,0 +1,209 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from ucn.block import account
+from ucn.block.data.basic_block import BasicBlock
+from ucn.block.error import KeyIndexError
+from ucn.block.store.async_local_store import AsyncLocalBlockStore
+from ucn.block.store.engine import create_async_block_store_engine
+from ucn.block.store.local_store import LocalBlockStore
+from ucn.block.store.models import BlockKeyModel
+
+
+class FakeAccount:
+    """Account stand-in exposing only the id URL used by add-on blocks."""
+
+    def __init__(self, id_url):
+        self.id_url = id_url
+
+
+@pytest.fixture
+def local_block_store():
+    """Provide a fresh LocalBlockStore with the account indexers registered."""
+    store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+    account.register_account_indexers(store)
+    store.add_block("genesis", b"", "")
+    return store
+
+
+def test_get_account_addons(local_block_store):
+    """
+    Test that add-ons are returned per account, in the order they were added.
+    """
+    alice = FakeAccount("Base85://alice")
+    bob = FakeAccount("Base85://bob")
+    account.add_account_addon(
+        alice, {"name": b"Alice", "avatar": b"..."}, local_block_store
+    )
+    account.add_account_addon(bob, {"name": b"Bob"}, local_block_store)
+    account.add_account_addon(alice, {"email": b"alice@"}, local_block_store)
+
+    alice_addons = account.get_account_addons(alice.id_url, local_block_store)
+
+    assert [(addon.protocol, addon.data) for addon in alice_addons] == [
+        ("name", b"Alice"),
+        ("avatar", b"..."),
+        ("email", b"alice@"),
+    ]
+    assert {addon.account_url for addon in alice_addons} == {alice.id_url}
+    assert len(account.get_account_addons(bob.id_url, local_block_store)) == 1
+    assert account.get_account_addons("Base85://carol", local_block_store) == []
+
+
+def test_account_addons_removed_with_blocks(local_block_store):
+    """
+    Test that index entries of removed blocks are removed too.
+    """
+    alice = FakeAccount("Base85://alice")
+    account.add_account_addon(alice, {"name": b"Alice"}, local_block_store)
+    (avatar_hash,) = account.add_account_addon(
+        alice, {"avatar": b"..."}, local_block_store
+    )
+
+    local_block_store.remove_block(avatar_hash)
+
+    alice_addons = account.get_account_addons(alice.id_url, local_block_store)
+    assert [addon.protocol for addon in alice_addons] == ["name"]
+
+
+def test_reindex_account_addons():
+    """
+    Test building the index for add-ons stored before the indexer was registered.
+    """
+    store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+    store.add_block("genesis", b"", "")
+    alice = FakeAccount("Base85://alice")
+    account.add_account_addon(alice, {"name": b"Alice"}, store)
+    with pytest.raises(KeyIndexError):
+        account.get_account_addons(alice.id_url, store)
+
+    account.register_account_indexers(store)
+    with pytest.raises(KeyIndexError):
+        account.get_account_addons(alice.id_url, store)
+    store.reindex_keys(account.ACCOUNT_ADDON_PROTOCOL)
+
+    assert len(account.get_account_addons(alice.id_url, store)) == 1
+
+
+def test_unindexed_writer_invalidates_index(tmp_path):
+    """
+    Test that add-ons written by a store without the indexer make lookups fail loudly.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'blocks.db'}")
+    store = LocalBlockStore(engine)
+    account.register_account_indexers(store)
+    store.add_block("genesis", b"", "")
+    alice = FakeAccount("Base85://alice")
+    account.add_account_addon(alice, {"name": b"Alice"}, store)
+    assert len(account.get_account_addons(alice.id_url, store)) == 1
+
+    account.add_account_addon(alice, {"avatar": b"..."}, LocalBlockStore(engine))
+    with pytest.raises(KeyIndexError):
+        account.get_account_addons(alice.id_url, store)
+
+    store.reindex_keys(account.ACCOUNT_ADDON_PROTOCOL)
+    assert len(account.get_account_addons(alice.id_url, store)) == 2
+
+
+def test_async_truncate_removes_index_entries(tmp_path):
+    """
+    Test that entries of blocks truncated by the async store never resolve to later blocks.
+    """
+    path = tmp_path / "blocks.db"
+    store = LocalBlockStore(create_engine(f"sqlite:///{path}"))
+    account.register_account_indexers(store)
+    store.add_block("genesis", b"", "")
+    alice = FakeAccount("Base85://alice")
+    account.add_account_addon(alice, {"name": b"Alice"}, store)
+
+    async def truncate():
+        engine = create_async_block_store_engine(path)
+        assert await AsyncLocalBlockStore(engine).truncate_by_index(1) == 1
+        await engine.dispose()
+
+    asyncio.run(truncate())
+    store.add_block("unrelated", b"\xff not an add-on")
+
+    assert account.get_account_addons(alice.id_url, store) == []
+    account.add_account_addon(alice, {"name": b"Alice"}, store)
+    assert len(account.get_account_addons(alice.id_url, store)) == 1
+
+
+def test_stale_index_entry_ignored(local_block_store):
+    """
+    Test that an entry left behind for a removed block does not match the block replacing it.
+    """
+    alice = FakeAccount("Base85://alice")
+    (addon_hash,) = account.add_account_addon(
+        alice, {"name": b"Alice"}, local_block_store
+    )
+    with Session(local_block_store.engine) as session:
+        stale_entry = session.scalars(select(BlockKeyModel)).one()
+        stale_entry = {
+            column: getattr(stale_entry, column)
+            for column in ("chain_name", "protocol", "key", "block_index", "block_hash")
+        }
+    local_block_store.remove_block(addon_hash)
+    with Session(local_block_store.engine) as session:
+        session.add(BlockKeyModel(**stale_entry))
+        session.commit()
+
+    local_block_store.add_block("unrelated", b"\xff not an add-on")
+    assert account.get_account_addons(alice.id_url, local_block_store) == []
+
+
+def test_key_lookup_uses_index(local_block_store):
+    """
+    Test that key lookups are driven by the block_keys index instead of scanning the chain.
+    """
+    from sqlalchemy import event
+
+    alice = FakeAccount("Base85://alice")
+    account.add_account_addon(alice, {"name": b"Alice"}, local_block_store)
+    statements = []
+
+    def record_statement(connection, cursor, statement, parameters, context, many):
+        statements.append((statement, parameters))
+
+    event.listen(local_block_store.engine, "before_cursor_execute", record_statement)
+    try:
+        assert len(account.get_account_addons(alice.id_url, local_block_store)) == 1
+    finally:
+        event.remove(
+            local_block_store.engine, "before_cursor_execute", record_statement
+        )
+
+    (statement, parameters) = [
+        (statement, parameters)
+        for statement, parameters in statements
+        if "JOIN block_keys" in statement
+    ][-1]
+    with local_block_store.engine.connect() as connection:
+        plan = [
+            row.detail
+            for row in connection.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + statement, parameters
+            )
+        ]
+
+    assert plan[0].startswith("SEARCH block_keys USING INDEX ix_block_keys_lookup")
+    assert not [detail for detail in plan if detail.startswith("SCAN")]
+    assert "CORRELATED" not in str(plan)
+
+
+def test_duplicate_keys_indexed_once(local_block_store):
+    """
+    Test that a block listing the same key twice is returned once.
+    """
+    local_block_store.register_key_indexer("tagged", lambda block: ["a", "b", "a"])
+    local_block_store.add_blocks(
+        [BasicBlock("tagged", None, b"%d" % i) for i in range(3)]
+    )
+
+    assert [
+        block_index
+        for block_index, _ in local_block_store.iter_blocks_by_key(
+            "tagged", "a", batch_size=2
+        )
+    ] == [1, 2, 3]
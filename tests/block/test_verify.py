@@ -0,0 +1,138 @@
+import pytest
+from functools import partial
+from sqlalchemy import create_engine, update
+from ucn.block.data.basic_block import BasicBlock
+from ucn.block.store.local_store import LocalBlockStore, open_local_block_store
+from ucn.block.verify import verify_chain
+
+
+@pytest.fixture
+def local_block_store():
+    """Provide a LocalBlockStore holding a chain of 25 blocks."""
+    store = LocalBlockStore(create_engine("sqlite:///:memory:"))
+    previous_hash = ""
+    blocks = []
+    for i in range(25):
+        block = BasicBlock("test_protocol", previous_hash, b"test_data_%d" % i)
+        blocks.append(block)
+        previous_hash = store.get_hash(block)
+    store.add_blocks(blocks)
+    return store
+
+
+def _set_block(store, block_index, **values):
+    """Overwrite columns of a stored block, simulating on-disk corruption."""
+    with store.engine.begin() as connection:
+        connection.execute(
+            update(store.BLOCK_MODEL)
+            .where(store.BLOCK_MODEL.block_index == block_index)
+            .values(**values)
+        )
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_verify_valid_chain(local_block_store, max_workers):
+    """
+    Test that a valid chain has no bad block, in full and in part.
+    """
+    assert (
+        verify_chain(local_block_store, range_size=4, max_workers=max_workers) is None
+    )
+    assert (
+        verify_chain(local_block_store, 7, 19, range_size=4, max_workers=max_workers)
+        is None
+    )
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+@pytest.mark.parametrize("bad_block_index", [0, 3, 4, 11, 24])
+def test_verify_corrupted_data(local_block_store, max_workers, bad_block_index):
+    """
+    Test that the first block with corrupted data is reported,
+    whether it is inside a range, at a range boundary or the tip.
+    """
+    _set_block(local_block_store, bad_block_index, data=b"corrupted")
+    if bad_block_index < 24:
+        _set_block(local_block_store, 24, data=b"corrupted")
+
+    assert (
+        verify_chain(local_block_store, range_size=4, max_workers=max_workers)
+        == bad_block_index
+    )
+
+
+def test_verify_broken_genesis(local_block_store):
+    """
+    Test that a genesis block with a parent hash is reported.
+    """
+    _set_block(local_block_store, 0, previous_block_hash="previous_block_hash")
+
+    assert verify_chain(local_block_store, range_size=4, max_workers=1) == 0
+
+
+def test_verify_from_trusted_hash(local_block_store):
+    """
+    Test verifying from a trusted hash of the block before the start index.
+    """
+    previous_hash = local_block_store.get_hash(local_block_store.get_block_by_index(9))
+
+    assert (
+        verify_chain(local_block_store, 10, previous_block_hash=previous_hash) is None
+    )
+    assert verify_chain(local_block_store, 10, previous_block_hash="other") == 10
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_verify_last_block_of_range(local_block_store, max_workers):
+    """
+    Test that the last block of a range ending before the tip is checked
+    against the parent hash stored in the following block.
+    """
+    _set_block(local_block_store, 4, data=b"corrupted")
+
+    assert verify_chain(local_block_store, 0, 5, max_workers=max_workers) == 4
+    assert (
+        verify_chain(local_block_store, 0, 5, range_size=2, max_workers=max_workers)
+        == 4
+    )
+    assert verify_chain(local_block_store, 0, 4, max_workers=max_workers) is None
+    assert verify_chain(local_block_store, 0, 10, max_workers=max_workers) == 4
+
+
+@pytest.fixture
+def file_block_store(tmp_path):
+    """Provide a LocalBlockStore over a database file holding a chain of 25 blocks."""
+    path = str(tmp_path / "blocks.db")
+    store = open_local_block_store(path)
+    previous_hash = ""
+    blocks = []
+    for i in range(25):
+        block = BasicBlock("test_protocol", previous_hash, b"test_data_%d" % i)
+        blocks.append(block)
+        previous_hash = store.get_hash(block)
+    store.add_blocks(blocks)
+    yield path, store
+    store.engine.dispose()
+
+
+@pytest.mark.parametrize("bad_block_index", [None, 0, 9, 24])
+def test_verify_in_worker_processes(file_block_store, monkeypatch, bad_block_index):
+    """
+    Test that worker processes read their ranges from their own store,
+    the calling process reading no block.
+    """
+    path, store = file_block_store
+    if bad_block_index is not None:
+        _set_block(store, bad_block_index, data=b"corrupted")
+
+    def fail_iter_blocks(*args):
+        raise AssertionError("Blocks read by the calling process")
+
+    monkeypatch.setattr(store, "iter_blocks", fail_iter_blocks)
+    store_factory = partial(open_local_block_store, path)
+
+    assert (
+        verify_chain(store, range_size=4, max_workers=2, store_factory=store_factory)
+        == bad_block_index
+    )
+    assert store.verify(range_size=4, max_workers=2) == bad_block_index
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from ucn.hash_tree import builder
+from ucn.hash_tree.builder import build_levels, hash_leaves, root_hash
+from ucn.hash_tree.node import HashNode, make_root_node, make_tree
+from ucn.hash_tree.utils import make_tree as make_tree_map
+
+
+def _reference_root(data_list: list[bytes]) -> str or None:
+    """Root hash built one HashNode at a time."""
+    node_hashes = [HashNode.hash(data) for data in sorted(data_list)]
+    hight = 0
+    while len(node_hashes) > 1:
+        hight += 1
+        node_hashes = [
+            HashNode.init_node(hight, *(node_hashes[i : i + 2] + [None])[:2]).hash_str
+            for i in range(0, len(node_hashes), 2)
+        ]
+    return node_hashes[0] if node_hashes else None
+
+
+def _data_list(count: int) -> list[bytes]:
+    return [b"data_%d" % i for i in reversed(range(count))]
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 5, 8, 17, 100])
+def test_root_matches_hash_nodes(count):
+    """
+    Test that the buffer builder yields the same root as hashing HashNodes.
+    """
+    levels = build_levels(hash_leaves(_data_list(count)))
+    assert root_hash(levels) == _reference_root(_data_list(count))
+
+    root, node_hight_map = make_tree(_data_list(count))
+    assert root == _reference_root(_data_list(count))
+    assert len(node_hight_map) == len(levels)
+
+
+def test_make_tree_nodes():
+    """
+    Test that the nodes of a tree are linked to and verified against their children.
+    """
+    node_hight_map = make_tree_map(_data_list(5))
+
+    assert [len(node_hight_map[hight]) for hight in node_hight_map] == [5, 3, 2, 1]
+    for hight in range(1, 4):
+        for i, node in enumerate(node_hight_map[hight]):
+            assert node.verify()
+            children = node_hight_map[hight - 1][2 * i : 2 * i + 2]
+            assert node.l_node == children[0].hash_str
+            assert node.r_node == (children[1].hash_str if len(children) > 1 else None)
+    node = node_hight_map[2][0]
+    assert HashNode.decode(node.encode()) == node
+
+
+def test_make_root_node():
+    """
+    Test that a root is built over existing leaf nodes.
+    """
+    node_list = make_tree_map(_data_list(6))[0]
+    root, node_hight_map = make_root_node(node_list)
+    assert root == _reference_root(_data_list(6))
+    assert node_hight_map[0] is node_list
+
+
+def test_build_levels_with_executor(monkeypatch):
+    """
+    Test that hashing large levels in chunks yields the same levels.
+    """
+    monkeypatch.setattr(builder, "EXECUTOR_CHUNK_SIZE", 4)
+    leaves = hash_leaves(_data_list(37))
+    with ThreadPoolExecutor(2) as executor:
+        assert build_levels(leaves, executor) == build_levels(leaves)
+
+
+def test_build_levels_invalid_buffer():
+    """
+    Test that a leaf buffer of partial digests is rejected.
+    """
+    with pytest.raises(ValueError):
+        build_levels(b"\x00" * 17)
@@ -0,0 +1,67 @@
+import pytest
+from ucn.hash_tree.compact import CompactHashTree, level_sizes
+from ucn.hash_tree.node import HashNode, make_tree
+
+
+def _data_list(count: int) -> list[bytes]:
+    return [b"data_%d" % i for i in reversed(range(count))]
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 5, 8, 33])
+def test_compact_tree_matches_make_tree(count):
+    """
+    Test that the compact tree has the root and nodes of make_tree.
+    """
+    tree = CompactHashTree.from_data(_data_list(count))
+    root, node_hight_map = make_tree(_data_list(count))
+
+    assert tree.root == root
+    assert tree.leaf_count == count
+    assert tree.hight == len(node_hight_map) - 1
+    assert tree.to_node_map() == node_hight_map
+    assert [tree.get_node(0, i) for i in range(count)] == node_hight_map.get(0, [])
+    assert tree.verify()
+
+
+def test_node_views():
+    """
+    Test that node views link to their children and verify.
+    """
+    tree = CompactHashTree.from_data(_data_list(5))
+    assert level_sizes(5) == [5, 3, 2, 1]
+    node = tree.get_node(1, 2)
+    assert node.verify()
+    assert node.l_node == tree.get_node(0, 4).hash_str
+    assert node.r_node is None
+    assert list(tree.iter_nodes(2)) == [tree.get_node(2, 0), tree.get_node(2, 1)]
+    assert tree.get_node(3, 0).hash_str == tree.root
+    assert isinstance(tree.get_node(3, 0), HashNode)
+    with pytest.raises(IndexError):
+        tree.get_node(1, 3)
+
+
+@pytest.mark.parametrize("count", [0, 1, 6])
+def test_save_and_load(tmp_path, count):
+    """
+    Test that a tree read back from disk is identical to the saved one.
+    """
+    tree = CompactHashTree.from_data(_data_list(count))
+    path = str(tmp_path / "tree.bin")
+    tree.save(path)
+    assert CompactHashTree.load(path) == tree
+    assert CompactHashTree.from_bytes(tree.to_bytes()) == tree
+    assert len(tree.to_bytes()) == 20 + tree.nbytes
+
+
+def test_load_corrupted_tree():
+    """
+    Test that malformed buffers are rejected and tampered levels fail verify.
+    """
+    data = bytearray(CompactHashTree.from_data(_data_list(6)).to_bytes())
+    with pytest.raises(ValueError):
+        CompactHashTree.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        CompactHashTree.from_bytes(b"not a tree" * 3)
+
+    data[-1] ^= 1
+    assert not CompactHashTree.from_bytes(data).verify()
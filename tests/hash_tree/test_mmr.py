@@ -0,0 +1,133 @@
+import pytest
+from ucn.hash_tree.builder import build_levels, hash_data, root_hash
+from ucn.hash_tree.mmr import (
+    MMRProof,
+    MerkleMountainRange,
+    iter_peaks,
+    leaf_count_of,
+    mmr_size,
+)
+
+
+def _data_list(count: int) -> list[bytes]:
+    return [b"leaf_%d" % i for i in range(count)]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 7, 8, 13, 64])
+def test_peaks_match_hash_trees(count):
+    """
+    Test that every peak is the root of a hash tree over its leaves.
+    """
+    mmr = MerkleMountainRange()
+    assert mmr.extend(_data_list(count)) == list(range(count))
+    assert mmr.leaf_count == count
+    assert mmr.storage.get_size() == mmr_size(count)
+    assert leaf_count_of(mmr_size(count)) == count
+
+    data_list = _data_list(count)
+    for (first_leaf_index, hight), peak in zip(iter_peaks(count), mmr.get_peaks()):
+        leaves = b"".join(
+            hash_data(data)
+            for data in data_list[first_leaf_index : first_leaf_index + (1 << hight)]
+        )
+        assert peak.hex() == root_hash(build_levels(leaves))
+
+
+def test_appends_match_batch():
+    """
+    Test that appending leaves one by one yields the same nodes as one batch.
+    """
+    batch = MerkleMountainRange()
+    batch.extend(_data_list(37))
+    single = MerkleMountainRange()
+    roots = [single.root()]
+    for data in _data_list(37):
+        single.append(data)
+        roots.append(single.root())
+
+    assert single.storage.get_size() == batch.storage.get_size()
+    assert roots[0] is None
+    assert roots[1:] == [batch.root(count) for count in range(1, 38)]
+    assert len(set(roots)) == 38
+
+
+@pytest.mark.parametrize("count", [1, 2, 5, 8, 11, 32])
+def test_prove_and_verify(count):
+    """
+    Test that every leaf is proven against the current and all later roots.
+    """
+    mmr = MerkleMountainRange()
+    mmr.extend(_data_list(count + 5))
+    data_list = _data_list(count + 5)
+    for leaf_count in (count, count + 5):
+        root = mmr.root(leaf_count)
+        for leaf_index in range(leaf_count):
+            proof = mmr.prove(leaf_index, leaf_count)
+            assert MerkleMountainRange.verify(root, data_list[leaf_index], proof)
+            assert not MerkleMountainRange.verify(root, b"forged", proof)
+    assert not MerkleMountainRange.verify(mmr.root(count), data_list[0], proof)
+
+
+def test_proof_encoding():
+    """
+    Test that proofs survive encoding and tampered proofs fail.
+    """
+    mmr = MerkleMountainRange()
+    mmr.extend(_data_list(10))
+    proof = mmr.prove(5)
+    decoded = MMRProof.decode(proof.encode())
+    assert decoded == proof
+    assert MerkleMountainRange.verify(mmr.root(), b"leaf_5", decoded)
+
+    decoded.path[0] = "00" * 16
+    assert not MerkleMountainRange.verify(mmr.root(), b"leaf_5", decoded)
+    decoded = MMRProof.decode(proof.encode())
+    decoded.leaf_count = 11
+    assert not MerkleMountainRange.verify(mmr.root(), b"leaf_5", decoded)
+
+    with pytest.raises(IndexError):
+        mmr.prove(10)
+    with pytest.raises(IndexError):
+        mmr.root(11)
+
+
+def test_truncate():
+    """
+    Test that a truncated range continues like it never held the dropped leaves.
+    """
+    mmr = MerkleMountainRange()
+    mmr.extend(_data_list(20))
+    root = mmr.root(9)
+    mmr.truncate(9)
+    assert mmr.leaf_count == 9
+    assert mmr.root() == root
+
+    mmr.extend(_data_list(20)[9:])
+    reference = MerkleMountainRange()
+    reference.extend(_data_list(20))
+    assert mmr.root() == reference.root()
+
+
+@pytest.mark.parametrize(
+    "path, peaks",
+    [
+        (["zz"], None),
+        ([None], None),
+        (["00"], None),
+        (None, ["zz"]),
+        (None, ["00" * 17]),
+    ],
+)
+def test_malformed_proof(path, peaks):
+    """
+    Test that proofs with undecodable or wrongly sized digests fail verification.
+    """
+    mmr = MerkleMountainRange()
+    mmr.extend(_data_list(6))
+    proof = mmr.prove(1)
+    if path is not None:
+        proof.path[: len(path)] = path
+    if peaks is not None:
+        proof.peaks[: len(peaks)] = peaks
+
+    assert not MerkleMountainRange.verify(mmr.root(), b"leaf_1", proof)
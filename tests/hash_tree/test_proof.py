@@ -0,0 +1,96 @@
+import pytest
+from ucn.hash_tree.builder import hash_data
+from ucn.hash_tree.compact import CompactHashTree
+from ucn.hash_tree.proof import MultiProof, verify, verify_digests, verify_many
+
+
+def _tree(count: int) -> tuple[CompactHashTree, list[bytes]]:
+    data_list = sorted(b"data_%d" % i for i in range(count))
+    return CompactHashTree.from_data(data_list), data_list
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 7, 8, 9, 33])
+def test_prove_every_leaf(count):
+    """
+    Test that every leaf is proven, including lone nodes of odd levels.
+    """
+    tree, data_list = _tree(count)
+    for leaf_index, data in enumerate(data_list):
+        proof = tree.prove(leaf_index)
+        assert len(proof.siblings) <= tree.hight
+        assert verify(tree.root, data, proof)
+        assert not verify(tree.root, b"forged", proof)
+
+
+@pytest.mark.parametrize(
+    "indices", [[0], [0, 1], [3, 4], [0, 5, 12], list(range(13)), [12, 2, 2]]
+)
+def test_prove_many(indices):
+    """
+    Test that multiproofs verify and hold each shared sibling once.
+    """
+    tree, data_list = _tree(13)
+    proof = tree.prove_many(indices)
+    assert proof.indices == sorted(set(indices))
+    assert verify_many(tree.root, [data_list[i] for i in proof.indices], proof)
+    assert len(proof.siblings) <= sum(len(tree.prove(i).siblings) for i in indices)
+    if len(proof.indices) == 13:
+        assert proof.siblings == []
+
+    leaves = [hash_data(data_list[i]) for i in proof.indices]
+    assert verify_digests(tree.root, leaves, proof)
+    assert not verify_digests(tree.root, leaves[::-1] + [leaves[0]], proof)
+
+
+def test_tampered_proofs():
+    """
+    Test that proofs with altered siblings, indices or leaf counts are rejected.
+    """
+    tree, data_list = _tree(10)
+    proof = tree.prove_many([1, 6])
+    data = [data_list[1], data_list[6]]
+    assert verify_many(tree.root, data, proof)
+
+    for change in [
+        lambda p: p.siblings.__setitem__(0, "00" * 16),
+        lambda p: p.siblings.pop(),
+        lambda p: p.siblings.append("00" * 16),
+        lambda p: p.indices.__setitem__(1, 7),
+        lambda p: setattr(p, "leaf_count", 6),
+        lambda p: setattr(p, "indices", [6, 1]),
+    ]:
+        tampered = MultiProof.decode(proof.encode())
+        change(tampered)
+        assert not verify_many(tree.root, data, tampered)
+
+    with pytest.raises(IndexError):
+        tree.prove(10)
+    with pytest.raises(ValueError):
+        tree.prove_many([])
+
+
+@pytest.mark.parametrize("sibling", ["00" * 15, "00" * 17, "", "zz" * 16, None])
+def test_malformed_proof(sibling):
+    """
+    Test that proofs with undecodable or wrongly sized siblings fail verification.
+    """
+    tree, data_list = _tree(10)
+    proof = tree.prove(3)
+    proof.siblings[1] = sibling
+
+    assert not verify(tree.root, data_list[3], proof)
+
+
+def test_proof_serialization():
+    """
+    Test that proofs survive byte serialization and stay small.
+    """
+    tree = CompactHashTree.from_leaves(
+        b"".join(hash_data(b"%d" % i) for i in range(1000))
+    )
+    proof = tree.prove_many([10, 11, 500])
+    assert MultiProof.from_bytes(proof.to_bytes()) == proof
+    assert MultiProof.decode(proof.encode()) == proof
+    assert len(tree.prove(123).to_bytes()) == 12 + 8 + 10 * 16
+    with pytest.raises(ValueError):
+        MultiProof.from_bytes(proof.to_bytes()[:-1])
@@ -0,0 +1,172 @@
+import random
+import pytest
+from ucn.hash_tree.sparse import (
+    EMPTY_ROOT,
+    KEY_BITS,
+    SparseMerkleTree,
+    SparseProof,
+    key_path,
+    verify,
+)
+
+
+def _items(count: int) -> dict[str, bytes]:
+    return {f"ucn://bill/{i}": b"amount=%d" % i for i in range(count)}
+
+
+def test_batch_matches_single_updates():
+    """
+    Test that a batch update yields the same root as setting keys one by one.
+    """
+    batch = SparseMerkleTree()
+    assert batch.root == EMPTY_ROOT
+    root = batch.update(_items(50))
+
+    single = SparseMerkleTree()
+    for key, value in reversed(_items(50).items()):
+        single.set(key, value)
+    assert single.root == root == batch.root
+    assert single.storage.nodes == batch.storage.nodes
+    assert batch.get("ucn://bill/7") == b"amount=7"
+    assert batch.get("ucn://bill/50") is None
+
+
+def test_unset_keys():
+    """
+    Test that unsetting keys restores earlier roots and drops their nodes.
+    """
+    tree = SparseMerkleTree()
+    root = tree.update(_items(10))
+    tree.update({"ucn://account/a": b"key", "ucn://bill/3": b"spent"})
+    assert tree.update({"ucn://account/a": None, "ucn://bill/3": b"amount=3"}) == root
+
+    assert tree.update({key: None for key in _items(10)}) == EMPTY_ROOT
+    assert tree.storage.nodes == {}
+    assert tree.storage.values == {}
+
+
+@pytest.mark.parametrize("count", [0, 1, 20])
+def test_prove_and_verify(count):
+    """
+    Test that values and unset keys are proven against the root.
+    """
+    tree = SparseMerkleTree()
+    root = tree.update(_items(count))
+    for key, value in _items(count).items():
+        proof = tree.prove(key)
+        assert verify(root, key, value, proof)
+        assert not verify(root, key, b"forged", proof)
+        assert not verify(root, key, None, proof)
+
+    proof = SparseProof.decode(tree.prove("ucn://bill/missing").encode())
+    assert verify(root, "ucn://bill/missing", None, proof)
+    assert not verify(root, "ucn://bill/missing", b"forged", proof)
+    assert not verify(root, "ucn://bill/other", None, proof)
+
+
+def test_tampered_proof():
+    """
+    Test that proofs with altered siblings, bitmaps or heights are rejected.
+    """
+    tree = SparseMerkleTree()
+    root = tree.update(_items(8))
+    proof = tree.prove("ucn://bill/2")
+    assert proof.siblings
+
+    tampered = SparseProof.decode(proof.encode())
+    tampered.siblings[0] = "00" * 16
+    assert not verify(root, "ucn://bill/2", b"amount=2", tampered)
+    tampered = SparseProof.decode(proof.encode())
+    tampered.bitmap ^= 1 << 127
+    assert not verify(root, "ucn://bill/2", b"amount=2", tampered)
+    tampered = SparseProof.decode(proof.encode())
+    tampered.hight -= 1
+    assert not verify(root, "ucn://bill/2", b"amount=2", tampered)
+
+
+def test_shortcut_leaves():
+    """
+    Test that a key alone in its subtree is stored as one leaf, about two nodes per key.
+    """
+    tree = SparseMerkleTree()
+    tree.set("ucn://bill/0", b"amount=0")
+    assert list(tree.storage.nodes) == [(KEY_BITS, 0)]
+
+    tree.update(_items(1000))
+    assert len(tree.storage.nodes) < 3 * 1000
+    proof = tree.prove("ucn://bill/7")
+    assert proof.hight > KEY_BITS - 20
+    assert len(proof.siblings) <= KEY_BITS - proof.hight
+
+
+def test_random_updates_match_fresh_tree():
+    """
+    Test that any sequence of batches leaves the nodes a fresh tree over the same keys has.
+    """
+    rng = random.Random(7)
+    tree = SparseMerkleTree()
+    state = {}
+    for _ in range(30):
+        batch = {
+            f"ucn://bill/{rng.randrange(40)}": (
+                None if rng.random() < 0.4 else b"amount=%d" % rng.randrange(5)
+            )
+            for _ in range(rng.randrange(1, 20))
+        }
+        root = tree.update(batch)
+        state.update(batch)
+        state = {key: value for key, value in state.items() if value is not None}
+
+        fresh = SparseMerkleTree()
+        assert root == (fresh.update(state) if state else EMPTY_ROOT)
+        assert tree.storage.nodes == fresh.storage.nodes
+        for key in (f"ucn://bill/{i}" for i in range(40)):
+            assert verify(root, key, state.get(key), tree.prove(key))
+
+
+def test_unset_key_under_other_leaf():
+    """
+    Test that a key whose path ends at the leaf of another key is proven unset.
+    """
+    tree = SparseMerkleTree()
+    root = tree.update(_items(20))
+    proofs = [tree.prove(f"ucn://bill/missing/{i}") for i in range(200)]
+    proof = next(proof for proof in proofs if proof.leaf is not None)
+    key = proof.key
+    assert verify(root, key, None, proof)
+    assert not verify(root, key, b"forged", proof)
+
+    # The leaf must lie in the subtree of the key, and belong to another key
+    other = SparseProof.decode(proof.encode())
+    other.leaf = proof.leaf[:32] + key_path(key).to_bytes(16, "big").hex()
+    assert not verify(root, key, None, other)
+    other = SparseProof.decode(proof.encode())
+    other.leaf = (
+        proof.leaf[:32] + (key_path(key) ^ (1 << 127)).to_bytes(16, "big").hex()
+    )
+    assert not verify(root, key, None, other)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda p: p.siblings.__setitem__(0, "00" * 15),
+        lambda p: p.siblings.__setitem__(0, "00" * 17),
+        lambda p: p.siblings.__setitem__(0, "zz" * 16),
+        lambda p: p.siblings.__setitem__(0, None),
+        lambda p: setattr(p, "leaf", "00" * 16),
+        lambda p: setattr(p, "hight", KEY_BITS + 1),
+        lambda p: setattr(p, "bitmap", p.bitmap | 1 << (p.hight - 1)),
+    ],
+)
+def test_malformed_proof(change):
+    """
+    Test that proofs with undecodable or misplaced digests fail verification.
+    """
+    tree = SparseMerkleTree()
+    root = tree.update(_items(8))
+    proof = tree.prove("ucn://bill/2")
+    change(proof)
+
+    assert not verify(root, "ucn://bill/2", None, proof)
+    assert not verify(root, "ucn://bill/2", b"amount=2", proof)
@@ -1,13 +1,16 @@
 from time import time
 from ucn.proto.account_pb2 import AccountBlock, PublicKey, AdditionalBlock
 from ucn.account.wallet import Account
-from .store.local_store import local_block_store
+from .data.basic_block import BasicBlock
+from .store.local_store import local_block_store, LocalBlockStore
 
 ACCOUNT_PROTOCOL = "account"
 ACCOUNT_ADDON_PROTOCOL = "account_addon"
 
 
-def add_account(account: Account) -> str:
+def add_account(
+    account: Account, block_store: LocalBlockStore = local_block_store
+) -> str:
     protobuf_account = AccountBlock(
         creation_time=int(time()),
         encode_algo=account.encode_algo,
@@ -19,23 +22,54 @@ def add_account(account: Account) -> str:
             for key in account.key.key_list
         ],
     )
-    return local_block_store.add_block(
+    return block_store.add_block(
         protocol=ACCOUNT_PROTOCOL, data=protobuf_account.SerializeToString()
     )
 
 
-def add_account_addon(account: Account, addon_map: map[str, bytes]) -> list[str]:
+def add_account_addon(
+    account: Account,
+    addon_map: dict[str, bytes],
+    block_store: LocalBlockStore = local_block_store,
+) -> list[str]:
     hash_list = []
     for key, value in addon_map.items():
         protobuf_account_addon = AdditionalBlock(
             account_url=account.id_url,
-            protocal=key,
+            protocol=key,
             data=value,
         )
         hash_list.append(
-            local_block_store.add_block(
+            block_store.add_block(
                 protocol=ACCOUNT_ADDON_PROTOCOL,
                 data=protobuf_account_addon.SerializeToString(),
             )
         )
     return hash_list
+
+
+def get_account_addons(
+    account_url: str, block_store: LocalBlockStore = local_block_store
+) -> list[AdditionalBlock]:
+    # Answered from the account_url index, other add-on blocks are not parsed.
+    # Every store writing add-ons must call register_account_indexers, otherwise
+    # KeyIndexError is raised until block_store.reindex_keys rebuilds the index
+    account_addons = []
+    for _, block in block_store.iter_blocks_by_key(ACCOUNT_ADDON_PROTOCOL, account_url):
+        account_addon = AdditionalBlock()
+        account_addon.ParseFromString(block.data)
+        account_addons.append(account_addon)
+    return account_addons
+
+
+def _account_addon_keys(block: BasicBlock) -> list[str]:
+    account_addon = AdditionalBlock()
+    account_addon.ParseFromString(block.data)
+    return [account_addon.account_url]
+
+
+def register_account_indexers(block_store: LocalBlockStore):
+    block_store.register_key_indexer(ACCOUNT_ADDON_PROTOCOL, _account_addon_keys)
+
+
+register_account_indexers(local_block_store)
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Iterator
 
 
 @dataclass
@@ -8,11 +9,13 @@ class BasicBlock:
     data: bytes
 
     def serialize(self) -> bytes:
-        return (
-            b"%b/n" % self.protocol.encode("utf8")
-            + b"%b/n" % self.previous_block_hash.encode("utf8")
-            + b"%b" % self.data
-        )
+        return b"".join(self.iter_serialized())
+
+    def iter_serialized(self) -> Iterator[bytes or memoryview]:
+        # The parts of serialize in order, without copying data
+        yield b"%b/n" % self.protocol.encode("utf8")
+        yield b"%b/n" % self.previous_block_hash.encode("utf8")
+        yield memoryview(self.data)
 
     @staticmethod
     def deserialize(data: bytes) -> "BasicBlock":
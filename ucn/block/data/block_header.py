@@ -0,0 +1,23 @@
+from dataclasses import dataclass, field
+from typing import Callable
+from .basic_block import BasicBlock
+
+
+@dataclass(frozen=True)
+class BlockHeader:
+    block_index: int
+    protocol: str
+    block_hash: str
+    previous_block_hash: str
+    # Size of the raw block data
+    data_size: int
+    # Reads the full block by its hash, set by the store returning the header
+    loader: Callable[[str], BasicBlock or None] = field(
+        default=None, repr=False, compare=False
+    )
+
+    def load_block(self) -> BasicBlock or None:
+        # Read the block data on demand, None if the block has been removed since
+        if self.loader is None:
+            return None
+        return self.loader(self.block_hash)
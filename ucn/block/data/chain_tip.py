@@ -0,0 +1,11 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ChainTip:
+    block_index: int
+    block_hash: str
+    block_count: int
+
+
+EMPTY_CHAIN_TIP = ChainTip(block_index=-1, block_hash="", block_count=0)
@@ -0,0 +1,7 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    block_index: int
+    block_hash: str
@@ -8,3 +8,19 @@ class InvalidPreviousBlockHashError(BlockChainError):
 
 class MissingGenesisBlockError(BlockChainError):
     """Raised when an operation requires the existence of a genesis block but it does not exist."""
+
+
+class InvalidChainNameError(BlockChainError):
+    """Raised when a chain name cannot be used as a block table or database file name."""
+
+
+class KeyIndexError(BlockChainError):
+    """Raised when the key index of a protocol does not cover every block of the protocol."""
+
+
+class UnknownCodecError(BlockChainError):
+    """Raised when a stored payload uses a codec or dictionary which is not available."""
+
+
+class SnapshotError(BlockChainError):
+    """Raised when a chain snapshot file is malformed or does not match its digest."""
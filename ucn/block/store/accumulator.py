@@ -0,0 +1,74 @@
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from ...hash_tree.mmr import MMRProof, MMRStorage, MerkleMountainRange
+from ..data.basic_block import BasicBlock
+from .base_store import BaseBlockStore
+from .models import MMRNodeModel
+
+
+class SQLMMRStorage(MMRStorage):
+    """Merkle Mountain Range nodes of a chain, read and written in session"""
+
+    def __init__(self, session: Session, chain_name: str):
+        self.session = session
+        self.chain_name = chain_name
+
+    def get_size(self) -> int:
+        last_position = self.session.scalar(
+            select(func.max(MMRNodeModel.position)).where(
+                MMRNodeModel.chain_name == self.chain_name
+            )
+        )
+        return 0 if last_position is None else last_position + 1
+
+    def get(self, position: int) -> bytes:
+        return self.session.scalar(
+            select(MMRNodeModel.digest).where(
+                MMRNodeModel.chain_name == self.chain_name,
+                MMRNodeModel.position == position,
+            )
+        )
+
+    def append(self, digests: list[bytes]):
+        if not digests:
+            return
+        size = self.get_size()
+        self.session.execute(
+            insert(MMRNodeModel),
+            [
+                {
+                    "chain_name": self.chain_name,
+                    "position": size + i,
+                    "digest": digest,
+                }
+                for i, digest in enumerate(digests)
+            ],
+        )
+
+    def truncate(self, size: int):
+        truncate_mmr_nodes(self.session, self.chain_name, size)
+
+
+def truncate_mmr_nodes(session, chain_name: str, size: int):
+    # Shared with the async store, session may be a Session or an AsyncSession
+    return session.execute(
+        delete(MMRNodeModel).where(
+            MMRNodeModel.chain_name == chain_name,
+            MMRNodeModel.position >= size,
+        )
+    )
+
+
+def block_leaf(block_hash: str) -> bytes:
+    # Leaves commit to the block hashes
+    return block_hash.encode("utf8")
+
+
+def verify_block_proof(root: str, block: BasicBlock, proof: MMRProof) -> bool:
+    """Check that a block is included in the chain with this accumulator root
+
+    Light clients hash the block themselves, so only the root has to be trusted.
+    """
+    return MerkleMountainRange.verify(
+        root, block_leaf(BaseBlockStore.get_hash(block)), proof
+    )
@@ -0,0 +1,64 @@
+from abc import ABCMeta, abstractmethod
+from typing import AsyncIterator, Callable, Iterable
+
+from ucn.block.data.basic_block import BasicBlock
+from ucn.block.store.base_store import BaseBlockStore
+
+
+class AsyncBaseBlockStore(metaclass=ABCMeta):
+    @abstractmethod
+    async def add_block(
+        self, protocol: str, data: bytes, previous_block_hash: str
+    ) -> str:
+        pass
+
+    @abstractmethod
+    async def add_blocks(self, blocks: Iterable[BasicBlock]) -> list[str]:
+        pass
+
+    @abstractmethod
+    async def get_block(self, block_hash: str) -> BasicBlock or None:
+        pass
+
+    @abstractmethod
+    async def get_block_by_index(self, block_index: int) -> BasicBlock or None:
+        pass
+
+    @abstractmethod
+    def iter_blocks(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> AsyncIterator[BasicBlock]:
+        pass
+
+    @abstractmethod
+    def iter_blocks_by_protocol(
+        self, protocol: str, since_index: int = 0, batch_size: int = 1000
+    ) -> AsyncIterator[tuple[int, BasicBlock]]:
+        pass
+
+    @abstractmethod
+    async def get_block_count(self) -> int:
+        return 0
+
+    @abstractmethod
+    async def remove_block(self, block_hash: str) -> list[BasicBlock]:
+        pass
+
+    @abstractmethod
+    async def remove_block_by_index(self, block_index: int) -> list[BasicBlock]:
+        pass
+
+    @abstractmethod
+    async def truncate(
+        self, block_hash: str, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        pass
+
+    @abstractmethod
+    async def truncate_by_index(
+        self, block_index: int, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        pass
+
+    # Hashes are shared with the synchronous stores
+    get_hash = staticmethod(BaseBlockStore.get_hash)
@@ -0,0 +1,358 @@
+import asyncio
+from inspect import isawaitable
+from typing import AsyncIterator, Callable, Iterable
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from ..error import (
+    InvalidPreviousBlockHashError,
+    MissingGenesisBlockError,
+    UnknownCodecError,
+)
+from ..data.basic_block import BasicBlock
+from ..data.chain_tip import ChainTip, EMPTY_CHAIN_TIP
+from ...hash_tree.mmr import mmr_size
+from .codec import decode_payload
+from .models import init_database, get_block_model, CodecDictionaryModel
+from .payload import (
+    RELEASE_PAYLOAD,
+    DELETE_UNUSED_PAYLOADS,
+    select_blocks,
+    select_payload_references,
+)
+from .accumulator import truncate_mmr_nodes
+from .key_index import delete_block_keys, invalidate_key_indexes
+from .async_base_store import AsyncBaseBlockStore
+
+
+class AsyncLocalBlockStore(AsyncBaseBlockStore):
+    def __init__(self, engine: AsyncEngine, chain_name: str = "blocks"):
+        self.engine = engine
+        self.chain_name = chain_name
+        self.BLOCK_MODEL = get_block_model(chain_name)
+        # Tables are created on first use, since the constructor cannot await
+        self._database_ready = False
+        # In-process record of the latest block, loaded lazily from the database
+        self._tip: ChainTip or None = None
+        # Serializes writers on the event loop, readers never wait on it
+        self._write_lock = asyncio.Lock()
+        # Compression dictionaries by id, loaded when a payload needs one
+        self._dictionaries: dict[str, bytes] = {}
+
+    async def add_block(
+        self, protocol: str, data: bytes, previous_block_hash: str = None
+    ) -> str:
+        async with self._write_lock:
+            if previous_block_hash is None:
+                previous_block_hash = (await self.get_tip()).block_hash
+            block = BasicBlock(
+                protocol=protocol,
+                previous_block_hash=previous_block_hash,
+                data=data,
+            )
+            return (await self._add_blocks([block]))[0]
+
+    async def add_blocks(self, blocks: Iterable[BasicBlock]) -> list[str]:
+        async with self._write_lock:
+            return await self._add_blocks(list(blocks))
+
+    async def get_block(self, block_hash: str) -> BasicBlock or None:
+        async with await self._session() as session:
+            # Retrieve the block with the specified block hash
+            row = (
+                await session.execute(
+                    self._select_blocks().where(
+                        self.BLOCK_MODEL.block_hash == block_hash
+                    )
+                )
+            ).first()
+            return await self._to_block(row) if row else None
+
+    async def get_block_by_index(self, block_index: int) -> BasicBlock or None:
+        async with await self._session() as session:
+            # If block_index is -1, retrieve the latest block
+            if block_index == -1:
+                block_index = (await self._get_tip(session)).block_index
+
+            # Retrieve the block with the specified block index
+            row = (
+                await session.execute(
+                    self._select_blocks().where(
+                        self.BLOCK_MODEL.block_index == block_index
+                    )
+                )
+            ).first()
+            return await self._to_block(row) if row else None
+
+    async def iter_blocks(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> AsyncIterator[BasicBlock]:
+        async for row in self._iter_rows(start_index, end_index, batch_size):
+            yield await self._to_block(row)
+
+    async def iter_blocks_by_protocol(
+        self, protocol: str, since_index: int = 0, batch_size: int = 1000
+    ) -> AsyncIterator[tuple[int, BasicBlock]]:
+        # Served by the (protocol, block_index) index, blocks of other protocols are not read
+        async for row in self._iter_rows(
+            since_index, None, batch_size, self.BLOCK_MODEL.protocol == protocol
+        ):
+            yield row.block_index, await self._to_block(row)
+
+    async def _iter_rows(
+        self, start_index: int, end_index: int or None, batch_size: int, *conditions
+    ) -> AsyncIterator:
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        next_block_index = start_index
+        while True:
+            # Keyset pagination: each page starts right after the last streamed index
+            statement = self._select_blocks(self.BLOCK_MODEL.block_index).where(
+                self.BLOCK_MODEL.block_index >= next_block_index, *conditions
+            )
+            if end_index is not None:
+                statement = statement.where(self.BLOCK_MODEL.block_index < end_index)
+            statement = (
+                statement.order_by(self.BLOCK_MODEL.block_index.asc())
+                .limit(batch_size)
+                .execution_options(yield_per=batch_size)
+            )
+
+            # A short-lived session per page, so no read transaction is held between pages
+            row_count = 0
+            async with await self._session() as session:
+                async for row in await session.stream(statement):
+                    row_count += 1
+                    next_block_index = row.block_index + 1
+                    yield row
+
+            if row_count < batch_size:
+                return
+
+    async def get_latest_block_hash(self) -> str:
+        return (await self.get_tip()).block_hash
+
+    async def get_block_count(self) -> int:
+        return (await self.get_tip()).block_count
+
+    async def get_tip(self) -> ChainTip:
+        if self._tip is None:
+            async with await self._session() as session:
+                return await self._get_tip(session)
+        return self._tip
+
+    async def refresh_tip(self) -> ChainTip:
+        # Reload the tip record, e.g. after another process wrote to the database
+        async with await self._session() as session:
+            return await self._load_tip(session)
+
+    async def remove_block(self, block_hash: str) -> list[BasicBlock]:
+        # Remove the block with the specified block hash and all the blocks that follow it
+        blocks = []
+        await self.truncate(block_hash, blocks.append)
+        return blocks
+
+    async def remove_block_by_index(self, block_index: int) -> list[BasicBlock]:
+        # Remove the block with the specified block index and all the blocks that follow it
+        blocks = []
+        await self.truncate_by_index(block_index, blocks.append)
+        return blocks
+
+    async def truncate(
+        self, block_hash: str, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        async with self._write_lock, await self._session() as session:
+            block_index = await session.scalar(
+                select(self.BLOCK_MODEL.block_index).where(
+                    self.BLOCK_MODEL.block_hash == block_hash
+                )
+            )
+            if block_index is None:
+                return 0
+            return await self._truncate(session, block_index, callback)
+
+    async def truncate_by_index(
+        self, block_index: int, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        async with self._write_lock, await self._session() as session:
+            return await self._truncate(session, block_index, callback)
+
+    async def _session(self) -> AsyncSession:
+        if not self._database_ready:
+            async with self.engine.begin() as connection:
+                await connection.run_sync(init_database, [self.BLOCK_MODEL])
+            self._database_ready = True
+        return AsyncSession(self.engine)
+
+    async def _add_blocks(self, blocks: list[BasicBlock]) -> list[str]:
+        if not blocks:
+            return []
+
+        async with await self._session() as session:
+            tip = await self._check_tip(session)
+            if not tip.block_count and blocks[0].previous_block_hash:
+                # If the genesis block does not exist in the database yet, raise an error
+                raise MissingGenesisBlockError(
+                    "Missing genesis block: The database does not contain a genesis block yet."
+                )
+
+            # Validate the linkage of the whole batch in memory before writing anything
+            rows = []
+            previous_block_hash = tip.block_hash
+            next_block_index = tip.block_index + 1
+            for block in blocks:
+                if block.previous_block_hash != previous_block_hash:
+                    raise InvalidPreviousBlockHashError(
+                        "Invalid previous block hash: The given previous block hash does not match the hash of the latest block in the database."
+                    )
+                block_hash = self.get_hash(block)
+                rows.append(
+                    {
+                        "protocol": block.protocol,
+                        "data": block.data,
+                        "data_size": len(block.data),
+                        "previous_block_hash": block.previous_block_hash,
+                        "block_hash": block_hash,
+                        "block_index": next_block_index,
+                    }
+                )
+                previous_block_hash = block_hash
+                next_block_index += 1
+
+            # Write the whole batch in a single transaction
+            try:
+                await session.execute(insert(self.BLOCK_MODEL), rows)
+                # Blocks are written without index entries
+                await session.execute(
+                    invalidate_key_indexes(
+                        self.chain_name, {row["protocol"] for row in rows}
+                    )
+                )
+                await session.commit()
+            except IntegrityError as e:
+                # Another writer appended to the chain behind our back
+                await session.rollback()
+                self._tip = None
+                raise InvalidPreviousBlockHashError(
+                    "Invalid previous block hash: The chain was extended by another writer."
+                ) from e
+
+            self._tip = ChainTip(
+                block_index=tip.block_index + len(rows),
+                block_hash=previous_block_hash,
+                block_count=tip.block_count + len(rows),
+            )
+
+        return [row["block_hash"] for row in rows]
+
+    async def _truncate(
+        self,
+        session: AsyncSession,
+        block_index: int,
+        callback: Callable[[BasicBlock], None] or None,
+    ) -> int:
+        if callback is not None:
+            # Stream the removed blocks in index order inside the deleting transaction,
+            # so nothing is deleted if the callback raises
+            statement = (
+                self._select_blocks()
+                .where(self.BLOCK_MODEL.block_index >= block_index)
+                .order_by(self.BLOCK_MODEL.block_index.asc())
+                .execution_options(yield_per=1000)
+            )
+            async for row in await session.stream(statement):
+                result = callback(await self._to_block(row))
+                if isawaitable(result):
+                    await result
+
+        # Release the payloads shared with a deduplicating LocalBlockStore
+        references = (
+            await session.execute(
+                select_payload_references(
+                    self.BLOCK_MODEL, self.BLOCK_MODEL.block_index >= block_index
+                )
+            )
+        ).all()
+        if references:
+            connection = await session.connection()
+            await connection.execute(
+                RELEASE_PAYLOAD, [row._asdict() for row in references]
+            )
+            await session.execute(DELETE_UNUSED_PAYLOADS)
+
+        # Remove the blocks with one set-based DELETE
+        result = await session.execute(
+            delete(self.BLOCK_MODEL)
+            .where(self.BLOCK_MODEL.block_index >= block_index)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(delete_block_keys(self.chain_name, block_index))
+        await truncate_mmr_nodes(
+            session, self.chain_name, mmr_size(max(block_index, 0))
+        )
+        await session.commit()
+        await self._load_tip(session)
+        return result.rowcount
+
+    def _select_blocks(self, *columns):
+        return select_blocks(self.BLOCK_MODEL, *columns)
+
+    async def _to_block(self, row) -> BasicBlock:
+        # Payloads compressed by a LocalBlockStore are decompressed transparently
+        try:
+            data = decode_payload(row.codec, row.data, self._dictionaries)
+        except UnknownCodecError:
+            async with AsyncSession(self.engine) as session:
+                self._dictionaries = {
+                    dictionary.dictionary_id: dictionary.data
+                    for dictionary in await session.execute(
+                        select(
+                            CodecDictionaryModel.dictionary_id,
+                            CodecDictionaryModel.data,
+                        )
+                    )
+                }
+            data = decode_payload(row.codec, row.data, self._dictionaries)
+        return BasicBlock(
+            protocol=row.protocol,
+            previous_block_hash=row.previous_block_hash,
+            data=data,
+        )
+
+    async def _get_tip(self, session: AsyncSession) -> ChainTip:
+        if self._tip is None:
+            return await self._load_tip(session)
+        return self._tip
+
+    async def _load_tip(self, session: AsyncSession) -> ChainTip:
+        # Only the index and hash columns are read, never the block data
+        latest_block = (
+            await session.execute(
+                select(self.BLOCK_MODEL.block_index, self.BLOCK_MODEL.block_hash)
+                .order_by(self.BLOCK_MODEL.block_index.desc())
+                .limit(1)
+            )
+        ).first()
+        if latest_block:
+            # Block indices are contiguous from the genesis block
+            self._tip = ChainTip(
+                block_index=latest_block.block_index,
+                block_hash=latest_block.block_hash,
+                block_count=latest_block.block_index + 1,
+            )
+        else:
+            self._tip = EMPTY_CHAIN_TIP
+        return self._tip
+
+    async def _check_tip(self, session: AsyncSession) -> ChainTip:
+        # Make sure the cached tip still exists in the database with a primary key lookup
+        tip = await self._get_tip(session)
+        if tip.block_count:
+            block_hash = await session.scalar(
+                select(self.BLOCK_MODEL.block_hash).where(
+                    self.BLOCK_MODEL.block_index == tip.block_index
+                )
+            )
+            if block_hash != tip.block_hash:
+                return await self._load_tip(session)
+        return tip
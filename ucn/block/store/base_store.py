@@ -1,9 +1,11 @@
 from abc import ABCMeta, abstractmethod
+from typing import Callable, Iterable, Iterator
 
 import hashlib
 from google.protobuf import message
 
 from ucn.block.data.basic_block import BasicBlock
+from ucn.block.data.block_header import BlockHeader
 
 
 class BaseBlockStore(metaclass=ABCMeta):
@@ -13,6 +15,10 @@ class BaseBlockStore(metaclass=ABCMeta):
     ) -> BasicBlock:
         pass
 
+    @abstractmethod
+    def add_blocks(self, blocks: Iterable[BasicBlock]) -> list[str]:
+        pass
+
     @abstractmethod
     def get_block(self, block_hash: str) -> BasicBlock or None:
         pass
@@ -21,6 +27,36 @@ class BaseBlockStore(metaclass=ABCMeta):
     def get_block_by_index(self, block_index: int) -> BasicBlock or None:
         pass
 
+    @abstractmethod
+    def iter_blocks(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> Iterator[BasicBlock]:
+        pass
+
+    @abstractmethod
+    def iter_blocks_by_protocol(
+        self, protocol: str, since_index: int = 0, batch_size: int = 1000
+    ) -> Iterator[tuple[int, BasicBlock]]:
+        pass
+
+    @abstractmethod
+    def get_header(self, block_hash: str) -> BlockHeader or None:
+        pass
+
+    @abstractmethod
+    def get_header_by_index(self, block_index: int) -> BlockHeader or None:
+        pass
+
+    @abstractmethod
+    def iter_headers(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> Iterator[BlockHeader]:
+        pass
+
+    @abstractmethod
+    def get_latest_block_hash(self) -> str:
+        pass
+
     @abstractmethod
     def get_block_count(self) -> int:
         return 0
@@ -33,11 +69,26 @@ class BaseBlockStore(metaclass=ABCMeta):
     def remove_block_by_index(self, block_index: int) -> list[BasicBlock]:
         pass
 
+    @abstractmethod
+    def truncate(
+        self, block_hash: str, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        pass
+
+    @abstractmethod
+    def truncate_by_index(
+        self, block_index: int, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        pass
+
     @staticmethod
     def get_hash(block: BasicBlock) -> str:
 
-        # Get binary representation of block
-        block_bin = block.serialize()
+        # Feed the binary representation of the block to the hasher part by part,
+        # the data is hashed through a view instead of being copied
+        hasher = hashlib.sha256()
+        for part in block.iter_serialized():
+            hasher.update(part)
 
         # Compute and return hash
-        return f"sha256:{hashlib.sha256(block_bin).hexdigest()}"
+        return f"sha256:{hasher.hexdigest()}"
@@ -0,0 +1,217 @@
+from collections import OrderedDict
+from dataclasses import replace
+from threading import Lock
+from typing import Callable, Iterable, Iterator, NamedTuple
+from ..data.basic_block import BasicBlock
+from ..data.block_header import BlockHeader
+from .base_store import BaseBlockStore
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    size_bytes: int
+
+
+class CachedBlockStore(BaseBlockStore):
+    def __init__(
+        self,
+        store: BaseBlockStore,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # Cached blocks keyed by block hash in LRU order, with their index if known
+        self._entries: OrderedDict[str, tuple[BasicBlock, int or None]] = OrderedDict()
+        self._index_map: dict[int, str] = {}
+        self._size_bytes = 0
+        self._lock = Lock()
+        # Bumped on every invalidation, so a fetch racing with a removal is not cached
+        self._generation = 0
+
+    def add_block(
+        self, protocol: str, data: bytes, previous_block_hash: str = None
+    ) -> str:
+        return self.store.add_block(protocol, data, previous_block_hash)
+
+    def add_blocks(self, blocks: Iterable[BasicBlock]) -> list[str]:
+        return self.store.add_blocks(blocks)
+
+    def get_block(self, block_hash: str) -> BasicBlock or None:
+        with self._lock:
+            entry = self._entries.get(block_hash)
+            if entry:
+                self.hits += 1
+                self._entries.move_to_end(block_hash)
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        block = self.store.get_block(block_hash)
+        if block:
+            self._put(block_hash, block, None, generation)
+        return block
+
+    def get_block_by_index(self, block_index: int) -> BasicBlock or None:
+        # If block_index is -1, look up the latest block by its actual index
+        if block_index == -1:
+            block_index = self.store.get_block_count() - 1
+            if block_index < 0:
+                return None
+
+        with self._lock:
+            block_hash = self._index_map.get(block_index)
+            if block_hash:
+                self.hits += 1
+                self._entries.move_to_end(block_hash)
+                return self._entries[block_hash][0]
+            self.misses += 1
+            generation = self._generation
+
+        block = self.store.get_block_by_index(block_index)
+        if block:
+            self._put(self.get_hash(block), block, block_index, generation)
+        return block
+
+    def iter_blocks(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> Iterator[BasicBlock]:
+        # Range scans bypass the cache so they do not evict hot blocks
+        return self.store.iter_blocks(start_index, end_index, batch_size)
+
+    def iter_blocks_by_protocol(
+        self, protocol: str, since_index: int = 0, batch_size: int = 1000
+    ) -> Iterator[tuple[int, BasicBlock]]:
+        return self.store.iter_blocks_by_protocol(protocol, since_index, batch_size)
+
+    def get_header(self, block_hash: str) -> BlockHeader or None:
+        # Headers are cheap to read and not cached, their blocks load through the cache
+        header = self.store.get_header(block_hash)
+        return replace(header, loader=self.get_block) if header else None
+
+    def get_header_by_index(self, block_index: int) -> BlockHeader or None:
+        header = self.store.get_header_by_index(block_index)
+        return replace(header, loader=self.get_block) if header else None
+
+    def iter_headers(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> Iterator[BlockHeader]:
+        for header in self.store.iter_headers(start_index, end_index, batch_size):
+            yield replace(header, loader=self.get_block)
+
+    def get_latest_block_hash(self) -> str:
+        return self.store.get_latest_block_hash()
+
+    def get_block_count(self) -> int:
+        return self.store.get_block_count()
+
+    def remove_block(self, block_hash: str) -> list[BasicBlock]:
+        blocks = self.store.remove_block(block_hash)
+        self._evict_blocks(blocks)
+        return blocks
+
+    def remove_block_by_index(self, block_index: int) -> list[BasicBlock]:
+        blocks = self.store.remove_block_by_index(block_index)
+        self._evict_blocks(blocks)
+        return blocks
+
+    def truncate(
+        self, block_hash: str, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        removed_count = self.store.truncate(block_hash, callback)
+        if removed_count:
+            with self._lock:
+                entry = self._entries.get(block_hash)
+                if entry and entry[1] is not None:
+                    self._evict_from_index(entry[1])
+                else:
+                    self._clear()
+        return removed_count
+
+    def truncate_by_index(
+        self, block_index: int, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        removed_count = self.store.truncate_by_index(block_index, callback)
+        if removed_count:
+            with self._lock:
+                self._evict_from_index(block_index)
+        return removed_count
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                hits=self.hits,
+                misses=self.misses,
+                entries=len(self._entries),
+                size_bytes=self._size_bytes,
+            )
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _put(
+        self,
+        block_hash: str,
+        block: BasicBlock,
+        block_index: int or None,
+        generation: int,
+    ):
+        block_size = len(block.data)
+        if block_size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            entry = self._entries.get(block_hash)
+            if entry:
+                # Keep an index learned earlier when the block is cached again by hash
+                if block_index is None:
+                    block_index = entry[1]
+                self._size_bytes -= len(entry[0].data)
+            self._entries[block_hash] = (block, block_index)
+            self._entries.move_to_end(block_hash)
+            self._size_bytes += block_size
+            if block_index is not None:
+                self._index_map[block_index] = block_hash
+
+            # Evict the least recently used blocks until both bounds hold
+            while (
+                len(self._entries) > self.max_entries
+                or self._size_bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, block_hash: str):
+        entry = self._entries.pop(block_hash, None)
+        if entry:
+            block, block_index = entry
+            self._size_bytes -= len(block.data)
+            if block_index is not None:
+                self._index_map.pop(block_index, None)
+
+    def _evict_blocks(self, blocks: list[BasicBlock]):
+        with self._lock:
+            self._generation += 1
+            for block in blocks:
+                self._pop(self.get_hash(block))
+
+    def _evict_from_index(self, block_index: int):
+        self._generation += 1
+        # Blocks cached by hash only have an unknown index and may have been removed too
+        for block_hash, (_, cached_index) in list(self._entries.items()):
+            if cached_index is None or cached_index >= block_index:
+                self._pop(block_hash)
+
+    def _clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._index_map.clear()
+        self._size_bytes = 0
@@ -0,0 +1,83 @@
+from pathlib import Path
+from threading import Lock
+from sqlalchemy import Engine
+from ..error import InvalidChainNameError
+from .engine import SQLiteProfile, DURABLE_PROFILE, create_block_store_engine
+from .local_store import LocalBlockStore
+from .models import CHAIN_NAME_PATTERN
+
+DATABASE_SUFFIX = ".db"
+
+
+class ChainRegistry:
+    """Block stores of independent chains, created on first use.
+
+    With a directory every chain is kept in its own database file with its own
+    engine, so writes to different chains never wait on the same SQLite write
+    lock. Otherwise all chains are tables of one database, engine or a new
+    in-memory one, and share its writer. Further keyword arguments are passed
+    to every LocalBlockStore.
+    """
+
+    def __init__(
+        self,
+        directory: str = None,
+        engine: Engine = None,
+        profile: SQLiteProfile = DURABLE_PROFILE,
+        **store_options,
+    ):
+        if directory is not None and engine is not None:
+            raise ValueError("Pass either a directory or an engine, not both")
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        # Engines created here are disposed on close, a given engine is left open
+        self._owns_engine = directory is not None or engine is None
+        if self.directory is None and engine is None:
+            engine = create_block_store_engine(profile=profile)
+        self.engine = engine
+        self.profile = profile
+        self.store_options = store_options
+
+        self._stores: dict[str, LocalBlockStore] = {}
+        self._lock = Lock()
+
+    def get_store(self, chain_name: str) -> LocalBlockStore:
+        store = self._stores.get(chain_name)
+        if store is not None:
+            return store
+
+        if not CHAIN_NAME_PATTERN.fullmatch(chain_name):
+            raise InvalidChainNameError(f"Invalid chain name: {chain_name}")
+        with self._lock:
+            store = self._stores.get(chain_name)
+            if store is None:
+                store = LocalBlockStore(
+                    self._get_engine(chain_name), chain_name, **self.store_options
+                )
+                self._stores[chain_name] = store
+        return store
+
+    def chain_names(self) -> list[str]:
+        # Chains opened so far, and those with a database file in the directory
+        chain_names = set(self._stores)
+        if self.directory is not None:
+            chain_names.update(
+                path.stem for path in self.directory.glob(f"*{DATABASE_SUFFIX}")
+            )
+        return sorted(chain_names)
+
+    def close(self):
+        with self._lock:
+            engines = {store.engine for store in self._stores.values()}
+            self._stores.clear()
+        if self._owns_engine:
+            for engine in engines:
+                engine.dispose()
+
+    def _get_engine(self, chain_name: str) -> Engine:
+        if self.directory is None:
+            return self.engine
+        return create_block_store_engine(
+            str(self.directory / f"{chain_name}{DATABASE_SUFFIX}"), self.profile
+        )
@@ -0,0 +1,106 @@
+import hashlib
+import lzma
+import zlib
+from collections import Counter
+from typing import Iterable, Mapping
+from ..error import UnknownCodecError
+
+ZLIB_CODEC = "zlib"
+LZMA_CODEC = "lzma"
+ZDICT_CODEC = "zdict"
+# Raw LZMA2 streams without container, both sides use the same dictionary size
+LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "dict_size": 8 * 1024 * 1024}]
+# zlib only looks back 32 KiB, a longer preset dictionary is never used
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+class PayloadCodec:
+    """Block payload compression
+
+    name is zlib, lzma or zdict (zlib with a preset dictionary, see
+    train_dictionary). Payloads are stored raw, with a tag of None, whenever
+    compressing would not make them smaller.
+    """
+
+    def __init__(self, name: str, level: int = None, dictionary: bytes = None):
+        if name not in (ZLIB_CODEC, LZMA_CODEC, ZDICT_CODEC):
+            raise UnknownCodecError(f"Unknown codec: {name}")
+        if name == ZDICT_CODEC and not dictionary:
+            raise UnknownCodecError("The zdict codec requires a dictionary")
+        self.name = name
+        self.level = level
+        self.dictionary = dictionary
+        self.dictionary_id = get_dictionary_id(dictionary) if dictionary else None
+
+    @property
+    def tag(self) -> str:
+        if self.name == ZDICT_CODEC:
+            return f"{ZDICT_CODEC}:{self.dictionary_id}"
+        return self.name
+
+    def encode(self, data: bytes) -> tuple[str or None, bytes]:
+        if self.name == ZLIB_CODEC:
+            payload = zlib.compress(data, -1 if self.level is None else self.level)
+        elif self.name == LZMA_CODEC:
+            filters = [
+                dict(LZMA_FILTERS[0], preset=6 if self.level is None else self.level)
+            ]
+            payload = lzma.compress(data, format=lzma.FORMAT_RAW, filters=filters)
+        else:
+            compressor = zlib.compressobj(
+                -1 if self.level is None else self.level, zdict=self.dictionary
+            )
+            payload = compressor.compress(data) + compressor.flush()
+
+        if len(payload) >= len(data):
+            return None, data
+        return self.tag, payload
+
+
+def decode_payload(
+    tag: str or None, payload: bytes, dictionaries: Mapping[str, bytes] = None
+) -> bytes:
+    if tag is None:
+        return payload
+    if tag == ZLIB_CODEC:
+        return zlib.decompress(payload)
+    if tag == LZMA_CODEC:
+        return lzma.decompress(payload, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+    if tag.startswith(f"{ZDICT_CODEC}:"):
+        dictionary = (dictionaries or {}).get(tag[len(ZDICT_CODEC) + 1 :])
+        if dictionary is None:
+            raise UnknownCodecError(f"Unknown compression dictionary: {tag}")
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        return decompressor.decompress(payload) + decompressor.flush()
+    raise UnknownCodecError(f"Unknown codec: {tag}")
+
+
+def get_dictionary_id(dictionary: bytes) -> str:
+    return hashlib.sha256(dictionary).hexdigest()[:16]
+
+
+def train_dictionary(
+    samples: Iterable[bytes],
+    size: int = MAX_DICTIONARY_SIZE,
+    gram_size: int = 8,
+) -> bytes:
+    """Build a zlib preset dictionary from sample payloads
+
+    Byte sequences of gram_size found in more than one sample are kept, and the
+    most common are placed at the end of the dictionary where zlib can refer to
+    them with the shortest distances.
+    """
+    sample_counts = Counter()
+    for sample in samples:
+        sample_counts.update(
+            {sample[i : i + gram_size] for i in range(len(sample) - gram_size + 1)}
+        )
+
+    dictionary = bytearray()
+    for gram, count in sample_counts.most_common():
+        if count < 2 or len(dictionary) >= size:
+            break
+        # Skip sequences already covered by a more common one
+        if gram not in dictionary:
+            dictionary[:0] = gram
+    return bytes(dictionary[-size:])
@@ -0,0 +1,126 @@
+"""SQLite engines for block stores
+
+Two presets are provided:
+
+DURABLE_PROFILE
+    WAL journal with synchronous=FULL: every commit is fsynced, a committed
+    block survives power loss. Use for the node's own chain.
+THROUGHPUT_PROFILE
+    WAL journal with synchronous=NORMAL: commits are only fsynced at WAL
+    checkpoints, so the last transactions may be lost on power loss (never
+    corrupted). Larger page cache and mmap window. Use for chains that can be
+    re-synced from peers, imports and benchmarks.
+
+In WAL mode readers never block behind the single writer, and file-backed
+engines use a connection pool so readers run on their own connections.
+
+In-memory engines pool connections to a named database of SQLite's memdb VFS,
+which locks like a file: concurrent transactions wait on each other through
+busy_timeout instead of sharing one connection.
+"""
+import sqlite3
+import uuid
+from dataclasses import dataclass
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+@dataclass(frozen=True)
+class SQLiteProfile:
+    """SQLite pragmas and pool settings"""
+
+    journal_mode: str = "WAL"
+    synchronous: str = "FULL"
+    # Bytes of the database file accessed through mmap
+    mmap_size: int = 256 * 1024 * 1024
+    # Page cache size, negative values are KiB
+    cache_size: int = -64 * 1024
+    # Milliseconds to wait for a lock before failing with "database is locked"
+    busy_timeout: int = 5000
+    pool_size: int = 5
+    max_overflow: int = 10
+
+
+DURABLE_PROFILE = SQLiteProfile()
+THROUGHPUT_PROFILE = SQLiteProfile(
+    synchronous="NORMAL",
+    mmap_size=1024 * 1024 * 1024,
+    cache_size=-256 * 1024,
+    pool_size=10,
+    max_overflow=20,
+)
+
+
+def create_block_store_engine(
+    path: str = None, profile: SQLiteProfile = DURABLE_PROFILE
+) -> Engine:
+    """Create an engine for a block store database file, or in memory if path is None"""
+    database, keeper = _open_database(path)
+    engine = create_engine(
+        f"sqlite:///{database}",
+        poolclass=QueuePool,
+        pool_size=profile.pool_size,
+        max_overflow=profile.max_overflow,
+        connect_args={"check_same_thread": False},
+    )
+    _listen_pragmas(engine, profile, path is not None, keeper)
+    return engine
+
+
+def create_async_block_store_engine(
+    path: str = None, profile: SQLiteProfile = DURABLE_PROFILE
+) -> AsyncEngine:
+    """Create an aiosqlite engine for a block store database file, or in memory if path is None"""
+    database, keeper = _open_database(path)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{database}",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=profile.pool_size,
+        max_overflow=profile.max_overflow,
+    )
+    _listen_pragmas(engine.sync_engine, profile, path is not None, keeper)
+    return engine
+
+
+def database_path(engine: Engine) -> str or None:
+    """Path of the database file of an engine, None if other processes cannot open it"""
+    url = engine.url
+    if url.get_backend_name() != "sqlite" or not url.database:
+        return None
+    # In-memory databases, named or not, and URI filenames
+    if url.database == ":memory:" or url.database.startswith("file:"):
+        return None
+    return url.database
+
+
+def _open_database(path: str or None) -> tuple[str, sqlite3.Connection or None]:
+    # Database part of the engine URL, and for an in-memory database the
+    # connection keeping it alive, since memdb drops it with its last connection
+    if path is not None:
+        return str(path), None
+    uri = f"file:/ucn_{uuid.uuid4().hex}?vfs=memdb"
+    keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    return f"{uri}&uri=true", keeper
+
+
+def _listen_pragmas(
+    engine: Engine,
+    profile: SQLiteProfile,
+    file_backed: bool,
+    keeper: sqlite3.Connection = None,
+):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # In-memory databases have no file to journal to or to map
+        if file_backed:
+            cursor.execute(f"PRAGMA journal_mode={profile.journal_mode}")
+            cursor.execute(f"PRAGMA mmap_size={int(profile.mmap_size)}")
+        cursor.execute(f"PRAGMA synchronous={profile.synchronous}")
+        cursor.execute(f"PRAGMA cache_size={int(profile.cache_size)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(profile.busy_timeout)}")
+        cursor.close()
+
+    # Held by the engine's listener, so an in-memory database lives as long as the engine
+    set_pragmas.keeper = keeper
@@ -0,0 +1,55 @@
+from threading import Condition
+from typing import Any, Callable
+
+
+class _PendingWrite:
+    __slots__ = ("item", "result", "done")
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.result = None
+        self.done = False
+
+
+class GroupCommitQueue:
+    """Queue of concurrent writes committed together by one leader thread.
+
+    The first caller to find no commit in progress becomes the leader and
+    passes every queued item to commit at once. Callers arriving meanwhile
+    wait and are either answered by that commit or lead the next one.
+    commit returns one result per item; exceptions in it are raised to the
+    caller that submitted the item.
+    """
+
+    def __init__(self, commit: Callable[[list], list]):
+        self._commit = commit
+        self._condition = Condition()
+        self._pending: list[_PendingWrite] = []
+        self._committing = False
+
+    def submit(self, item: Any) -> Any:
+        pending = _PendingWrite(item)
+        with self._condition:
+            self._pending.append(pending)
+            while self._committing and not pending.done:
+                self._condition.wait()
+            if not pending.done:
+                # Become the leader for everything queued so far
+                self._committing = True
+                batch, self._pending = self._pending, []
+
+        if not pending.done:
+            try:
+                results = self._commit([write.item for write in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            with self._condition:
+                for write, result in zip(batch, results):
+                    write.result = result
+                    write.done = True
+                self._committing = False
+                self._condition.notify_all()
+
+        if isinstance(pending.result, Exception):
+            raise pending.result
+        return pending.result
@@ -0,0 +1,29 @@
+from typing import Iterable
+from sqlalchemy import Delete, Select, delete, select
+from .models import BlockKeyModel, KeyIndexModel
+
+# Statements shared by the sync and async stores, executed by the caller
+
+
+def delete_block_keys(chain_name: str, block_index: int) -> Delete:
+    # Index entries of the blocks from block_index on
+    return delete(BlockKeyModel).where(
+        BlockKeyModel.chain_name == chain_name,
+        BlockKeyModel.block_index >= block_index,
+    )
+
+
+def invalidate_key_indexes(chain_name: str, protocols: Iterable[str]) -> Delete:
+    # Mark the key indexes of protocols incomplete, their blocks being written
+    # without index entries
+    return delete(KeyIndexModel).where(
+        KeyIndexModel.chain_name == chain_name,
+        KeyIndexModel.protocol.in_(list(protocols)),
+    )
+
+
+def select_key_index(chain_name: str, protocol: str) -> Select:
+    return select(KeyIndexModel.protocol).where(
+        KeyIndexModel.chain_name == chain_name,
+        KeyIndexModel.protocol == protocol,
+    )
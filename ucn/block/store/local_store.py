@@ -1,182 +1,908 @@
-from sqlalchemy import create_engine, Engine, select
+import hmac
+import hashlib
+from collections import Counter
+from functools import partial
+from itertools import islice
+from threading import RLock
+from typing import Callable, Iterable, Iterator
+from sqlalchemy import Engine, Select, and_, select, insert, delete
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from ..error import InvalidPreviousBlockHashError, MissingGenesisBlockError
+from ..error import (
+    BlockChainError,
+    InvalidPreviousBlockHashError,
+    KeyIndexError,
+    MissingGenesisBlockError,
+    SnapshotError,
+    UnknownCodecError,
+)
 from ..data.basic_block import BasicBlock
-from .models import init_database, get_block_model
+from ..data.block_header import BlockHeader
+from ..data.chain_tip import ChainTip, EMPTY_CHAIN_TIP
+from ..data.checkpoint import Checkpoint
+from ..verify import verify_chain
+from ...hash_tree.mmr import MMRProof, MerkleMountainRange, mmr_size
+from .engine import create_block_store_engine, database_path
+from .codec import PayloadCodec, decode_payload
+from .models import (
+    init_database,
+    get_block_model,
+    BlockKeyModel,
+    CheckpointModel,
+    CodecDictionaryModel,
+    KeyIndexModel,
+    PayloadBlobModel,
+)
+from .payload import (
+    RELEASE_PAYLOAD,
+    RETAIN_PAYLOAD,
+    DELETE_UNUSED_PAYLOADS,
+    select_blocks,
+    select_headers,
+    select_payload_references,
+)
 from .base_store import BaseBlockStore
+from .group_commit import GroupCommitQueue
+from .accumulator import SQLMMRStorage, block_leaf, truncate_mmr_nodes
+from .key_index import delete_block_keys, invalidate_key_indexes, select_key_index
+from .snapshot import (
+    export_chain,
+    open_snapshot,
+    check_snapshot_start,
+    check_block_hashes,
+)
 
 
 class LocalBlockStore(BaseBlockStore):
-    def __init__(self, engine: Engine, chain_name: str = "blocks"):
+    def __init__(
+        self,
+        engine: Engine,
+        chain_name: str = "blocks",
+        checkpoint_key: bytes = b"",
+        codec: PayloadCodec = None,
+        deduplicate: bool = False,
+        accumulate: bool = False,
+    ):
         self.engine = engine
+        self.chain_name = chain_name
         self.BLOCK_MODEL = get_block_model(chain_name)
-        init_database(self.engine)
+        # Key signing the verification checkpoints, empty for a plain hash
+        self.checkpoint_key = checkpoint_key
+        # Compression of newly written payloads, None to store them raw.
+        # Payloads are decompressed by the codec tag of their row whatever this is
+        self.codec = codec
+        # Store identical payloads once, shared by reference counted blocks
+        self.deduplicate = deduplicate
+        # Extend the block hash accumulator in every write transaction, instead of
+        # catching up when a root or proof is requested
+        self.accumulate = accumulate
+        init_database(self.engine, [self.BLOCK_MODEL])
+        with Session(self.engine) as session:
+            if codec and codec.dictionary:
+                session.merge(
+                    CodecDictionaryModel(
+                        dictionary_id=codec.dictionary_id, data=codec.dictionary
+                    )
+                )
+                session.commit()
+            self._dictionaries = self._load_dictionaries(session)
+        # In-process record of the latest block, loaded lazily from the database
+        self._tip: ChainTip or None = None
+        # Concurrent writes are queued and committed together by one writer
+        self._group_commit = GroupCommitQueue(self._commit_writes)
+        self._write_lock = RLock()
+        # Protocol -> function returning the secondary index keys of a block
+        self._key_indexers: dict[str, Callable[[BasicBlock], Iterable[str]]] = {}
 
     def add_block(
         self, protocol: str, data: bytes, previous_block_hash: str = None
     ) -> str:  # Return type has been changed from BasicBlock to str.
-        if previous_block_hash is None:
-            previous_block_hash = self.get_latest_block_hash()
+        # A previous_block_hash of None links the block to the tip at commit time
         block = BasicBlock(
             protocol=protocol,
             previous_block_hash=previous_block_hash,
             data=data,
         )
+        return self._group_commit.submit([block])[0]
 
-        block_hash = self.get_hash(block)
+    def add_blocks(self, blocks: Iterable[BasicBlock]) -> list[str]:
+        blocks = list(blocks)
+        if not blocks:
+            return []
+        return self._group_commit.submit(blocks)
 
-        with Session(self.engine) as session:
-            # Retrieve the latest block in the database
-            latest_block = (
-                session.query(self.BLOCK_MODEL)
-                .order_by(self.BLOCK_MODEL.block_index.desc())
-                .first()
-            )
-            if latest_block:
-                # If the previous_block_hash does not match the hash of the latest block, raise an error
-                if latest_block.block_hash != previous_block_hash:
-                    raise InvalidPreviousBlockHashError(
-                        "Invalid previous block hash: The given previous block hash does not match the hash of the latest block in the database."
+    def _commit_writes(self, writes: list[list[BasicBlock]]) -> list:
+        # Runs in the group commit leader: assign indices and verify parents for every
+        # queued write, then insert all of them in a single transaction
+        results = []
+        rows = []
+        with self._write_lock, Session(self.engine) as session:
+            tip = self._check_tip(session)
+            previous_block_hash = tip.block_hash
+            next_block_index = tip.block_index + 1
+            for blocks in writes:
+                try:
+                    write_rows = self._link_blocks(
+                        blocks, previous_block_hash, next_block_index
                     )
-            elif previous_block_hash:
-                # If the genesis block does not exist in the database yet, raise an error
-                raise MissingGenesisBlockError(
-                    "Missing genesis block: The database does not contain a genesis block yet."
+                except BlockChainError as e:
+                    # A rejected write does not affect the others in the group
+                    results.append(e)
+                    continue
+                results.append([row["block_hash"] for row in write_rows])
+                rows.extend(write_rows)
+                previous_block_hash = write_rows[-1]["block_hash"]
+                next_block_index += len(write_rows)
+
+            if not rows:
+                return results
+
+            # Write the whole group in a single transaction
+            try:
+                self._insert_rows(session, rows)
+                session.commit()
+            except IntegrityError:
+                # Another writer appended to the chain behind our back
+                session.rollback()
+                self._tip = None
+                error = InvalidPreviousBlockHashError(
+                    "Invalid previous block hash: The chain was extended by another writer."
                 )
+                return [
+                    result if isinstance(result, Exception) else error
+                    for result in results
+                ]
 
-            # Compute the index for the new block
-            new_block_index = latest_block.block_index + 1 if latest_block else 0
+            self._tip = ChainTip(
+                block_index=tip.block_index + len(rows),
+                block_hash=previous_block_hash,
+                block_count=tip.block_count + len(rows),
+            )
+        return results
 
-            # Create a new block model and add it to the database
-            block_model = self.BLOCK_MODEL(
-                protocol=block.protocol,
-                data=block.data,
-                previous_block_hash=block.previous_block_hash,
-                block_hash=block_hash,
-                block_index=new_block_index,
+    def _insert_rows(self, session: Session, rows: list[dict]):
+        session.execute(insert(self.BLOCK_MODEL), self._store_payloads(session, rows))
+        key_rows = self._key_rows(rows)
+        if key_rows:
+            session.execute(insert(BlockKeyModel), key_rows)
+        unindexed_protocols = {row["protocol"] for row in rows} - set(
+            self._key_indexers
+        )
+        if unindexed_protocols:
+            session.execute(
+                invalidate_key_indexes(self.chain_name, unindexed_protocols)
+            )
+        if self.accumulate:
+            self._sync_accumulator(session, rows[0]["block_index"]).extend(
+                [block_leaf(row["block_hash"]) for row in rows]
             )
-            session.add(block_model)
+
+    def get_chain_root(self, block_count: int = None) -> str or None:
+        # Root of the accumulator over the hashes of the first block_count blocks,
+        # or of the whole chain
+        with self._write_lock, Session(self.engine) as session:
+            tip = self._check_tip(session)
+            mmr = self._sync_accumulator(session, tip.block_count)
             session.commit()
+            return mmr.root(tip.block_count if block_count is None else block_count)
 
-        # Return the hash of the new block
-        return block_hash
+    def prove_block(self, block_index: int, block_count: int = None) -> MMRProof:
+        # Inclusion proof of a block against get_chain_root(block_count), checked
+        # with verify_block_proof
+        with self._write_lock, Session(self.engine) as session:
+            tip = self._check_tip(session)
+            mmr = self._sync_accumulator(session, tip.block_count)
+            session.commit()
+            return mmr.prove(
+                block_index, tip.block_count if block_count is None else block_count
+            )
 
-    def get_block(self, block_hash: str) -> BasicBlock or None:
-        with Session(self.engine) as session:
-            # Retrieve the block model with the specified block hash
-            block_model = session.scalar(
-                select(self.BLOCK_MODEL).where(
-                    self.BLOCK_MODEL.block_hash == block_hash
+    def _sync_accumulator(
+        self, session: Session, block_count: int
+    ) -> MerkleMountainRange:
+        # Bring the accumulator to the first block_count blocks, it lags behind when
+        # accumulate is off or blocks were written by another store
+        mmr = MerkleMountainRange(SQLMMRStorage(session, self.chain_name))
+        leaf_count = mmr.leaf_count
+        if leaf_count > block_count:
+            mmr.truncate(block_count)
+        while leaf_count < block_count:
+            block_hashes = session.scalars(
+                select(self.BLOCK_MODEL.block_hash)
+                .where(
+                    self.BLOCK_MODEL.block_index >= leaf_count,
+                    self.BLOCK_MODEL.block_index < block_count,
                 )
+                .order_by(self.BLOCK_MODEL.block_index.asc())
+                .limit(10000)
+            ).all()
+            mmr.extend([block_leaf(block_hash) for block_hash in block_hashes])
+            leaf_count += len(block_hashes)
+        return mmr
+
+    def export_chain(
+        self, path: str, start_index: int = 0, end_index: int = None
+    ) -> int:
+        # Write the blocks from start_index up to end_index to a snapshot file
+        return export_chain(self, path, start_index, end_index)
+
+    def import_chain(
+        self, path: str, verify: bool = True, batch_size: int = 10000
+    ) -> int:
+        # Append the blocks of a snapshot file in a single transaction, nothing is
+        # imported if any block does not fit. Without verify, block hashes are taken
+        # from the snapshot index after its digest is checked, and the blocks are
+        # hashed by the next verify() instead. Returns the number of imported blocks
+        imported_count = 0
+        with open_snapshot(path) as snapshot, self._write_lock, Session(
+            self.engine
+        ) as session:
+            tip = self._check_tip(session)
+            check_snapshot_start(snapshot, tip.block_count)
+            previous_block_hash = tip.block_hash
+            blocks = snapshot.iter_blocks()
+            while True:
+                batch = list(islice(blocks, batch_size))
+                if not batch:
+                    break
+                if verify:
+                    check_block_hashes(self, batch)
+
+                rows = []
+                for block_hash, block in batch:
+                    if block.previous_block_hash != previous_block_hash:
+                        raise InvalidPreviousBlockHashError(
+                            "Invalid previous block hash: The snapshot does not continue the chain."
+                        )
+                    rows.append(
+                        {
+                            "protocol": block.protocol,
+                            "data": block.data,
+                            "data_size": len(block.data),
+                            "previous_block_hash": block.previous_block_hash,
+                            "block_hash": block_hash,
+                            "block_index": tip.block_index + 1 + imported_count,
+                        }
+                    )
+                    previous_block_hash = block_hash
+                    imported_count += 1
+                try:
+                    self._insert_rows(session, rows)
+                except IntegrityError as e:
+                    # A duplicate hash, or another writer appended behind our back
+                    raise SnapshotError(
+                        "Chain snapshot conflicts with the stored chain"
+                    ) from e
+
+            session.commit()
+            self._tip = ChainTip(
+                block_index=tip.block_index + imported_count,
+                block_hash=previous_block_hash,
+                block_count=tip.block_count + imported_count,
             )
-            if block_model:
-                # Convert the block model to a BasicBlock object and return it
+        return imported_count
+
+    def _link_blocks(
+        self,
+        blocks: list[BasicBlock],
+        previous_block_hash: str,
+        next_block_index: int,
+    ) -> list[dict]:
+        if not next_block_index and blocks[0].previous_block_hash:
+            # If the genesis block does not exist in the database yet, raise an error
+            raise MissingGenesisBlockError(
+                "Missing genesis block: The database does not contain a genesis block yet."
+            )
+
+        # Validate the linkage of the whole write in memory before writing anything
+        rows = []
+        for block in blocks:
+            if block.previous_block_hash is None:
                 block = BasicBlock(
-                    protocol=block_model.protocol,
-                    previous_block_hash=block_model.previous_block_hash,
-                    data=block_model.data,
+                    protocol=block.protocol,
+                    previous_block_hash=previous_block_hash,
+                    data=block.data,
+                )
+            elif block.previous_block_hash != previous_block_hash:
+                raise InvalidPreviousBlockHashError(
+                    "Invalid previous block hash: The given previous block hash does not match the hash of the latest block in the database."
                 )
-                return block
+            block_hash = self.get_hash(block)
+            rows.append(
+                {
+                    "protocol": block.protocol,
+                    "data": block.data,
+                    "data_size": len(block.data),
+                    "previous_block_hash": block.previous_block_hash,
+                    "block_hash": block_hash,
+                    "block_index": next_block_index,
+                }
+            )
+            previous_block_hash = block_hash
+            next_block_index += 1
+        return rows
+
+    def get_block(self, block_hash: str) -> BasicBlock or None:
+        with Session(self.engine) as session:
+            # Retrieve the block row with the specified block hash
+            row = session.execute(
+                self._select_blocks().where(self.BLOCK_MODEL.block_hash == block_hash)
+            ).first()
+            if row:
+                # Convert the block row to a BasicBlock object and return it
+                return self._to_block(row)
         return None
 
     def get_block_by_index(self, block_index: int) -> BasicBlock or None:
         with Session(self.engine) as session:
             # If block_index is -1, retrieve the latest block
             if block_index == -1:
-                block_model = (
-                    session.query(self.BLOCK_MODEL)
-                    .order_by(self.BLOCK_MODEL.block_index.desc())
-                    .first()
-                )
-            else:
-                # Otherwise, retrieve the block model with the specified block index
-                block_model = session.scalar(
-                    select(self.BLOCK_MODEL).where(
-                        self.BLOCK_MODEL.block_index == block_index
+                block_index = self._get_tip(session).block_index
+
+            # Retrieve the block row with the specified block index
+            row = session.execute(
+                self._select_blocks().where(self.BLOCK_MODEL.block_index == block_index)
+            ).first()
+
+            if row:
+                # Convert the block row to a BasicBlock object and return it
+                return self._to_block(row)
+        return None
+
+    def iter_blocks(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> Iterator[BasicBlock]:
+        for row in self._iter_rows(
+            self._select_blocks(self.BLOCK_MODEL.block_index),
+            start_index,
+            end_index,
+            batch_size,
+        ):
+            yield self._to_block(row)
+
+    def iter_blocks_by_protocol(
+        self, protocol: str, since_index: int = 0, batch_size: int = 1000
+    ) -> Iterator[tuple[int, BasicBlock]]:
+        # Served by the (protocol, block_index) index, blocks of other protocols are not read
+        for row in self._iter_rows(
+            self._select_blocks(self.BLOCK_MODEL.block_index),
+            since_index,
+            None,
+            batch_size,
+            self.BLOCK_MODEL.protocol == protocol,
+        ):
+            yield row.block_index, self._to_block(row)
+
+    def register_key_indexer(
+        self, protocol: str, indexer: Callable[[BasicBlock], Iterable[str]]
+    ):
+        # Maintain a secondary index from the keys returned by indexer to the blocks of
+        # a protocol, written in the same transaction as the blocks.
+        # Call reindex_keys for blocks stored before the indexer was registered.
+        # Every writer of the protocol must register the indexer, blocks written
+        # without it make iter_blocks_by_key raise KeyIndexError until reindexed
+        with self._write_lock, Session(self.engine) as session:
+            self._key_indexers[protocol] = indexer
+            if session.scalar(select_key_index(self.chain_name, protocol)) is None:
+                # Without blocks of the protocol, the empty index is complete
+                stored_block_index = session.scalar(
+                    select(self.BLOCK_MODEL.block_index)
+                    .where(self.BLOCK_MODEL.protocol == protocol)
+                    .limit(1)
+                )
+                if stored_block_index is None:
+                    session.add(
+                        KeyIndexModel(chain_name=self.chain_name, protocol=protocol)
                     )
+                    session.commit()
+
+    def iter_blocks_by_key(
+        self, protocol: str, key: str, batch_size: int = 1000
+    ) -> Iterator[tuple[int, BasicBlock]]:
+        # Driven by the (chain_name, protocol, key, block_index) index, only the blocks
+        # listed under the key are read. Entries must match the hash of the block at
+        # their index, so an entry left behind by another writer never resolves to a
+        # block which later took that index
+        with Session(self.engine) as session:
+            if session.scalar(select_key_index(self.chain_name, protocol)) is None:
+                raise KeyIndexError(
+                    f"The key index of {protocol} on chain {self.chain_name} is incomplete, "
+                    "register its indexer and call reindex_keys."
                 )
+        statement = self._select_blocks(BlockKeyModel.block_index).join(
+            BlockKeyModel,
+            and_(
+                BlockKeyModel.block_index == self.BLOCK_MODEL.block_index,
+                BlockKeyModel.block_hash == self.BLOCK_MODEL.block_hash,
+            ),
+        )
+        for row in self._iter_rows(
+            statement,
+            0,
+            None,
+            batch_size,
+            BlockKeyModel.chain_name == self.chain_name,
+            BlockKeyModel.protocol == protocol,
+            BlockKeyModel.key == key,
+            index_column=BlockKeyModel.block_index,
+        ):
+            yield row.block_index, self._to_block(row)
 
-            if block_model:
-                # Convert the block model to a BasicBlock object and return it
-                return BasicBlock(
-                    protocol=block_model.protocol,
-                    previous_block_hash=block_model.previous_block_hash,
-                    data=block_model.data,
+    def reindex_keys(self, protocol: str, batch_size: int = 1000):
+        with self._write_lock, Session(self.engine) as session:
+            session.execute(
+                delete(BlockKeyModel).where(
+                    BlockKeyModel.chain_name == self.chain_name,
+                    BlockKeyModel.protocol == protocol,
                 )
-        return None
+            )
+            statement = (
+                self._select_blocks(
+                    self.BLOCK_MODEL.block_index, self.BLOCK_MODEL.block_hash
+                )
+                .where(self.BLOCK_MODEL.protocol == protocol)
+                .order_by(self.BLOCK_MODEL.block_index.asc())
+                .execution_options(yield_per=batch_size)
+            )
+            for rows in session.execute(statement).partitions():
+                # Keys are computed from the raw payloads
+                key_rows = self._key_rows(
+                    [
+                        dict(row._asdict(), data=self._decode(row.codec, row.data))
+                        for row in rows
+                    ]
+                )
+                if key_rows:
+                    session.execute(insert(BlockKeyModel), key_rows)
+            session.merge(KeyIndexModel(chain_name=self.chain_name, protocol=protocol))
+            session.commit()
+
+    def _key_rows(self, rows: list[dict]) -> list[dict]:
+        key_rows = []
+        for row in rows:
+            indexer = self._key_indexers.get(row["protocol"])
+            if indexer is None:
+                continue
+            block = BasicBlock(
+                protocol=row["protocol"],
+                previous_block_hash=row["previous_block_hash"],
+                data=row["data"],
+            )
+            # A key listed twice for a block is indexed once
+            for key in dict.fromkeys(indexer(block)):
+                key_rows.append(
+                    {
+                        "chain_name": self.chain_name,
+                        "protocol": row["protocol"],
+                        "key": key,
+                        "block_index": row["block_index"],
+                        "block_hash": row["block_hash"],
+                    }
+                )
+        return key_rows
+
+    def get_header(self, block_hash: str) -> BlockHeader or None:
+        with Session(self.engine) as session:
+            row = session.execute(
+                select_headers(self.BLOCK_MODEL).where(
+                    self.BLOCK_MODEL.block_hash == block_hash
+                )
+            ).first()
+            return self._to_header(row) if row else None
+
+    def get_header_by_index(self, block_index: int) -> BlockHeader or None:
+        with Session(self.engine) as session:
+            # If block_index is -1, retrieve the latest block header
+            if block_index == -1:
+                block_index = self._get_tip(session).block_index
+            row = session.execute(
+                select_headers(self.BLOCK_MODEL).where(
+                    self.BLOCK_MODEL.block_index == block_index
+                )
+            ).first()
+            return self._to_header(row) if row else None
+
+    def iter_headers(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> Iterator[BlockHeader]:
+        # Only the header columns are read, block data is loaded on demand
+        for row in self._iter_rows(
+            select_headers(self.BLOCK_MODEL), start_index, end_index, batch_size
+        ):
+            yield self._to_header(row)
+
+    def _iter_rows(
+        self,
+        statement: Select,
+        start_index: int,
+        end_index: int or None,
+        batch_size: int,
+        *conditions,
+        index_column=None,
+    ) -> Iterator:
+        # statement selects the streamed columns including block_index, paginated on
+        # index_column, the block index column of the table driving the query
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if index_column is None:
+            index_column = self.BLOCK_MODEL.block_index
+        base_statement = statement
+        next_block_index = start_index
+        while True:
+            # Keyset pagination: each page starts right after the last streamed index
+            statement = base_statement.where(
+                index_column >= next_block_index, *conditions
+            )
+            if end_index is not None:
+                statement = statement.where(index_column < end_index)
+            statement = (
+                statement.order_by(index_column.asc())
+                .limit(batch_size)
+                .execution_options(yield_per=batch_size)
+            )
+
+            # A short-lived session per page, so no read transaction is held between pages
+            row_count = 0
+            with Session(self.engine) as session:
+                for row in session.execute(statement):
+                    row_count += 1
+                    next_block_index = row.block_index + 1
+                    yield row
+
+            if row_count < batch_size:
+                return
 
     def get_latest_block_hash(self) -> str:
-        block = self.get_block_by_index(-1)
-        if block:
-            return self.get_hash(block)
-        else:
-            return ""
+        return self.get_tip().block_hash
 
     def get_block_count(self) -> int:
+        return self.get_tip().block_count
+
+    def get_tip(self) -> ChainTip:
+        if self._tip is None:
+            with Session(self.engine) as session:
+                return self._get_tip(session)
+        return self._tip
+
+    def refresh_tip(self) -> ChainTip:
+        # Reload the tip record, e.g. after another process wrote to the database
         with Session(self.engine) as session:
-            # Return the total count of blocks in the database
-            return session.query(self.BLOCK_MODEL).count()
+            return self._load_tip(session)
+
+    def _select_blocks(self, *columns):
+        return select_blocks(self.BLOCK_MODEL, *columns)
+
+    def _to_header(self, row) -> BlockHeader:
+        return BlockHeader(
+            block_index=row.block_index,
+            protocol=row.protocol,
+            block_hash=row.block_hash,
+            previous_block_hash=row.previous_block_hash,
+            data_size=row.data_size,
+            loader=self.get_block,
+        )
+
+    def _to_block(self, row) -> BasicBlock:
+        return BasicBlock(
+            protocol=row.protocol,
+            previous_block_hash=row.previous_block_hash,
+            data=self._decode(row.codec, row.data),
+        )
+
+    def _decode(self, codec: str or None, payload: bytes) -> bytes:
+        try:
+            return decode_payload(codec, payload, self._dictionaries)
+        except UnknownCodecError:
+            # The dictionary may have been stored by another store, load them again
+            with Session(self.engine) as session:
+                self._dictionaries = self._load_dictionaries(session)
+            return decode_payload(codec, payload, self._dictionaries)
+
+    @staticmethod
+    def _load_dictionaries(session: Session) -> dict[str, bytes]:
+        return {
+            row.dictionary_id: row.data
+            for row in session.execute(
+                select(CodecDictionaryModel.dictionary_id, CodecDictionaryModel.data)
+            )
+        }
+
+    def _encode_rows(self, rows: list[dict]) -> list[dict]:
+        # Hashes and secondary keys are computed from the raw rows, only the stored
+        # payload is compressed
+        if self.codec is None:
+            return rows
+        encoded_rows = []
+        for row in rows:
+            codec, payload = self.codec.encode(row["data"])
+            encoded_rows.append(dict(row, data=payload, codec=codec))
+        return encoded_rows
+
+    def _store_payloads(self, session: Session, rows: list[dict]) -> list[dict]:
+        if not self.deduplicate:
+            return self._encode_rows(rows)
+
+        # Rows reference their payload by digest, a payload already stored only
+        # gains references
+        digests = [hashlib.sha256(row["data"]).hexdigest() for row in rows]
+        ref_counts = Counter(digests)
+        stored_digests = set()
+        unique_digests = list(ref_counts)
+        for i in range(0, len(unique_digests), 500):
+            stored_digests.update(
+                session.scalars(
+                    select(PayloadBlobModel.digest).where(
+                        PayloadBlobModel.digest.in_(unique_digests[i : i + 500])
+                    )
+                )
+            )
+        if stored_digests:
+            # Executed on the connection as a plain executemany, not an ORM bulk update
+            session.connection().execute(
+                RETAIN_PAYLOAD,
+                [
+                    {"b_digest": digest, "b_count": ref_counts[digest]}
+                    for digest in stored_digests
+                ],
+            )
+
+        blob_rows = {}
+        for row, digest in zip(rows, digests):
+            if digest in stored_digests or digest in blob_rows:
+                continue
+            codec, payload = (None, row["data"])
+            if self.codec is not None:
+                codec, payload = self.codec.encode(row["data"])
+            blob_rows[digest] = {
+                "digest": digest,
+                "codec": codec,
+                "data": payload,
+                "ref_count": ref_counts[digest],
+            }
+        if blob_rows:
+            session.execute(insert(PayloadBlobModel), list(blob_rows.values()))
+
+        return [
+            dict(row, data=None, codec=None, payload_digest=digest)
+            for row, digest in zip(rows, digests)
+        ]
+
+    def _release_payloads(self, session: Session, block_index: int):
+        # Drop the references of the blocks from block_index on, and the payloads
+        # no block refers to anymore
+        references = session.execute(
+            select_payload_references(
+                self.BLOCK_MODEL, self.BLOCK_MODEL.block_index >= block_index
+            )
+        ).all()
+        if references:
+            session.connection().execute(
+                RELEASE_PAYLOAD, [row._asdict() for row in references]
+            )
+            session.execute(DELETE_UNUSED_PAYLOADS)
+
+    def _get_tip(self, session: Session) -> ChainTip:
+        if self._tip is None:
+            return self._load_tip(session)
+        return self._tip
+
+    def _load_tip(self, session: Session) -> ChainTip:
+        # Only the index and hash columns are read, never the block data
+        latest_block = session.execute(
+            select(self.BLOCK_MODEL.block_index, self.BLOCK_MODEL.block_hash)
+            .order_by(self.BLOCK_MODEL.block_index.desc())
+            .limit(1)
+        ).first()
+        if latest_block:
+            # Block indices are contiguous from the genesis block
+            self._tip = ChainTip(
+                block_index=latest_block.block_index,
+                block_hash=latest_block.block_hash,
+                block_count=latest_block.block_index + 1,
+            )
+        else:
+            self._tip = EMPTY_CHAIN_TIP
+        return self._tip
+
+    def _check_tip(self, session: Session) -> ChainTip:
+        # Make sure the cached tip still exists in the database with a primary key lookup
+        tip = self._get_tip(session)
+        if tip.block_count:
+            block_hash = session.scalar(
+                select(self.BLOCK_MODEL.block_hash).where(
+                    self.BLOCK_MODEL.block_index == tip.block_index
+                )
+            )
+            if block_hash != tip.block_hash:
+                return self._load_tip(session)
+        return tip
 
     def remove_block(self, block_hash: str) -> list[BasicBlock]:
-        with Session(self.engine) as session:
-            # Retrieve the block model with the specified block hash and all the blocks that follow it
-            block_models = (
-                session.query(self.BLOCK_MODEL)
-                .filter(
-                    self.BLOCK_MODEL.block_index
-                    >= session.query(self.BLOCK_MODEL.block_index)
-                    .filter(self.BLOCK_MODEL.block_hash == block_hash)
-                    .scalar()
+        # Remove the block with the specified block hash and all the blocks that follow it
+        blocks = []
+        self.truncate(block_hash, blocks.append)
+        return blocks
+
+    def remove_block_by_index(self, block_index: int) -> list[BasicBlock]:
+        # Remove the block with the specified block index and all the blocks that follow it
+        blocks = []
+        self.truncate_by_index(block_index, blocks.append)
+        return blocks
+
+    def truncate(
+        self, block_hash: str, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        with self._write_lock, Session(self.engine) as session:
+            block_index = session.scalar(
+                select(self.BLOCK_MODEL.block_index).where(
+                    self.BLOCK_MODEL.block_hash == block_hash
                 )
+            )
+            if block_index is None:
+                return 0
+            return self._truncate(session, block_index, callback)
+
+    def truncate_by_index(
+        self, block_index: int, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        with self._write_lock, Session(self.engine) as session:
+            return self._truncate(session, block_index, callback)
+
+    def _truncate(
+        self,
+        session: Session,
+        block_index: int,
+        callback: Callable[[BasicBlock], None] or None,
+    ) -> int:
+        if callback is not None:
+            # Stream the removed blocks in index order inside the deleting transaction,
+            # so nothing is deleted if the callback raises
+            statement = (
+                self._select_blocks()
+                .where(self.BLOCK_MODEL.block_index >= block_index)
                 .order_by(self.BLOCK_MODEL.block_index.asc())
-                .all()
+                .execution_options(yield_per=1000)
             )
+            for row in session.execute(statement):
+                callback(self._to_block(row))
 
-            blocks = []
-            for block_model in block_models:
-                # Convert each block model to a BasicBlock object
-                block = BasicBlock(
-                    protocol=block_model.protocol,
-                    previous_block_hash=block_model.previous_block_hash,
-                    data=block_model.data,
-                )
-                blocks.append(block)
+        checkpoint = self._get_checkpoint(session)
+        self._release_payloads(session, block_index)
 
-                # Remove the block from the database
-                session.delete(block_model)
+        # Remove the blocks with one set-based DELETE
+        result = session.execute(
+            delete(self.BLOCK_MODEL)
+            .where(self.BLOCK_MODEL.block_index >= block_index)
+            .execution_options(synchronize_session=False)
+        )
 
-            session.commit()
-            return blocks
+        session.execute(delete_block_keys(self.chain_name, block_index))
+        truncate_mmr_nodes(session, self.chain_name, mmr_size(max(block_index, 0)))
 
-    def remove_block_by_index(self, block_index: int) -> list[BasicBlock]:
+        # Move a checkpoint above the new tip back to the last kept block,
+        # which was verified along with it
+        if checkpoint and checkpoint.block_index >= block_index:
+            tip = self._load_tip(session)
+            self._save_checkpoint(session, Checkpoint(tip.block_index, tip.block_hash))
+
+        session.commit()
+        self._load_tip(session)
+        return result.rowcount
+
+    def verify(
+        self, full: bool = False, range_size: int = 1000, max_workers: int = None
+    ) -> int or None:
+        # Verify the blocks appended since the last checkpoint, or the whole chain if full.
+        # Returns the index of the first bad block, or None, and advances the checkpoint
+        # over the verified blocks
         with Session(self.engine) as session:
-            # Retrieve the block model with the specified block index and all the blocks that follow it
-            block_models = (
-                session.query(self.BLOCK_MODEL)
-                .filter(self.BLOCK_MODEL.block_index >= block_index)
-                .order_by(self.BLOCK_MODEL.block_index.asc())
-                .all()
+            checkpoint = None if full else self._get_checkpoint(session)
+        if checkpoint:
+            start_index = checkpoint.block_index + 1
+            previous_block_hash = checkpoint.block_hash
+        else:
+            start_index = 0
+            previous_block_hash = ""
+
+        # Worker processes open the database file themselves and read their own ranges
+        path = database_path(self.engine)
+        store_factory = (
+            partial(open_local_block_store, path, self.chain_name) if path else None
+        )
+        tip = self.get_tip()
+        bad_block_index = verify_chain(
+            self,
+            start_index,
+            tip.block_index + 1,
+            previous_block_hash,
+            range_size,
+            max_workers,
+            store_factory,
+        )
+
+        verified_index = (
+            tip.block_index if bad_block_index is None else bad_block_index - 1
+        )
+        if verified_index >= start_index:
+            with self._write_lock, Session(self.engine) as session:
+                block_hash = session.scalar(
+                    select(self.BLOCK_MODEL.block_hash).where(
+                        self.BLOCK_MODEL.block_index == verified_index
+                    )
+                )
+                # Only move forward when the chain was not changed while verifying
+                if block_hash and (
+                    bad_block_index is not None or block_hash == tip.block_hash
+                ):
+                    self._save_checkpoint(
+                        session, Checkpoint(verified_index, block_hash)
+                    )
+                    session.commit()
+        return bad_block_index
+
+    def audit(self, range_size: int = 1000, max_workers: int = None) -> int or None:
+        # Force a full re-verification of the chain, ignoring the checkpoint
+        return self.verify(True, range_size, max_workers)
+
+    def get_checkpoint(self) -> Checkpoint or None:
+        with Session(self.engine) as session:
+            return self._get_checkpoint(session)
+
+    def _get_checkpoint(self, session: Session) -> Checkpoint or None:
+        checkpoint_model = session.get(CheckpointModel, self.chain_name)
+        if not checkpoint_model:
+            return None
+        checkpoint = Checkpoint(
+            checkpoint_model.block_index, checkpoint_model.block_hash
+        )
+        if not hmac.compare_digest(
+            checkpoint_model.digest, self._checkpoint_digest(checkpoint)
+        ):
+            return None
+
+        # The checkpointed block must still be in the chain
+        block_hash = session.scalar(
+            select(self.BLOCK_MODEL.block_hash).where(
+                self.BLOCK_MODEL.block_index == checkpoint.block_index
             )
+        )
+        if block_hash != checkpoint.block_hash:
+            return None
+        return checkpoint
 
-            blocks = []
-            for block_model in block_models:
-                # Convert each block model to a BasicBlock object
-                block = BasicBlock(
-                    protocol=block_model.protocol,
-                    previous_block_hash=block_model.previous_block_hash,
-                    data=block_model.data,
+    def _save_checkpoint(self, session: Session, checkpoint: Checkpoint):
+        if checkpoint.block_index < 0:
+            session.execute(
+                delete(CheckpointModel).where(
+                    CheckpointModel.chain_name == self.chain_name
                 )
-                blocks.append(block)
+            )
+            return
+        session.merge(
+            CheckpointModel(
+                chain_name=self.chain_name,
+                block_index=checkpoint.block_index,
+                block_hash=checkpoint.block_hash,
+                digest=self._checkpoint_digest(checkpoint),
+            )
+        )
+
+    def _checkpoint_digest(self, checkpoint: Checkpoint) -> str:
+        message = (
+            f"{self.chain_name}\n{checkpoint.block_index}\n{checkpoint.block_hash}"
+        )
+        return hmac.new(
+            self.checkpoint_key, message.encode("utf8"), hashlib.sha256
+        ).hexdigest()
 
-                # Remove the block from the database
-                session.delete(block_model)
 
-            session.commit()
-            return blocks
+def open_local_block_store(path: str, chain_name: str = "blocks") -> LocalBlockStore:
+    # Open a store over a database file, e.g. in a verification worker process
+    return LocalBlockStore(create_block_store_engine(path), chain_name)
 
 
 # Create an engine
-engine = create_engine("sqlite:///:memory:")
+engine = create_block_store_engine()
 
 # Create a new instance of the LocalBlockStore class
 local_block_store = LocalBlockStore(engine)
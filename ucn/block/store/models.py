@@ -1,5 +1,20 @@
-from sqlalchemy import Engine, Column, Integer, String, LargeBinary
-from sqlalchemy.orm import declarative_base
+import re
+from threading import Lock
+from typing import Iterable
+from sqlalchemy import (
+    Engine,
+    Connection,
+    Column,
+    Index,
+    Integer,
+    String,
+    LargeBinary,
+    Table,
+    inspect,
+    text,
+)
+from sqlalchemy.orm import declarative_base, declared_attr
+from ..error import InvalidChainNameError
 
 Base = declarative_base()
 
@@ -7,22 +22,170 @@ Base = declarative_base()
 class BasicBlockModel(Base):
     __abstract__ = True
     protocol = Column(String)
-    data = Column(LargeBinary)
     block_hash = Column(String, index=True, unique=True)
     previous_block_hash = Column(String, nullable=True)
     block_index = Column(Integer, primary_key=True)
+    # Compression codec of data, None for raw data
+    codec = Column(String, nullable=True)
+    # Digest of a shared payload in payload_blobs, in which case data is None
+    payload_digest = Column(String, nullable=True)
+    # Size of the raw data, None for blocks stored before it was recorded
+    data_size = Column(Integer, nullable=True)
+    # Last, so the other columns are read without walking the payload's overflow pages
+    data = Column(LargeBinary)
+
+    @declared_attr.directive
+    def __table_args__(cls):
+        # Per-protocol consumers tail their own blocks through this index
+        return (
+            Index(
+                f"ix_{cls.__tablename__}_protocol_block_index",
+                "protocol",
+                "block_index",
+            ),
+        )
 
 
 class BlockModel(BasicBlockModel):
     __tablename__ = "blocks"
 
 
+class BlockKeyModel(Base):
+    __tablename__ = "block_keys"
+    # Secondary index entries from a key derived from block data to the block
+    id = Column(Integer, primary_key=True)
+    chain_name = Column(String)
+    protocol = Column(String)
+    key = Column(String)
+    block_index = Column(Integer)
+    block_hash = Column(String)
+    __table_args__ = (
+        Index("ix_block_keys_lookup", "chain_name", "protocol", "key", "block_index"),
+        Index("ix_block_keys_block_index", "chain_name", "block_index"),
+    )
+
+
+class KeyIndexModel(Base):
+    __tablename__ = "block_key_indexes"
+    # Protocols whose block_keys entries cover every block of the chain. Cleared by
+    # writers storing blocks of the protocol without its indexer
+    chain_name = Column(String, primary_key=True)
+    protocol = Column(String, primary_key=True)
+
+
+class PayloadBlobModel(Base):
+    __tablename__ = "payload_blobs"
+    # Content-addressed payloads shared by blocks with identical data
+    digest = Column(String, primary_key=True)
+    codec = Column(String, nullable=True)
+    data = Column(LargeBinary)
+    ref_count = Column(Integer)
+
+
+class CodecDictionaryModel(Base):
+    __tablename__ = "codec_dictionaries"
+    dictionary_id = Column(String, primary_key=True)
+    data = Column(LargeBinary)
+
+
+class MMRNodeModel(Base):
+    __tablename__ = "mmr_nodes"
+    # Merkle Mountain Range nodes over the block hashes of a chain, in post-order
+    chain_name = Column(String, primary_key=True)
+    position = Column(Integer, primary_key=True)
+    digest = Column(LargeBinary)
+
+
+class SMTNodeModel(Base):
+    __tablename__ = "smt_nodes"
+    # Stored nodes of a sparse Merkle tree, prefix as 16 big-endian bytes. digest
+    # holds the node record: the digest, followed by the key path for shortcut leaves
+    # Primary key in this order so nodes are looked up by prefix
+    tree_name = Column(String, primary_key=True)
+    prefix = Column(LargeBinary, primary_key=True)
+    hight = Column(Integer, primary_key=True)
+    digest = Column(LargeBinary)
+
+
+class SMTValueModel(Base):
+    __tablename__ = "smt_values"
+    # Values of the set keys of a sparse Merkle tree, by leaf position
+    tree_name = Column(String, primary_key=True)
+    path = Column(LargeBinary, primary_key=True)
+    value = Column(LargeBinary)
+
+
+class CheckpointModel(Base):
+    __tablename__ = "verify_checkpoints"
+    chain_name = Column(String, primary_key=True)
+    block_index = Column(Integer)
+    block_hash = Column(String)
+    # HMAC over the other columns, so a tampered or damaged checkpoint is ignored
+    digest = Column(String)
+
+
 BLOCK_MODEL_MAP = {cls.__tablename__: cls for cls in BasicBlockModel.__subclasses__()}
+# Chain names are used as table and database file names
+CHAIN_NAME_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_block_model_lock = Lock()
+
+
+def init_database(
+    engine: Engine or Connection, block_models: Iterable[type[BasicBlockModel]] = None
+):
+    # Create the shared tables and the tables of block_models, or of every known chain
+    # if None, so a database file only holds the chains stored in it
+    if block_models is None:
+        block_models = BLOCK_MODEL_MAP.values()
+    block_tables = {model.__table__ for model in BLOCK_MODEL_MAP.values()}
+    tables = [
+        table for table in Base.metadata.sorted_tables if table not in block_tables
+    ] + [model.__table__ for model in block_models]
+
+    Base.metadata.create_all(engine, tables=tables)
+    if isinstance(engine, Engine):
+        with engine.begin() as connection:
+            _upgrade_tables(connection, tables)
+    else:
+        _upgrade_tables(engine, tables)
+
 
+def _upgrade_tables(connection: Connection, tables: list[Table]):
+    # create_all skips columns and indexes added to tables which already exist
+    inspector = inspect(connection)
+    for table in tables:
+        column_names = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in column_names:
+                column_type = column.type.compile(connection.dialect)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
 
-def init_database(engine: Engine):
-    Base.metadata.create_all(engine)
 
+def get_block_model(tablename: str = "blocks") -> type[BasicBlockModel]:
+    # Block models of other chains are declared on first use
+    block_model = BLOCK_MODEL_MAP.get(tablename)
+    if block_model is not None:
+        return block_model
 
-def get_block_model(tablename: str = "blocks"):
-    return BLOCK_MODEL_MAP[tablename]
+    with _block_model_lock:
+        block_model = BLOCK_MODEL_MAP.get(tablename)
+        if block_model is None:
+            if not CHAIN_NAME_PATTERN.fullmatch(tablename):
+                raise InvalidChainNameError(f"Invalid chain name: {tablename}")
+            if tablename in Base.metadata.tables:
+                raise InvalidChainNameError(
+                    f"Invalid chain name: {tablename} is a reserved table"
+                )
+            block_model = type(
+                f"BlockModel_{tablename}",
+                (BasicBlockModel,),
+                {"__tablename__": tablename},
+            )
+            BLOCK_MODEL_MAP[tablename] = block_model
+    return block_model
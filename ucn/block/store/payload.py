@@ -0,0 +1,63 @@
+from sqlalchemy import Select, bindparam, delete, func, select, update
+from .models import BasicBlockModel, PayloadBlobModel
+
+# Add to or remove from the reference count of a shared payload,
+# executed with one parameter set {b_digest, b_count} per payload
+RETAIN_PAYLOAD = (
+    update(PayloadBlobModel)
+    .where(PayloadBlobModel.digest == bindparam("b_digest"))
+    .values(ref_count=PayloadBlobModel.ref_count + bindparam("b_count"))
+)
+RELEASE_PAYLOAD = (
+    update(PayloadBlobModel)
+    .where(PayloadBlobModel.digest == bindparam("b_digest"))
+    .values(ref_count=PayloadBlobModel.ref_count - bindparam("b_count"))
+)
+DELETE_UNUSED_PAYLOADS = delete(PayloadBlobModel).where(PayloadBlobModel.ref_count <= 0)
+
+
+def select_blocks(block_model: type[BasicBlockModel], *columns) -> Select:
+    # Select the given columns with everything needed to build a BasicBlock,
+    # taking the payload from the block row or from the shared payload it references
+    return (
+        select(
+            *columns,
+            block_model.protocol,
+            block_model.previous_block_hash,
+            func.coalesce(block_model.data, PayloadBlobModel.data).label("data"),
+            func.coalesce(block_model.codec, PayloadBlobModel.codec).label("codec"),
+        )
+        .select_from(block_model)
+        .outerjoin(
+            PayloadBlobModel, PayloadBlobModel.digest == block_model.payload_digest
+        )
+    )
+
+
+def select_headers(block_model: type[BasicBlockModel], *columns) -> Select:
+    # Select the given columns with the block header columns, never the payload.
+    # Blocks stored before data_size was recorded fall back to the stored length
+    return select(
+        *columns,
+        block_model.block_index,
+        block_model.protocol,
+        block_model.block_hash,
+        block_model.previous_block_hash,
+        func.coalesce(block_model.data_size, func.length(block_model.data)).label(
+            "data_size"
+        ),
+    )
+
+
+def select_payload_references(
+    block_model: type[BasicBlockModel], *conditions
+) -> Select:
+    # Number of references to each shared payload from the blocks matching conditions
+    return (
+        select(
+            block_model.payload_digest.label("b_digest"),
+            func.count().label("b_count"),
+        )
+        .where(block_model.payload_digest.is_not(None), *conditions)
+        .group_by(block_model.payload_digest)
+    )
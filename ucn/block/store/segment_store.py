@@ -0,0 +1,519 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from threading import RLock
+from typing import Callable, Iterable, Iterator
+from ..error import (
+    BlockChainError,
+    InvalidPreviousBlockHashError,
+    MissingGenesisBlockError,
+)
+from ..data.basic_block import BasicBlock
+from ..data.block_header import BlockHeader
+from .base_store import BaseBlockStore
+
+# Record type, block index, protocol length, previous hash length, block hash length, data length
+RECORD_HEADER = struct.Struct("<cQHHHI")
+BLOCK_RECORD = b"B"
+TRUNCATE_RECORD = b"T"
+SEGMENT_SUFFIX = ".seg"
+# Index of a full segment: magic, format version, size of the indexed segment
+INDEX_HEADER = struct.Struct("<8sIQ")
+INDEX_MAGIC = b"UCNSEGIX"
+INDEX_VERSION = 1
+# Record type, block index, record offset, protocol length, block hash length,
+# followed by the protocol and the block hash
+INDEX_ENTRY = struct.Struct("<cQQHH")
+INDEX_SUFFIX = ".idx"
+HASH_PREFIX = "sha256:"
+
+
+class SegmentBlockStore(BaseBlockStore):
+    """Block store writing blocks to append-only segment files.
+
+    Every block is one record appended to the active segment file, and a new
+    segment is started once it grows beyond segment_size. Removing blocks
+    appends a truncate record instead of rewriting files, so data handed out
+    as memoryviews over the mmapped segments is never modified.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 64 * 1024 * 1024,
+        sync: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.sync = sync
+
+        # Block index -> (segment number, record offset), and block hash -> block index,
+        # keyed by the raw digest of the hash
+        self._segments = array("I")
+        self._offsets = array("Q")
+        self._hash_index: dict[bytes or str, int] = {}
+        # Protocol -> sorted block indices of that protocol
+        self._protocol_index: dict[str, array] = {}
+        self._maps: dict[int, mmap.mmap] = {}
+        self._lock = RLock()
+
+        self._segment_no = 0
+        self._file = None
+        self._load()
+
+    def add_block(
+        self, protocol: str, data: bytes, previous_block_hash: str = None
+    ) -> str:
+        if previous_block_hash is None:
+            previous_block_hash = self.get_latest_block_hash()
+        block = BasicBlock(
+            protocol=protocol,
+            previous_block_hash=previous_block_hash,
+            data=data,
+        )
+        return self.add_blocks([block])[0]
+
+    def add_blocks(self, blocks: Iterable[BasicBlock]) -> list[str]:
+        blocks = list(blocks)
+        if not blocks:
+            return []
+
+        with self._lock:
+            block_count = len(self._offsets)
+            if not block_count and blocks[0].previous_block_hash:
+                raise MissingGenesisBlockError(
+                    "Missing genesis block: The database does not contain a genesis block yet."
+                )
+
+            # Validate the linkage of the whole batch before writing anything
+            previous_block_hash = self.get_latest_block_hash()
+            block_hashes = []
+            for block in blocks:
+                if block.previous_block_hash != previous_block_hash:
+                    raise InvalidPreviousBlockHashError(
+                        "Invalid previous block hash: The given previous block hash does not match the hash of the latest block in the database."
+                    )
+                previous_block_hash = self.get_hash(block)
+                block_hashes.append(previous_block_hash)
+
+            self._roll_segment()
+            offset = self._file.tell()
+            records = []
+            locations = []
+            for i, (block, block_hash) in enumerate(zip(blocks, block_hashes)):
+                record = self._encode_record(block_count + i, block, block_hash)
+                records.append(record)
+                locations.append(offset)
+                offset += len(record)
+            self._write(b"".join(records))
+
+            for i, (block, block_hash) in enumerate(zip(blocks, block_hashes)):
+                self._index_block(
+                    block_count + i, locations[i], block_hash, block.protocol
+                )
+
+        return block_hashes
+
+    def get_block(self, block_hash: str) -> BasicBlock or None:
+        with self._lock:
+            block_index = self._hash_index.get(_hash_key(block_hash))
+            if block_index is None:
+                return None
+            return self._read_block(block_index)
+
+    def get_block_by_index(self, block_index: int) -> BasicBlock or None:
+        with self._lock:
+            if block_index == -1:
+                block_index = len(self._offsets) - 1
+            if not 0 <= block_index < len(self._offsets):
+                return None
+            return self._read_block(block_index)
+
+    def iter_blocks(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> Iterator[BasicBlock]:
+        block_index = start_index
+        while True:
+            with self._lock:
+                stop_index = len(self._offsets)
+                if end_index is not None:
+                    stop_index = min(stop_index, end_index)
+                if block_index >= stop_index:
+                    return
+                block = self._read_block(block_index)
+            yield block
+            block_index += 1
+
+    def iter_blocks_by_protocol(
+        self, protocol: str, since_index: int = 0, batch_size: int = 1000
+    ) -> Iterator[tuple[int, BasicBlock]]:
+        block_index = since_index
+        while True:
+            with self._lock:
+                protocol_indices = self._protocol_index.get(protocol, ())
+                position = bisect_left(protocol_indices, block_index)
+                if position >= len(protocol_indices):
+                    return
+                block_index = protocol_indices[position]
+                block = self._read_block(block_index)
+            yield block_index, block
+            block_index += 1
+
+    def get_header(self, block_hash: str) -> BlockHeader or None:
+        with self._lock:
+            block_index = self._hash_index.get(_hash_key(block_hash))
+            if block_index is None:
+                return None
+            return self._read_header(block_index)
+
+    def get_header_by_index(self, block_index: int) -> BlockHeader or None:
+        with self._lock:
+            if block_index == -1:
+                block_index = len(self._offsets) - 1
+            if not 0 <= block_index < len(self._offsets):
+                return None
+            return self._read_header(block_index)
+
+    def iter_headers(
+        self, start_index: int = 0, end_index: int = None, batch_size: int = 1000
+    ) -> Iterator[BlockHeader]:
+        block_index = start_index
+        while True:
+            with self._lock:
+                stop_index = len(self._offsets)
+                if end_index is not None:
+                    stop_index = min(stop_index, end_index)
+                if block_index >= stop_index:
+                    return
+                header = self._read_header(block_index)
+            yield header
+            block_index += 1
+
+    def get_latest_block_hash(self) -> str:
+        with self._lock:
+            if not self._offsets:
+                return ""
+            return self._read_block_hash(len(self._offsets) - 1)
+
+    def get_block_count(self) -> int:
+        return len(self._offsets)
+
+    def remove_block(self, block_hash: str) -> list[BasicBlock]:
+        blocks = []
+        self.truncate(block_hash, blocks.append)
+        return blocks
+
+    def remove_block_by_index(self, block_index: int) -> list[BasicBlock]:
+        blocks = []
+        self.truncate_by_index(block_index, blocks.append)
+        return blocks
+
+    def truncate(
+        self, block_hash: str, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        with self._lock:
+            block_index = self._hash_index.get(_hash_key(block_hash))
+            if block_index is None:
+                return 0
+            return self.truncate_by_index(block_index, callback)
+
+    def truncate_by_index(
+        self, block_index: int, callback: Callable[[BasicBlock], None] = None
+    ) -> int:
+        with self._lock:
+            block_index = max(block_index, 0)
+            removed_count = len(self._offsets) - block_index
+            if removed_count <= 0:
+                return 0
+
+            if callback is not None:
+                # Nothing is removed if the callback raises
+                for i in range(block_index, len(self._offsets)):
+                    callback(self._read_block(i))
+
+            self._roll_segment()
+            self._write(RECORD_HEADER.pack(TRUNCATE_RECORD, block_index, 0, 0, 0, 0))
+            self._truncate_index(block_index)
+            return removed_count
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            # Mapped segments stay alive as long as memoryviews over them exist
+            self._maps.clear()
+
+    @staticmethod
+    def _encode_record(block_index: int, block: BasicBlock, block_hash: str) -> bytes:
+        protocol = block.protocol.encode("utf8")
+        previous_block_hash = block.previous_block_hash.encode("utf8")
+        block_hash = block_hash.encode("utf8")
+        return b"".join(
+            (
+                RECORD_HEADER.pack(
+                    BLOCK_RECORD,
+                    block_index,
+                    len(protocol),
+                    len(previous_block_hash),
+                    len(block_hash),
+                    len(block.data),
+                ),
+                protocol,
+                previous_block_hash,
+                block_hash,
+                block.data,
+            )
+        )
+
+    def _segment_path(self, segment_no: int) -> Path:
+        return self.directory / f"{segment_no:08d}{SEGMENT_SUFFIX}"
+
+    def _roll_segment(self):
+        # Start a new segment file once the active one is full
+        if self._file.tell() >= self.segment_size:
+            self._file.close()
+            segment_path = self._segment_path(self._segment_no)
+            self._write_segment_index(segment_path, self._scan_segment(segment_path))
+            self._segment_no += 1
+            self._file = open(self._segment_path(self._segment_no), "ab")
+
+    def _write(self, content: bytes):
+        self._file.write(content)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def _get_map(self, segment_no: int, end: int) -> mmap.mmap:
+        segment_map = self._maps.get(segment_no)
+        if segment_map is None or len(segment_map) < end:
+            # The segment grew since it was mapped, map it again
+            with open(self._segment_path(segment_no), "rb") as f:
+                segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment_no] = segment_map
+        return segment_map
+
+    def _read_record(self, block_index: int) -> tuple[tuple, memoryview]:
+        segment_no = self._segments[block_index]
+        offset = self._offsets[block_index]
+        segment_map = self._get_map(segment_no, offset + RECORD_HEADER.size)
+        header = RECORD_HEADER.unpack_from(segment_map, offset)
+        body_offset = offset + RECORD_HEADER.size
+        end = body_offset + sum(header[2:])
+        return header, memoryview(self._get_map(segment_no, end))[body_offset:end]
+
+    def _read_block_hash(self, block_index: int) -> str:
+        header, record = self._read_record(block_index)
+        hash_offset = header[2] + header[3]
+        return str(record[hash_offset : hash_offset + header[4]], "utf8")
+
+    def _read_header(self, block_index: int) -> BlockHeader:
+        # Only the record header and the fields before the data are accessed
+        header, record = self._read_record(block_index)
+        (
+            _,
+            _,
+            protocol_size,
+            previous_block_hash_size,
+            block_hash_size,
+            data_size,
+        ) = header
+        hash_offset = protocol_size + previous_block_hash_size
+        return BlockHeader(
+            block_index=block_index,
+            protocol=str(record[:protocol_size], "utf8"),
+            block_hash=str(record[hash_offset : hash_offset + block_hash_size], "utf8"),
+            previous_block_hash=str(record[protocol_size:hash_offset], "utf8"),
+            data_size=data_size,
+            loader=self.get_block,
+        )
+
+    def _read_block(self, block_index: int) -> BasicBlock:
+        header, record = self._read_record(block_index)
+        _, _, protocol_size, previous_block_hash_size, block_hash_size, _ = header
+        data_offset = protocol_size + previous_block_hash_size + block_hash_size
+        return BasicBlock(
+            protocol=str(record[:protocol_size], "utf8"),
+            previous_block_hash=str(
+                record[protocol_size : protocol_size + previous_block_hash_size],
+                "utf8",
+            ),
+            # Zero-copy view over the mapped segment
+            data=record[data_offset:],
+        )
+
+    def _index_block(
+        self, block_index: int, offset: int, block_hash: str, protocol: str
+    ):
+        self._segments.append(self._segment_no)
+        self._offsets.append(offset)
+        self._hash_index[_hash_key(block_hash)] = block_index
+        self._protocol_index.setdefault(protocol, array("Q")).append(block_index)
+
+    def _truncate_index(self, block_index: int):
+        for i in range(block_index, len(self._offsets)):
+            del self._hash_index[_hash_key(self._read_block_hash(i))]
+        for protocol_indices in self._protocol_index.values():
+            del protocol_indices[bisect_left(protocol_indices, block_index) :]
+        del self._segments[block_index:]
+        del self._offsets[block_index:]
+
+    def _load(self):
+        segment_paths = sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+        for position, path in enumerate(segment_paths):
+            self._segment_no = int(path.stem)
+            # Full segments are never written again, their index is kept on disk
+            sealed = position < len(segment_paths) - 1
+            entries = self._read_segment_index(path) if sealed else None
+            if entries is None:
+                entries = self._scan_segment(path)
+                if sealed:
+                    self._write_segment_index(path, entries)
+            for entry in entries:
+                self._load_entry(path, *entry)
+        # Segments may have been cut while loading, map them again on demand
+        self._maps.clear()
+        self._file = open(self._segment_path(self._segment_no), "ab")
+
+    def _load_entry(
+        self,
+        path: Path,
+        record_type: bytes,
+        block_index: int,
+        offset: int,
+        protocol: str,
+        block_hash: str,
+    ):
+        if record_type == TRUNCATE_RECORD:
+            self._truncate_index(block_index)
+        elif record_type == BLOCK_RECORD and block_index == len(self._offsets):
+            self._index_block(block_index, offset, block_hash, protocol)
+        else:
+            raise BlockChainError(f"Corrupted block segment: {path} at {offset}")
+
+    @staticmethod
+    def _scan_segment(path: Path) -> list[tuple]:
+        # Read the record headers, protocols and block hashes through a map of
+        # the segment, the payloads are skipped without being read
+        entries = []
+        size = path.stat().st_size
+        offset = 0
+        if size:
+            with open(path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as content:
+                while offset + RECORD_HEADER.size <= size:
+                    header = RECORD_HEADER.unpack_from(content, offset)
+                    (
+                        record_type,
+                        block_index,
+                        protocol_size,
+                        previous_block_hash_size,
+                        block_hash_size,
+                        _,
+                    ) = header
+                    body_offset = offset + RECORD_HEADER.size
+                    end = body_offset + sum(header[2:])
+                    if end > size:
+                        break
+                    hash_offset = body_offset + protocol_size + previous_block_hash_size
+                    entries.append(
+                        (
+                            record_type,
+                            block_index,
+                            offset,
+                            content[body_offset : body_offset + protocol_size].decode(
+                                "utf8"
+                            ),
+                            content[hash_offset : hash_offset + block_hash_size].decode(
+                                "utf8"
+                            ),
+                        )
+                    )
+                    offset = end
+
+        if offset < size:
+            # Drop a record torn by a crash in the middle of a write
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+        return entries
+
+    @staticmethod
+    def _read_segment_index(path: Path) -> list[tuple] or None:
+        # Entries of a full segment, None if its index is missing or does not
+        # match the segment
+        try:
+            content = path.with_suffix(INDEX_SUFFIX).read_bytes()
+        except FileNotFoundError:
+            return None
+        if len(content) < INDEX_HEADER.size:
+            return None
+        magic, version, segment_size = INDEX_HEADER.unpack_from(content)
+        if (
+            magic != INDEX_MAGIC
+            or version != INDEX_VERSION
+            or segment_size != path.stat().st_size
+        ):
+            return None
+
+        entries = []
+        offset = INDEX_HEADER.size
+        while offset < len(content):
+            if offset + INDEX_ENTRY.size > len(content):
+                return None
+            (
+                record_type,
+                block_index,
+                record_offset,
+                protocol_size,
+                block_hash_size,
+            ) = INDEX_ENTRY.unpack_from(content, offset)
+            offset += INDEX_ENTRY.size
+            hash_offset = offset + protocol_size
+            end = hash_offset + block_hash_size
+            if end > len(content):
+                return None
+            entries.append(
+                (
+                    record_type,
+                    block_index,
+                    record_offset,
+                    content[offset:hash_offset].decode("utf8"),
+                    content[hash_offset:end].decode("utf8"),
+                )
+            )
+            offset = end
+        return entries
+
+    @staticmethod
+    def _write_segment_index(path: Path, entries: list[tuple]):
+        # Written next to the index and moved into place once complete
+        parts = [INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, path.stat().st_size)]
+        for record_type, block_index, offset, protocol, block_hash in entries:
+            protocol = protocol.encode("utf8")
+            block_hash = block_hash.encode("utf8")
+            parts.append(
+                INDEX_ENTRY.pack(
+                    record_type, block_index, offset, len(protocol), len(block_hash)
+                )
+                + protocol
+                + block_hash
+            )
+        index_path = path.with_suffix(INDEX_SUFFIX)
+        temp_path = index_path.with_suffix(f"{INDEX_SUFFIX}.tmp")
+        temp_path.write_bytes(b"".join(parts))
+        os.replace(temp_path, index_path)
+
+
+def _hash_key(block_hash: str) -> bytes or str:
+    # The raw digest of a "sha256:<hex>" block hash, other hashes are kept as is
+    if block_hash.startswith(HASH_PREFIX):
+        try:
+            return bytes.fromhex(block_hash[len(HASH_PREFIX) :])
+        except ValueError:
+            pass
+    return block_hash
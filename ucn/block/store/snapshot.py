@@ -0,0 +1,220 @@
+import hashlib
+import mmap
+import os
+import struct
+from itertools import islice
+from typing import Iterator
+from ..error import InvalidPreviousBlockHashError, SnapshotError
+from ..data.basic_block import BasicBlock
+from .base_store import BaseBlockStore
+
+# Magic, format version, index of the first block
+SNAPSHOT_HEADER = struct.Struct("<8sIQ")
+SNAPSHOT_MAGIC = b"UCNCHAIN"
+SNAPSHOT_VERSION = 1
+# Protocol length, previous hash length, data length
+RECORD_HEADER = struct.Struct("<HHI")
+# Record offset, block hash length
+INDEX_ENTRY = struct.Struct("<QH")
+# Index offset, block count, followed by the sha256 digest of everything before it
+SNAPSHOT_FOOTER = struct.Struct("<QQ")
+DIGEST_SIZE = 32
+# Bytes hashed at once when checking the digest
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+class ChainSnapshot:
+    """Read-only view over a chain snapshot file written by export_chain.
+
+    A snapshot holds the blocks of a chain range as length-prefixed records,
+    followed by an index of their hashes and record offsets, and ends with a
+    sha256 digest of the whole file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f"Empty chain snapshot: {path}")
+
+        footer_offset = len(self._map) - SNAPSHOT_FOOTER.size - DIGEST_SIZE
+        if footer_offset < SNAPSHOT_HEADER.size:
+            self.close()
+            raise SnapshotError(f"Truncated chain snapshot: {path}")
+        magic, version, self.start_index = SNAPSHOT_HEADER.unpack_from(self._map)
+        self._index_offset, self.block_count = SNAPSHOT_FOOTER.unpack_from(
+            self._map, footer_offset
+        )
+        self._digest = self._map[-DIGEST_SIZE:]
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise SnapshotError(f"Not a chain snapshot: {path}")
+        if not SNAPSHOT_HEADER.size <= self._index_offset <= footer_offset:
+            self.close()
+            raise SnapshotError(f"Corrupted chain snapshot: {path}")
+        # Block hash -> record offset, read from the index when first needed
+        self._hash_index: dict[str, int] or None = None
+
+    def __enter__(self) -> "ChainSnapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def verify_digest(self) -> bool:
+        hasher = hashlib.sha256()
+        end = len(self._map) - DIGEST_SIZE
+        for offset in range(0, end, DIGEST_CHUNK_SIZE):
+            hasher.update(self._map[offset : min(offset + DIGEST_CHUNK_SIZE, end)])
+        return hasher.digest() == self._digest
+
+    def iter_blocks(self) -> Iterator[tuple[str, BasicBlock]]:
+        # Blocks in chain order with their hash as recorded in the index
+        for record_offset, block_hash in self._iter_index():
+            yield block_hash, self._read_block(record_offset)
+
+    def get_block(self, block_hash: str) -> BasicBlock or None:
+        if self._hash_index is None:
+            self._hash_index = {
+                block_hash: record_offset
+                for record_offset, block_hash in self._iter_index()
+            }
+        record_offset = self._hash_index.get(block_hash)
+        if record_offset is None:
+            return None
+        return self._read_block(record_offset)
+
+    def _iter_index(self) -> Iterator[tuple[int, str]]:
+        offset = self._index_offset
+        record_offset = SNAPSHOT_HEADER.size
+        for _ in range(self.block_count):
+            entry_offset, hash_size = INDEX_ENTRY.unpack_from(self._map, offset)
+            # Records are contiguous and indexed in order
+            if entry_offset != record_offset:
+                raise SnapshotError(f"Corrupted chain snapshot index: {self.path}")
+            offset += INDEX_ENTRY.size
+            yield entry_offset, self._map[offset : offset + hash_size].decode("utf8")
+            offset += hash_size
+            record_offset += RECORD_HEADER.size + sum(
+                RECORD_HEADER.unpack_from(self._map, record_offset)
+            )
+
+    def _read_block(self, record_offset: int) -> BasicBlock:
+        protocol_size, previous_block_hash_size, data_size = RECORD_HEADER.unpack_from(
+            self._map, record_offset
+        )
+        offset = record_offset + RECORD_HEADER.size
+        hash_offset = offset + protocol_size
+        data_offset = hash_offset + previous_block_hash_size
+        if data_offset + data_size > self._index_offset:
+            raise SnapshotError(f"Corrupted chain snapshot record: {self.path}")
+        return BasicBlock(
+            protocol=self._map[offset:hash_offset].decode("utf8"),
+            previous_block_hash=self._map[hash_offset:data_offset].decode("utf8"),
+            data=self._map[data_offset : data_offset + data_size],
+        )
+
+
+def export_chain(
+    store: BaseBlockStore, path: str, start_index: int = 0, end_index: int = None
+) -> int:
+    """Write the blocks from start_index up to end_index to a snapshot file
+
+    The file is written next to path and moved into place once complete.
+    Returns the number of exported blocks.
+    """
+    hasher = hashlib.sha256()
+    index = []
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+
+        def write(content: bytes):
+            f.write(content)
+            hasher.update(content)
+
+        write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, start_index))
+        offset = SNAPSHOT_HEADER.size
+        for block in store.iter_blocks(start_index, end_index):
+            protocol = block.protocol.encode("utf8")
+            previous_block_hash = block.previous_block_hash.encode("utf8")
+            write(
+                RECORD_HEADER.pack(
+                    len(protocol), len(previous_block_hash), len(block.data)
+                )
+                + protocol
+                + previous_block_hash
+            )
+            # Payloads are written and hashed without being copied
+            write(block.data)
+            index.append((offset, store.get_hash(block).encode("utf8")))
+            offset += (
+                RECORD_HEADER.size
+                + len(protocol)
+                + len(previous_block_hash)
+                + len(block.data)
+            )
+
+        index_offset = offset
+        write(
+            b"".join(
+                INDEX_ENTRY.pack(record_offset, len(block_hash)) + block_hash
+                for record_offset, block_hash in index
+            )
+        )
+        write(SNAPSHOT_FOOTER.pack(index_offset, len(index)))
+        f.write(hasher.digest())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(index)
+
+
+def import_chain(
+    store: BaseBlockStore, path: str, verify: bool = True, batch_size: int = 1000
+) -> int:
+    """Append the blocks of a snapshot file to a store through add_blocks
+
+    The snapshot must continue the chain of the store. Block hashes are checked
+    against the snapshot index if verify. Returns the number of imported blocks.
+    """
+    imported_count = 0
+    with open_snapshot(path) as snapshot:
+        check_snapshot_start(snapshot, store.get_block_count())
+        blocks = snapshot.iter_blocks()
+        while True:
+            batch = list(islice(blocks, batch_size))
+            if not batch:
+                return imported_count
+            if verify:
+                check_block_hashes(store, batch)
+            store.add_blocks(block for _, block in batch)
+            imported_count += len(batch)
+
+
+def open_snapshot(path: str) -> ChainSnapshot:
+    # Open a snapshot after checking its digest
+    snapshot = ChainSnapshot(path)
+    if not snapshot.verify_digest():
+        snapshot.close()
+        raise SnapshotError(f"Chain snapshot digest mismatch: {path}")
+    return snapshot
+
+
+def check_snapshot_start(snapshot: ChainSnapshot, block_count: int):
+    if snapshot.start_index != block_count:
+        raise InvalidPreviousBlockHashError(
+            f"Invalid previous block hash: The snapshot starts at block {snapshot.start_index}, but the chain has {block_count} blocks."
+        )
+
+
+def check_block_hashes(store: BaseBlockStore, blocks: list[tuple[str, BasicBlock]]):
+    for block_hash, block in blocks:
+        if store.get_hash(block) != block_hash:
+            raise SnapshotError(
+                f"Chain snapshot block hash mismatch: {block_hash} does not match its block"
+            )
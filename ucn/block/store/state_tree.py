@@ -0,0 +1,127 @@
+from itertools import islice
+from typing import Iterable
+from sqlalchemy import bindparam, delete, insert, select
+from sqlalchemy.orm import Session
+from ...hash_tree.builder import DIGEST_SIZE
+from ...hash_tree.sparse import NodeKey, SMTStorage
+from .models import SMTNodeModel, SMTValueModel
+
+# Node prefixes looked up per query, below the SQLite bound parameter limit
+LOOKUP_BATCH_SIZE = 500
+# Executed with {b_tree_name, b_prefixes, b_hights}, compiled once instead of for
+# every lookup
+SELECT_NODES = select(
+    SMTNodeModel.hight, SMTNodeModel.prefix, SMTNodeModel.digest
+).where(
+    SMTNodeModel.tree_name == bindparam("b_tree_name"),
+    SMTNodeModel.prefix.in_(bindparam("b_prefixes", expanding=True)),
+    SMTNodeModel.hight.in_(bindparam("b_hights", expanding=True)),
+)
+REPLACE_NODE = insert(SMTNodeModel).prefix_with("OR REPLACE")
+REPLACE_VALUE = insert(SMTValueModel).prefix_with("OR REPLACE")
+# Executed with one parameter set {b_tree_name, b_hight, b_prefix} per node
+DELETE_NODE = delete(SMTNodeModel).where(
+    SMTNodeModel.tree_name == bindparam("b_tree_name"),
+    SMTNodeModel.hight == bindparam("b_hight"),
+    SMTNodeModel.prefix == bindparam("b_prefix"),
+)
+# Executed with one parameter set {b_tree_name, b_path} per value
+DELETE_VALUE = delete(SMTValueModel).where(
+    SMTValueModel.tree_name == bindparam("b_tree_name"),
+    SMTValueModel.path == bindparam("b_path"),
+)
+
+
+def _encode(number: int) -> bytes:
+    return number.to_bytes(DIGEST_SIZE, "big")
+
+
+class SQLSMTStorage(SMTStorage):
+    """Sparse Merkle tree nodes and values of tree_name, read and written in session
+
+    Writes are only persisted when the session is committed, so the state of a
+    tree can be committed together with the blocks it was computed from.
+    """
+
+    def __init__(self, session: Session, tree_name: str):
+        self.session = session
+        self.tree_name = tree_name
+
+    def get_nodes(self, node_keys: Iterable[NodeKey]) -> dict[NodeKey, bytes]:
+        wanted = set(node_keys)
+        nodes = {}
+        connection = self.session.connection()
+        hights = sorted({hight for hight, _ in wanted})
+        prefixes = iter({_encode(prefix) for _, prefix in wanted})
+        while batch := list(islice(prefixes, LOOKUP_BATCH_SIZE)):
+            # Prefixes are shared by nodes of different heights, the nodes of
+            # wanted heights but other prefixes are filtered out here
+            for hight, prefix, digest in connection.execute(
+                SELECT_NODES,
+                {
+                    "b_tree_name": self.tree_name,
+                    "b_prefixes": batch,
+                    "b_hights": hights,
+                },
+            ):
+                node_key = (hight, int.from_bytes(prefix, "big"))
+                if node_key in wanted:
+                    nodes[node_key] = digest
+        return nodes
+
+    def get_value(self, path: int) -> bytes or None:
+        return self.session.scalar(
+            select(SMTValueModel.value).where(
+                SMTValueModel.tree_name == self.tree_name,
+                SMTValueModel.path == _encode(path),
+            )
+        )
+
+    def write(
+        self,
+        nodes: dict[NodeKey, bytes or None],
+        values: dict[int, bytes or None],
+    ):
+        # Executed on the connection as plain executemany statements. Set keys
+        # replace their previous row, and only keys back to default are deleted
+        connection = self.session.connection()
+        node_rows = []
+        deleted_nodes = []
+        for (hight, prefix), digest in nodes.items():
+            if digest is None:
+                deleted_nodes.append(
+                    {
+                        "b_tree_name": self.tree_name,
+                        "b_hight": hight,
+                        "b_prefix": _encode(prefix),
+                    }
+                )
+            else:
+                node_rows.append(
+                    {
+                        "tree_name": self.tree_name,
+                        "hight": hight,
+                        "prefix": _encode(prefix),
+                        "digest": digest,
+                    }
+                )
+        value_rows = []
+        deleted_values = []
+        for path, value in values.items():
+            if value is None:
+                deleted_values.append(
+                    {"b_tree_name": self.tree_name, "b_path": _encode(path)}
+                )
+            else:
+                value_rows.append(
+                    {"tree_name": self.tree_name, "path": _encode(path), "value": value}
+                )
+
+        if deleted_nodes:
+            connection.execute(DELETE_NODE, deleted_nodes)
+        if node_rows:
+            connection.execute(REPLACE_NODE, node_rows)
+        if deleted_values:
+            connection.execute(DELETE_VALUE, deleted_values)
+        if value_rows:
+            connection.execute(REPLACE_VALUE, value_rows)
@@ -0,0 +1,172 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator
+from .data.basic_block import BasicBlock
+from .store.base_store import BaseBlockStore
+
+# Store opened once by every worker process, which reads the ranges it verifies
+_worker_store: BaseBlockStore or None = None
+
+
+def verify_chain(
+    store: BaseBlockStore,
+    start_index: int = 0,
+    end_index: int = None,
+    previous_block_hash: str = None,
+    range_size: int = 1000,
+    max_workers: int = None,
+    store_factory: Callable[[], BaseBlockStore] = None,
+) -> int or None:
+    """Verify stored blocks and return the index of the first bad block, or None
+
+    Block i is bad when its recomputed hash does not match the previous_block_hash
+    of block i + 1 (or the latest block hash of the store for the last block).
+    The chain is split in ranges of range_size blocks which are read and hashed
+    by a process pool, and the links between ranges are checked here.
+    previous_block_hash is the trusted hash of the block before start_index.
+
+    store_factory is a picklable callable opening the same chain, called once in
+    every worker process, so only range bounds and hashes cross processes.
+    Without it, e.g. for an in-memory database other processes cannot open, the
+    ranges are read and hashed in this process.
+    """
+    block_count = store.get_block_count()
+    if end_index is None or end_index > block_count:
+        end_index = block_count
+    if start_index >= end_index:
+        return None
+
+    if previous_block_hash is None:
+        previous_block_hash = (
+            store.get_hash(store.get_block_by_index(start_index - 1))
+            if start_index
+            else ""
+        )
+
+    ranges = [
+        (range_start, min(range_start + range_size, end_index))
+        for range_start in range(start_index, end_index, range_size)
+    ]
+    if max_workers == 1 or store_factory is None:
+        results = (
+            _verify_blocks(
+                range_start,
+                store.iter_blocks(range_start, range_end, range_end - range_start),
+            )
+            for range_start, range_end in ranges
+        )
+        bad_block_index, last_block_hash = _check_links(
+            results, start_index, previous_block_hash
+        )
+    else:
+        max_workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(
+            max_workers, initializer=_open_worker_store, initargs=(store_factory,)
+        ) as executor:
+            results = _submit_ranges(executor, ranges, max_workers * 2)
+            try:
+                bad_block_index, last_block_hash = _check_links(
+                    results, start_index, previous_block_hash
+                )
+            finally:
+                # Cancel the ranges still queued when a bad block was found early
+                results.close()
+    if bad_block_index is not None:
+        return bad_block_index
+
+    # The last block is checked against the parent hash stored in the block after
+    # the verified range, or against the hash recorded for the tip
+    next_header = (
+        store.get_header_by_index(end_index) if end_index < block_count else None
+    )
+    if next_header is not None:
+        expected_block_hash = next_header.previous_block_hash
+    else:
+        expected_block_hash = store.get_latest_block_hash()
+    if last_block_hash != expected_block_hash:
+        return end_index - 1
+    return None
+
+
+def _open_worker_store(store_factory: Callable[[], BaseBlockStore]):
+    global _worker_store
+    _worker_store = store_factory()
+
+
+def _verify_stored_range(
+    range_start: int, range_end: int
+) -> tuple[int, str or None, str or None, int or None]:
+    # Runs in a worker process, reading the range from the worker's own store
+    return _verify_blocks(
+        range_start,
+        _worker_store.iter_blocks(range_start, range_end, range_end - range_start),
+    )
+
+
+def _submit_ranges(
+    executor: Executor,
+    ranges: Iterable[tuple[int, int]],
+    max_pending: int,
+) -> Iterator[tuple[int, str or None, str or None, int or None]]:
+    # Keep a bounded number of ranges in flight so memory stays flat
+    pending: deque[Future] = deque()
+    try:
+        for range_start, range_end in ranges:
+            pending.append(
+                executor.submit(_verify_stored_range, range_start, range_end)
+            )
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _verify_blocks(
+    start_index: int, blocks: Iterable[BasicBlock]
+) -> tuple[int, str or None, str or None, int or None]:
+    # Returns the range start, the parent hash of its first block, the hash of its
+    # last block and the index of the first block not matching its successor's parent hash.
+    # The parent and last hashes are None for a range without blocks
+    first_previous_block_hash = None
+    block_hash = None
+    for i, block in enumerate(blocks):
+        if block_hash is None:
+            first_previous_block_hash = block.previous_block_hash
+        elif block.previous_block_hash != block_hash:
+            return (
+                start_index,
+                first_previous_block_hash,
+                block_hash,
+                start_index + i - 1,
+            )
+        block_hash = BaseBlockStore.get_hash(block)
+    return start_index, first_previous_block_hash, block_hash, None
+
+
+def _check_links(
+    results: Iterator[tuple[int, str or None, str or None, int or None]],
+    start_index: int,
+    previous_block_hash: str,
+) -> tuple[int or None, str]:
+    for (
+        range_start,
+        first_previous_block_hash,
+        last_block_hash,
+        bad_block_index,
+    ) in results:
+        if last_block_hash is None:
+            # The chain was truncated while verifying
+            break
+        if first_previous_block_hash != previous_block_hash:
+            # The trusted parent of the first block cannot be wrong, the block itself is
+            if range_start == start_index:
+                return range_start, previous_block_hash
+            return range_start - 1, previous_block_hash
+        if bad_block_index is not None:
+            return bad_block_index, previous_block_hash
+        previous_block_hash = last_block_hash
+    return None, previous_block_hash
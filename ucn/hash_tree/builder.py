@@ -0,0 +1,93 @@
+"""Linear-time hash tree builder over contiguous digest buffers
+
+A level is one bytes buffer of raw DIGEST_SIZE digests, node i of a level
+being level[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]. The parent of nodes 2i and
+2i + 1 is node i of the level above, and a last node without a sibling is
+hashed alone. Hashes are the same as HashNode's: a leaf is the SHAKE-256
+digest of its data, and a node at height h is the digest of h in decimal
+followed by the hex digests of its children.
+"""
+import binascii
+from concurrent.futures import Executor
+from hashlib import shake_256
+from typing import Iterable
+
+DIGEST_SIZE = 16
+# Two hex encoded digests
+_HEX_PAIR_SIZE = 4 * DIGEST_SIZE
+# Digests per chunk of a level hashed by an executor, even so no pair is split
+EXECUTOR_CHUNK_SIZE = 2**16
+
+
+def hash_data(data: bytes) -> bytes:
+    """Raw leaf digest of data"""
+    return shake_256(data).digest(DIGEST_SIZE)
+
+
+def hash_node(hight: int, l_node: bytes, r_node: bytes = b"") -> bytes:
+    """Raw parent digest at height hight, r_node is empty for a lone child"""
+    return shake_256(
+        str(hight).encode("utf-8") + binascii.hexlify(l_node + r_node)
+    ).digest(DIGEST_SIZE)
+
+
+def hash_leaves(data_list: Iterable[bytes]) -> bytes:
+    """Leaf level over data_list, sorted first like make_tree does"""
+    return b"".join(shake_256(data).digest(DIGEST_SIZE) for data in sorted(data_list))
+
+
+def hash_level(level: bytes, hight: int) -> bytes:
+    """Hash a level pairwise into the level above it, at height hight"""
+    # Hex encode the whole level once, each pair is then one slice of it
+    hex_level = binascii.hexlify(level)
+    prefix = shake_256(str(hight).encode("utf-8"))
+    parents = bytearray()
+    for offset in range(0, len(hex_level), _HEX_PAIR_SIZE):
+        hasher = prefix.copy()
+        hasher.update(hex_level[offset : offset + _HEX_PAIR_SIZE])
+        parents += hasher.digest(DIGEST_SIZE)
+    return bytes(parents)
+
+
+def build_levels(leaves: bytes, executor: Executor = None) -> list[bytes]:
+    """All levels from the leaves up to the root level, empty without leaves
+
+    Levels larger than EXECUTOR_CHUNK_SIZE digests are hashed in chunks by
+    executor if given, e.g. a ProcessPoolExecutor.
+    """
+    if len(leaves) % DIGEST_SIZE:
+        raise ValueError(f"Leaf buffer is not a multiple of {DIGEST_SIZE} bytes")
+    if not leaves:
+        return []
+    levels = [leaves]
+    chunk_size = EXECUTOR_CHUNK_SIZE * DIGEST_SIZE
+    while len(levels[-1]) > DIGEST_SIZE:
+        level = levels[-1]
+        if executor is None or len(level) <= chunk_size:
+            levels.append(hash_level(level, len(levels)))
+            continue
+        chunks = [
+            level[offset : offset + chunk_size]
+            for offset in range(0, len(level), chunk_size)
+        ]
+        levels.append(
+            b"".join(executor.map(hash_level, chunks, [len(levels)] * len(chunks)))
+        )
+    return levels
+
+
+def root_hash(levels: list[bytes]) -> str or None:
+    """Hex root hash of built levels, None for an empty tree"""
+    if not levels:
+        return None
+    return levels[-1].hex()
+
+
+def get_digest(level: bytes, index: int) -> bytes:
+    """Digest of node index of a level"""
+    return level[index * DIGEST_SIZE : (index + 1) * DIGEST_SIZE]
+
+
+def level_size(level: bytes) -> int:
+    """Number of nodes of a level"""
+    return len(level) // DIGEST_SIZE
@@ -0,0 +1,171 @@
+"""Array-backed hash tree
+
+A CompactHashTree holds the levels of ucn.hash_tree.builder, one buffer of
+raw digests per level, instead of one HashNode per node. Children are found by
+index, node i of height h having nodes 2i and 2i + 1 of height h - 1 as
+children, and HashNode objects are only created when a node is asked for.
+
+Trees are written to disk as a header followed by the levels from the leaves
+up, so a file is read back without rehashing.
+"""
+from __future__ import annotations
+import struct
+from concurrent.futures import Executor
+from typing import Iterable, Iterator
+
+from ucn.hash_tree.builder import (
+    DIGEST_SIZE,
+    build_levels,
+    get_digest,
+    hash_leaves,
+    level_size,
+    root_hash,
+)
+from ucn.hash_tree.node import HashNode, level_nodes
+from ucn.hash_tree.proof import MultiProof, prove_many
+
+# Magic, format version, leaf count
+TREE_HEADER = struct.Struct("<8sIQ")
+TREE_MAGIC = b"UCNHTREE"
+TREE_VERSION = 1
+
+
+def level_sizes(leaf_count: int) -> list[int]:
+    """Number of nodes of every level of a tree over leaf_count leaves"""
+    sizes = []
+    if leaf_count:
+        sizes.append(leaf_count)
+        while sizes[-1] > 1:
+            sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+class CompactHashTree:
+    """Hash tree stored as one digest buffer per level"""
+
+    def __init__(self, levels: list[bytes]):
+        self.levels = levels
+
+    @staticmethod
+    def from_data(
+        data_list: Iterable[bytes], executor: Executor = None
+    ) -> CompactHashTree:
+        """Build a tree over data_list, sorted first like make_tree does"""
+        return CompactHashTree(build_levels(hash_leaves(data_list), executor))
+
+    @staticmethod
+    def from_leaves(leaves: bytes, executor: Executor = None) -> CompactHashTree:
+        """Build a tree over a buffer of raw leaf digests, kept in order"""
+        return CompactHashTree(build_levels(leaves, executor))
+
+    @property
+    def root(self) -> str or None:
+        """Hex root hash, None for an empty tree"""
+        return root_hash(self.levels)
+
+    @property
+    def hight(self) -> int:
+        """Height of the root, -1 for an empty tree"""
+        return len(self.levels) - 1
+
+    @property
+    def leaf_count(self) -> int:
+        """Number of leaves"""
+        return level_size(self.levels[0]) if self.levels else 0
+
+    @property
+    def nbytes(self) -> int:
+        """Size of all digests"""
+        return sum(map(len, self.levels))
+
+    def get_digest(self, hight: int, index: int) -> bytes:
+        """Raw digest of node index at height hight"""
+        level = self.levels[hight]
+        if not 0 <= index < level_size(level):
+            raise IndexError(f"Node index {index} out of range at height {hight}")
+        return get_digest(level, index)
+
+    def get_node(self, hight: int, index: int) -> HashNode:
+        """HashNode view of node index at height hight"""
+        hash_str = self.get_digest(hight, index).hex()
+        if not hight:
+            return HashNode(hash_str=hash_str, hight=0)
+        children = self.levels[hight - 1]
+        return HashNode(
+            hash_str=hash_str,
+            hight=hight,
+            l_node=get_digest(children, 2 * index).hex(),
+            r_node=(
+                get_digest(children, 2 * index + 1).hex()
+                if 2 * index + 1 < level_size(children)
+                else None
+            ),
+        )
+
+    def iter_nodes(self, hight: int) -> Iterator[HashNode]:
+        """HashNode views of one level, created one at a time"""
+        for index in range(level_size(self.levels[hight])):
+            yield self.get_node(hight, index)
+
+    def prove(self, leaf_index: int) -> MultiProof:
+        """Inclusion proof of one leaf, checked with ucn.hash_tree.proof.verify"""
+        return prove_many(self.levels, [leaf_index])
+
+    def prove_many(self, indices: Iterable[int]) -> MultiProof:
+        """Inclusion proof of several leaves sharing their common siblings"""
+        return prove_many(self.levels, indices)
+
+    def to_node_map(self) -> dict[int, list[HashNode]]:
+        """Expand to the node map returned by make_tree"""
+        return {
+            hight: level_nodes(self.levels, hight) for hight in range(len(self.levels))
+        }
+
+    def verify(self) -> bool:
+        """Check that every level is hashed from the one below it"""
+        if [level_size(level) for level in self.levels] != level_sizes(self.leaf_count):
+            return False
+        return self.levels == build_levels(self.levels[0]) if self.levels else True
+
+    def to_bytes(self) -> bytes:
+        """Serialize to a header followed by the levels"""
+        return b"".join(
+            [TREE_HEADER.pack(TREE_MAGIC, TREE_VERSION, self.leaf_count)] + self.levels
+        )
+
+    @staticmethod
+    def from_bytes(data: bytes) -> CompactHashTree:
+        """Deserialize from to_bytes, without rehashing"""
+        if len(data) < TREE_HEADER.size:
+            raise ValueError("Truncated hash tree")
+        magic, version, leaf_count = TREE_HEADER.unpack_from(data)
+        if magic != TREE_MAGIC or version != TREE_VERSION:
+            raise ValueError("Not a hash tree")
+        sizes = level_sizes(leaf_count)
+        if len(data) != TREE_HEADER.size + sum(sizes) * DIGEST_SIZE:
+            raise ValueError("Hash tree size does not match its leaf count")
+
+        levels = []
+        offset = TREE_HEADER.size
+        for size in sizes:
+            levels.append(bytes(data[offset : offset + size * DIGEST_SIZE]))
+            offset += size * DIGEST_SIZE
+        return CompactHashTree(levels)
+
+    def save(self, path: str):
+        """Write the tree to a file"""
+        with open(path, "wb") as f:
+            f.write(TREE_HEADER.pack(TREE_MAGIC, TREE_VERSION, self.leaf_count))
+            for level in self.levels:
+                f.write(level)
+
+    @staticmethod
+    def load(path: str) -> CompactHashTree:
+        """Read a tree written by save"""
+        with open(path, "rb") as f:
+            return CompactHashTree.from_bytes(f.read())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CompactHashTree):
+            return NotImplemented
+        return self.levels == other.levels
@@ -0,0 +1,265 @@
+"""Merkle Mountain Range, an append-only hash accumulator
+
+Nodes are stored in post-order: every leaf is followed by the parents it
+completes. n leaves form one perfect tree (a peak) per set bit of n, and the
+root commits to the leaf count and the peaks from left to right. Leaves and
+parents are hashed like in ucn.hash_tree.builder, so every peak is the root
+of a HashNode tree over its (unsorted) leaves.
+"""
+from __future__ import annotations
+import binascii
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass, field
+from hashlib import shake_256
+
+from ucn.hash_tree.builder import DIGEST_SIZE, hash_data, hash_node
+
+
+class MMRStorage(metaclass=ABCMeta):
+    """Append-only sequence of node digests"""
+
+    @abstractmethod
+    def get_size(self) -> int:
+        """Number of stored nodes"""
+
+    @abstractmethod
+    def get(self, position: int) -> bytes:
+        """Digest of the node at position"""
+
+    @abstractmethod
+    def append(self, digests: list[bytes]):
+        """Store digests after the last node"""
+
+    @abstractmethod
+    def truncate(self, size: int):
+        """Drop the nodes from position size on"""
+
+
+class MemoryMMRStorage(MMRStorage):
+    """Node digests in one contiguous buffer"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def get_size(self) -> int:
+        return len(self._buffer) // DIGEST_SIZE
+
+    def get(self, position: int) -> bytes:
+        return bytes(
+            self._buffer[position * DIGEST_SIZE : (position + 1) * DIGEST_SIZE]
+        )
+
+    def append(self, digests: list[bytes]):
+        self._buffer += b"".join(digests)
+
+    def truncate(self, size: int):
+        del self._buffer[size * DIGEST_SIZE :]
+
+
+@dataclass
+class MMRProof:
+    """Inclusion proof of one leaf in a range of leaf_count leaves"""
+
+    leaf_index: int
+    leaf_count: int
+    # Hex siblings from the leaf up to its peak
+    path: list[str] = field(default_factory=list)
+    # Hex peaks of the range from left to right
+    peaks: list[str] = field(default_factory=list)
+
+    def encode(self) -> dict:
+        """Encode to dict"""
+        return {
+            "i": self.leaf_index,
+            "n": self.leaf_count,
+            "path": self.path,
+            "peaks": self.peaks,
+        }
+
+    @staticmethod
+    def decode(data: dict) -> MMRProof:
+        """Decode from dict"""
+        return MMRProof(data["i"], data["n"], list(data["path"]), list(data["peaks"]))
+
+
+def bag_peaks(leaf_count: int, peaks: list[bytes]) -> bytes:
+    """Root digest over the peaks of leaf_count leaves"""
+    return shake_256(
+        b"mmr:%d:" % leaf_count + binascii.hexlify(b"".join(peaks))
+    ).digest(DIGEST_SIZE)
+
+
+def mmr_size(leaf_count: int) -> int:
+    """Number of nodes of leaf_count leaves"""
+    return 2 * leaf_count - bin(leaf_count).count("1")
+
+
+def leaf_position(leaf_index: int) -> int:
+    """Position of a leaf"""
+    return mmr_size(leaf_index)
+
+
+def node_position(first_leaf_index: int, hight: int) -> int:
+    """Position of the node at height hight over the leaves from first_leaf_index"""
+    return leaf_position(first_leaf_index + (1 << hight) - 1) + hight
+
+
+def iter_peaks(leaf_count: int):
+    """First leaf index and height of every peak, left to right"""
+    first_leaf_index = 0
+    for hight in reversed(range(leaf_count.bit_length())):
+        if leaf_count & (1 << hight):
+            yield first_leaf_index, hight
+            first_leaf_index += 1 << hight
+
+
+def leaf_count_of(size: int) -> int:
+    """Number of leaves of an MMR of size nodes"""
+    leaf_count = 0
+    for hight in reversed(range(size.bit_length())):
+        peak_size = (1 << (hight + 1)) - 1
+        if size >= peak_size:
+            size -= peak_size
+            leaf_count += 1 << hight
+    if size:
+        raise ValueError("Not a complete Merkle Mountain Range size")
+    return leaf_count
+
+
+class MerkleMountainRange:
+    """Append-only accumulator with O(log n) appends and inclusion proofs"""
+
+    def __init__(self, storage: MMRStorage = None):
+        self.storage = storage if storage is not None else MemoryMMRStorage()
+
+    @property
+    def leaf_count(self) -> int:
+        """Number of appended leaves"""
+        return leaf_count_of(self.storage.get_size())
+
+    def append(self, data: bytes) -> int:
+        """Append a leaf over data and return its index"""
+        return self.extend([data])[0]
+
+    def extend(self, data_list: list[bytes]) -> list[int]:
+        """Append leaves over data_list and return their indices"""
+        return self.extend_digests([hash_data(data) for data in data_list])
+
+    def extend_digests(self, leaves: list[bytes]) -> list[int]:
+        """Append leaf digests and return their indices"""
+        leaf_index = self.leaf_count
+        first_leaf_index = leaf_index
+        # Parents completed by a leaf may need nodes appended in the same call
+        pending: list[bytes] = []
+        base_position = self.storage.get_size()
+
+        def get(position: int) -> bytes:
+            if position >= base_position:
+                return pending[position - base_position]
+            return self.storage.get(position)
+
+        for leaf in leaves:
+            pending.append(leaf)
+            digest = leaf
+            hight = 0
+            # Each trailing one bit of the new leaf index completes a parent
+            while (leaf_index + 1) & ((1 << (hight + 1)) - 1) == 0:
+                left_first_leaf_index = leaf_index + 1 - (1 << (hight + 1))
+                l_node = get(node_position(left_first_leaf_index, hight))
+                hight += 1
+                digest = hash_node(hight, l_node, digest)
+                pending.append(digest)
+            leaf_index += 1
+
+        self.storage.append(pending)
+        return list(range(first_leaf_index, leaf_index))
+
+    def truncate(self, leaf_count: int):
+        """Drop the leaves from leaf_count on"""
+        self.storage.truncate(mmr_size(max(leaf_count, 0)))
+
+    def get_peaks(self, leaf_count: int = None) -> list[bytes]:
+        """Peak digests of the first leaf_count leaves, all leaves if None"""
+        if leaf_count is None:
+            leaf_count = self.leaf_count
+        elif leaf_count > self.leaf_count:
+            raise IndexError(f"Leaf count {leaf_count} out of range")
+        return [
+            self.storage.get(node_position(first_leaf_index, hight))
+            for first_leaf_index, hight in iter_peaks(leaf_count)
+        ]
+
+    def root(self, leaf_count: int = None) -> str or None:
+        """Hex root over the first leaf_count leaves, None without leaves"""
+        if leaf_count is None:
+            leaf_count = self.leaf_count
+        if not leaf_count:
+            return None
+        return bag_peaks(leaf_count, self.get_peaks(leaf_count)).hex()
+
+    def prove(self, leaf_index: int, leaf_count: int = None) -> MMRProof:
+        """Inclusion proof of a leaf against root(leaf_count)"""
+        if leaf_count is None:
+            leaf_count = self.leaf_count
+        if not 0 <= leaf_index < leaf_count:
+            raise IndexError(f"Leaf index {leaf_index} out of range")
+        if leaf_count > self.leaf_count:
+            raise IndexError(f"Leaf count {leaf_count} out of range")
+
+        path = []
+        for first_leaf_index, peak_hight in iter_peaks(leaf_count):
+            if leaf_index < first_leaf_index + (1 << peak_hight):
+                break
+        offset = leaf_index - first_leaf_index
+        for hight in range(peak_hight):
+            # The sibling covers the other half of the parent's leaves
+            sibling_first_leaf_index = first_leaf_index + (
+                ((offset >> hight) ^ 1) << hight
+            )
+            path.append(
+                self.storage.get(node_position(sibling_first_leaf_index, hight)).hex()
+            )
+        return MMRProof(
+            leaf_index=leaf_index,
+            leaf_count=leaf_count,
+            path=path,
+            peaks=[peak.hex() for peak in self.get_peaks(leaf_count)],
+        )
+
+    @staticmethod
+    def verify(root: str, data: bytes, proof: MMRProof) -> bool:
+        """Check that a leaf over data is included in the range with this root"""
+        return verify_digest(root, hash_data(data), proof)
+
+
+def verify_digest(root: str, leaf: bytes, proof: MMRProof) -> bool:
+    """Check that a leaf digest is included in the range with this root"""
+    if not 0 <= proof.leaf_index < proof.leaf_count:
+        return False
+    peaks = list(iter_peaks(proof.leaf_count))
+    if len(peaks) != len(proof.peaks):
+        return False
+    for peak_number, (first_leaf_index, peak_hight) in enumerate(peaks):
+        if proof.leaf_index < first_leaf_index + (1 << peak_hight):
+            break
+    if len(proof.path) != peak_hight:
+        return False
+    # Proofs come from peers, malformed digests fail verification
+    try:
+        path = [bytes.fromhex(sibling) for sibling in proof.path]
+        peak_digests = [bytes.fromhex(peak) for peak in proof.peaks]
+    except (TypeError, ValueError):
+        return False
+    if any(len(digest) != DIGEST_SIZE for digest in path + peak_digests):
+        return False
+
+    offset = proof.leaf_index - first_leaf_index
+    digest = leaf
+    for hight, sibling in enumerate(path):
+        if (offset >> hight) & 1:
+            digest = hash_node(hight + 1, sibling, digest)
+        else:
+            digest = hash_node(hight + 1, digest, sibling)
+    if digest != peak_digests[peak_number]:
+        return False
+    return bag_peaks(proof.leaf_count, peak_digests).hex() == root
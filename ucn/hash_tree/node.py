@@ -4,6 +4,15 @@ from dataclasses import dataclass
 
 from hashlib import shake_256
 
+from ucn.hash_tree.builder import (
+    DIGEST_SIZE,
+    build_levels,
+    get_digest,
+    hash_leaves,
+    level_size,
+    root_hash,
+)
+
 
 @dataclass
 class HashNode:
@@ -28,16 +37,16 @@ class HashNode:
     def decode(data: dict) -> HashNode:
         """Decode from dict"""
         node = HashNode()
-        node.hash_str = data.keys()[0]
-        value = data.values()[0]
+        ((node.hash_str, value),) = data.items()
         node.hight = value["h"]
         node.l_node = value["l"]
         node.r_node = value["r"]
+        return node
 
     @staticmethod
     def hash(data: bytes) -> str:
         """Hash function"""
-        shake_256(data).hexdigest(16)
+        return shake_256(data).hexdigest(DIGEST_SIZE)
 
     @staticmethod
     def init_node(hight: int, l_node: str, r_node: str) -> HashNode:
@@ -47,6 +56,7 @@ class HashNode:
         node.l_node = l_node
         node.r_node = r_node
         node.hash_str = node._hash_node(l_node, r_node)
+        return node
 
     def _hash_node(self, l_node: str, r_node: str) -> str:
         data = str(self.hight)
@@ -58,43 +68,47 @@ class HashNode:
 
     def verify(self) -> bool:
         """Verify tree hash"""
-        return self._hash_node(self.l_node, self.l_node) == self.hash_str
-
-
-def _make_node_list(
-    hight, base_node_list: list[HashNode]
-) -> tuple[int, list[HashNode]]:
-    """Make hash tree single hight node"""
-    hight += 1
-    if len(base_node_list) > 1:
-        node_list = []
-        while base_node_list:
-            l_node, *base_node_list = base_node_list
-            l_node_str = l_node.hash_str
-            if base_node_list:
-                r_node, *base_node_list = base_node_list
-                r_node_str = r_node.hash_str
-            else:
-                r_node = None
-                r_node_str = None
-            node_list.append(HashNode.init_node(hight, l_node_str, r_node_str))
-        return hight, node_list
-    return base_node_list
+        return self._hash_node(self.l_node, self.r_node) == self.hash_str
+
+
+def level_nodes(levels: list[bytes], hight: int) -> list[HashNode]:
+    """HashNode objects of one level of built levels"""
+    level = levels[hight]
+    if not hight:
+        return [
+            HashNode(hash_str=get_digest(level, i).hex(), hight=0)
+            for i in range(level_size(level))
+        ]
+    children = levels[hight - 1]
+    child_count = level_size(children)
+    return [
+        HashNode(
+            hash_str=get_digest(level, i).hex(),
+            hight=hight,
+            l_node=get_digest(children, 2 * i).hex(),
+            r_node=(
+                get_digest(children, 2 * i + 1).hex()
+                if 2 * i + 1 < child_count
+                else None
+            ),
+        )
+        for i in range(level_size(level))
+    ]
 
 
 def make_root_node(node_list: list[HashNode]) -> tuple[str, dict[int, list[HashNode]]]:
     """Make hash tree root"""
-    hight = 0
-    node_hight_map = {}
-    while True:
-        node_hight_map[hight] = node_list
-        if len(node_list) == 1:
-            return node_list[0].hash_str, node_hight_map
-        hight, node_list = _make_node_list(hight, node_list)
+    levels = build_levels(b"".join(bytes.fromhex(node.hash_str) for node in node_list))
+    node_hight_map = {0: node_list}
+    for hight in range(1, len(levels)):
+        node_hight_map[hight] = level_nodes(levels, hight)
+    return root_hash(levels), node_hight_map
 
 
-def make_tree(data_list: list[bytes]) -> HashNode:
+def make_tree(data_list: list[bytes]) -> tuple[str, dict[int, list[HashNode]]]:
     """Make a hash ture which make sure data is sorted"""
     data_list.sort()
-    base_node_list = [HashNode(0, HashNode.hash(data)) for data in data_list]
-    return make_root_node(base_node_list)
+    levels = build_levels(hash_leaves(data_list))
+    return root_hash(levels), {
+        hight: level_nodes(levels, hight) for hight in range(len(levels))
+    }
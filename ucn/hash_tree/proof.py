@@ -0,0 +1,157 @@
+"""Inclusion proofs for hash trees built by ucn.hash_tree.builder
+
+A MultiProof proves any number of leaves at once. Going up the tree, a node
+needs its sibling only when the sibling cannot be computed from the proven
+leaves, so siblings shared by several leaves appear once and the proof of k
+leaves of an n leaf tree holds at most k * log2(n) digests. The verifier
+rehashes every ancestor of the proven leaves exactly once.
+"""
+from __future__ import annotations
+import binascii
+import struct
+from dataclasses import dataclass, field
+from hashlib import shake_256
+from typing import Iterable
+
+from ucn.hash_tree.builder import DIGEST_SIZE, get_digest, hash_data, level_size
+
+# Leaf count, number of proven leaves
+PROOF_HEADER = struct.Struct("<QI")
+PROOF_INDEX = struct.Struct("<Q")
+
+
+@dataclass
+class MultiProof:
+    """Inclusion proof of the leaves at indices of a tree of leaf_count leaves"""
+
+    leaf_count: int
+    # Sorted, distinct leaf indices
+    indices: list[int] = field(default_factory=list)
+    # Hex siblings in the order the verifier consumes them
+    siblings: list[str] = field(default_factory=list)
+
+    def encode(self) -> dict:
+        """Encode to dict"""
+        return {"n": self.leaf_count, "i": self.indices, "s": self.siblings}
+
+    @staticmethod
+    def decode(data: dict) -> MultiProof:
+        """Decode from dict"""
+        return MultiProof(data["n"], list(data["i"]), list(data["s"]))
+
+    def to_bytes(self) -> bytes:
+        """Serialize to raw indices and digests"""
+        return b"".join(
+            [PROOF_HEADER.pack(self.leaf_count, len(self.indices))]
+            + [PROOF_INDEX.pack(index) for index in self.indices]
+            + [bytes.fromhex(sibling) for sibling in self.siblings]
+        )
+
+    @staticmethod
+    def from_bytes(data: bytes) -> MultiProof:
+        """Deserialize from to_bytes"""
+        if len(data) < PROOF_HEADER.size:
+            raise ValueError("Truncated proof")
+        leaf_count, index_count = PROOF_HEADER.unpack_from(data)
+        offset = PROOF_HEADER.size + index_count * PROOF_INDEX.size
+        if len(data) < offset or (len(data) - offset) % DIGEST_SIZE:
+            raise ValueError("Truncated proof")
+        indices = [
+            PROOF_INDEX.unpack_from(data, PROOF_HEADER.size + i * PROOF_INDEX.size)[0]
+            for i in range(index_count)
+        ]
+        siblings = [
+            data[position : position + DIGEST_SIZE].hex()
+            for position in range(offset, len(data), DIGEST_SIZE)
+        ]
+        return MultiProof(leaf_count, indices, siblings)
+
+
+def prove_many(levels: list[bytes], indices: Iterable[int]) -> MultiProof:
+    """Proof of the leaves at indices of built levels"""
+    known = sorted(set(indices))
+    leaf_count = level_size(levels[0]) if levels else 0
+    if not known:
+        raise ValueError("No leaf to prove")
+    if known[0] < 0 or known[-1] >= leaf_count:
+        raise IndexError("Leaf index out of range")
+
+    siblings = []
+    for level in levels[:-1]:
+        size = level_size(level)
+        known_set = set(known)
+        for index in known:
+            sibling = index ^ 1
+            if sibling < size and sibling not in known_set:
+                siblings.append(get_digest(level, sibling).hex())
+        known = sorted({index >> 1 for index in known})
+    return MultiProof(leaf_count, sorted(set(indices)), siblings)
+
+
+def prove(levels: list[bytes], leaf_index: int) -> MultiProof:
+    """Proof of a single leaf of built levels"""
+    return prove_many(levels, [leaf_index])
+
+
+def verify_many(root: str, data_list: list[bytes], proof: MultiProof) -> bool:
+    """Check that data_list, given in the order of proof.indices, is in the tree"""
+    return verify_digests(root, [hash_data(data) for data in data_list], proof)
+
+
+def verify(root: str, data: bytes, proof: MultiProof) -> bool:
+    """Check that data is the leaf proven by a single leaf proof"""
+    return verify_many(root, [data], proof)
+
+
+def verify_digests(root: str, leaves: list[bytes], proof: MultiProof) -> bool:
+    """Check raw leaf digests, given in the order of proof.indices"""
+    indices = proof.indices
+    if not indices or len(leaves) != len(indices):
+        return False
+    if indices != sorted(set(indices)) or indices[0] < 0:
+        return False
+    if indices[-1] >= proof.leaf_count:
+        return False
+
+    # Proofs come from peers, malformed digests fail verification
+    try:
+        siblings = [bytes.fromhex(sibling) for sibling in proof.siblings]
+    except (TypeError, ValueError):
+        return False
+    if any(len(sibling) != DIGEST_SIZE for sibling in siblings):
+        return False
+    sibling_position = 0
+    known = list(zip(indices, leaves))
+    size = proof.leaf_count
+    hight = 0
+    while size > 1:
+        # The pairs of a level are hex encoded and hashed with one shared prefix
+        prefix = shake_256(str(hight + 1).encode("utf-8"))
+        parents = []
+        position = 0
+        while position < len(known):
+            index, digest = known[position]
+            position += 1
+            if index & 1:
+                if sibling_position == len(siblings):
+                    return False
+                pair = siblings[sibling_position] + digest
+                sibling_position += 1
+            elif position < len(known) and known[position][0] == index + 1:
+                pair = digest + known[position][1]
+                position += 1
+            elif index + 1 < size:
+                if sibling_position == len(siblings):
+                    return False
+                pair = digest + siblings[sibling_position]
+                sibling_position += 1
+            else:
+                # Last node of an odd level, hashed alone
+                pair = digest
+            hasher = prefix.copy()
+            hasher.update(binascii.hexlify(pair))
+            parents.append((index >> 1, hasher.digest(DIGEST_SIZE)))
+        known = parents
+        size = (size + 1) // 2
+        hight += 1
+    return sibling_position == len(siblings) and known[0][1].hex() == root
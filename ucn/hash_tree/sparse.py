@@ -0,0 +1,343 @@
+"""Sparse Merkle tree over string keys, e.g. account or bill URLs
+
+Every key owns one leaf position of a tree of 2^KEY_BITS leaves, given by the
+SHAKE-256 digest of the key. The tree is stored compacted: a subtree holding
+no key has the digest EMPTY_DIGEST and is not stored, and a subtree holding a
+single key is stored as a shortcut leaf, the leaf of that key placed at the
+height where its path splits from the paths of the other keys. Only the
+subtrees holding two keys or more are stored as nodes hashed from their
+children, like in ucn.hash_tree.builder, so n keys take about 2n nodes and an
+update rehashes about log2(n) of them.
+
+A node is addressed by its height and its prefix, the position of its leftmost
+leaf shifted right by the height. Updates are applied in batches: the nodes on
+the changed paths are read with one storage call per height, and every
+ancestor the changed keys share is rehashed once per batch. Proofs show the
+value of a key, or that it is unset, against the root.
+"""
+from __future__ import annotations
+import binascii
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from hashlib import shake_256
+from operator import itemgetter
+from typing import Iterable
+
+from ucn.hash_tree.builder import DIGEST_SIZE, hash_data
+
+KEY_BITS = DIGEST_SIZE * 8
+# Digest of an empty subtree at every height
+EMPTY_DIGEST = bytes(DIGEST_SIZE)
+EMPTY_ROOT = EMPTY_DIGEST.hex()
+# Hashers fed with the height of a node, copied for every node hashed
+_NODE_HASHERS = [shake_256(str(hight).encode("utf-8")) for hight in range(KEY_BITS + 1)]
+
+# (height, prefix) of a node
+NodeKey = tuple[int, int]
+
+
+def key_path(key: str) -> int:
+    """Leaf position of key"""
+    return int.from_bytes(shake_256(key.encode("utf-8")).digest(DIGEST_SIZE), "big")
+
+
+def _hash_node(hight: int, l_node: bytes, r_node: bytes) -> bytes:
+    # hash_node without encoding the height every time
+    hasher = _NODE_HASHERS[hight].copy()
+    hasher.update(binascii.hexlify(l_node + r_node))
+    return hasher.digest(DIGEST_SIZE)
+
+
+def hash_leaf(path: int, value: bytes) -> bytes:
+    """Leaf digest of a value, bound to its position"""
+    return hash_data(path.to_bytes(DIGEST_SIZE, "big") + value)
+
+
+# Stored nodes are records starting with the digest of the node. Records of
+# shortcut leaves are followed by the path of their key
+def _leaf_record(path: int, digest: bytes) -> bytes:
+    return digest + path.to_bytes(DIGEST_SIZE, "big")
+
+
+def _is_leaf(record: bytes) -> bool:
+    return len(record) != DIGEST_SIZE
+
+
+def _leaf_path(record: bytes) -> int:
+    return int.from_bytes(record[DIGEST_SIZE:], "big")
+
+
+class SMTStorage(metaclass=ABCMeta):
+    """Node records and the values of set keys"""
+
+    @abstractmethod
+    def get_nodes(self, node_keys: Iterable[NodeKey]) -> dict[NodeKey, bytes]:
+        """Records of the stored nodes among node_keys"""
+
+    @abstractmethod
+    def get_value(self, path: int) -> bytes or None:
+        """Value at a leaf position, None if unset"""
+
+    @abstractmethod
+    def write(
+        self,
+        nodes: dict[NodeKey, bytes or None],
+        values: dict[int, bytes or None],
+    ):
+        """Store node records and values, None removing them"""
+
+
+class MemorySMTStorage(SMTStorage):
+    """Node records and values in dicts"""
+
+    def __init__(self):
+        self.nodes: dict[NodeKey, bytes] = {}
+        self.values: dict[int, bytes] = {}
+
+    def get_nodes(self, node_keys: Iterable[NodeKey]) -> dict[NodeKey, bytes]:
+        return {
+            node_key: self.nodes[node_key]
+            for node_key in node_keys
+            if node_key in self.nodes
+        }
+
+    def get_value(self, path: int) -> bytes or None:
+        return self.values.get(path)
+
+    def write(
+        self,
+        nodes: dict[NodeKey, bytes or None],
+        values: dict[int, bytes or None],
+    ):
+        for items, target in ((nodes, self.nodes), (values, self.values)):
+            for key, value in items.items():
+                if value is None:
+                    target.pop(key, None)
+                else:
+                    target[key] = value
+
+
+@dataclass
+class SparseProof:
+    """Siblings from the node a key's path ends at up to the root
+
+    The path ends at the shortcut leaf of the key, at an empty subtree, or at
+    the shortcut leaf of another key, which is then given in leaf to prove the
+    key unset. Empty siblings are left out.
+    """
+
+    key: str
+    # Height of the node the path ends at
+    hight: int = KEY_BITS
+    # Bit h set if the sibling at height h is stored in siblings
+    bitmap: int = 0
+    # Hex non-empty siblings from the bottom up
+    siblings: list[str] = field(default_factory=list)
+    # Hex record of the shortcut leaf of another key the path ends at
+    leaf: str or None = None
+
+    def encode(self) -> dict:
+        """Encode to dict"""
+        return {
+            "k": self.key,
+            "h": self.hight,
+            "b": self.bitmap,
+            "s": self.siblings,
+            "l": self.leaf,
+        }
+
+    @staticmethod
+    def decode(data: dict) -> SparseProof:
+        """Decode from dict"""
+        return SparseProof(data["k"], data["h"], data["b"], list(data["s"]), data["l"])
+
+
+class SparseMerkleTree:
+    """Authenticated key value map with batched updates"""
+
+    def __init__(self, storage: SMTStorage = None):
+        self.storage = storage if storage is not None else MemorySMTStorage()
+
+    @property
+    def root(self) -> str:
+        """Hex root hash, EMPTY_ROOT without keys"""
+        record = self.storage.get_nodes([(KEY_BITS, 0)]).get((KEY_BITS, 0))
+        return EMPTY_ROOT if record is None else record[:DIGEST_SIZE].hex()
+
+    def get(self, key: str) -> bytes or None:
+        """Value of key, None if unset"""
+        return self.storage.get_value(key_path(key))
+
+    def set(self, key: str, value: bytes or None) -> str:
+        """Set or with None unset a key and return the new root"""
+        return self.update({key: value})
+
+    def update(self, items: dict[str, bytes or None]) -> str:
+        """Set or with None unset many keys at once and return the new root"""
+        leaves = {}
+        values = {}
+        for key, value in items.items():
+            path = key_path(key)
+            values[path] = value
+            leaves[path] = None if value is None else hash_leaf(path, value)
+        if not leaves:
+            return self.root
+        changes = sorted(leaves.items())
+        records = self._read_paths([path for path, _ in changes])
+        nodes: dict[NodeKey, bytes or None] = {}
+
+        def rewrite(
+            hight: int, prefix: int, changes: list[tuple[int, bytes or None]]
+        ) -> bytes or None:
+            # New record of the node over changes, the sorted (path, leaf digest or
+            # None) below it. Records below the node are written to nodes, its own
+            # record is written by the caller
+            record = records.get((hight, prefix))
+            if record is not None and _is_leaf(record):
+                # A shortcut leaf is pushed down along with the changes
+                leaf_path = _leaf_path(record)
+                position = bisect_left(changes, leaf_path, key=itemgetter(0))
+                if position == len(changes) or changes[position][0] != leaf_path:
+                    changes = (
+                        changes[:position]
+                        + [(leaf_path, record[:DIGEST_SIZE])]
+                        + changes[position:]
+                    )
+                record = None
+            if record is None:
+                changes = [change for change in changes if change[1] is not None]
+                if not changes:
+                    return None
+                if len(changes) == 1:
+                    return _leaf_record(*changes[0])
+
+            # First change in the right child
+            split = bisect_left(
+                changes, ((prefix << 1) | 1) << (hight - 1), key=itemgetter(0)
+            )
+            children = []
+            for child_prefix, child_changes in (
+                (prefix << 1, changes[:split]),
+                ((prefix << 1) | 1, changes[split:]),
+            ):
+                child_key = (hight - 1, child_prefix)
+                if child_changes:
+                    child = rewrite(hight - 1, child_prefix, child_changes)
+                    nodes[child_key] = child
+                else:
+                    child = records.get(child_key)
+                children.append((child_key, child))
+
+            (l_key, l_node), (r_key, r_node) = children
+            if l_node is None and r_node is None:
+                return None
+            # A lone shortcut leaf moves up to the node
+            if l_node is None and _is_leaf(r_node):
+                nodes[r_key] = None
+                return r_node
+            if r_node is None and _is_leaf(l_node):
+                nodes[l_key] = None
+                return l_node
+            return _hash_node(
+                hight,
+                EMPTY_DIGEST if l_node is None else l_node[:DIGEST_SIZE],
+                EMPTY_DIGEST if r_node is None else r_node[:DIGEST_SIZE],
+            )
+
+        root = rewrite(KEY_BITS, 0, changes)
+        nodes[(KEY_BITS, 0)] = root
+        self.storage.write(nodes, values)
+        return EMPTY_ROOT if root is None else root[:DIGEST_SIZE].hex()
+
+    def _read_paths(self, paths: list[int]) -> dict[NodeKey, bytes]:
+        # Records of the nodes on paths down to where they leave the stored
+        # inner nodes, with the siblings of those nodes, one storage call per height
+        records = self.storage.get_nodes([(KEY_BITS, 0)])
+        hight = KEY_BITS
+        while paths and hight:
+            paths = [
+                path
+                for path in paths
+                if (hight, path >> hight) in records
+                and not _is_leaf(records[(hight, path >> hight)])
+            ]
+            children = {
+                (hight - 1, ((path >> hight) << 1) | bit)
+                for path in paths
+                for bit in (0, 1)
+            }
+            if children:
+                records.update(self.storage.get_nodes(children))
+            hight -= 1
+        return records
+
+    def prove(self, key: str) -> SparseProof:
+        """Proof of the value of key, or that it is unset"""
+        path = key_path(key)
+        # Every node on the path and every sibling, read in one call
+        records = self.storage.get_nodes(
+            [(hight, path >> hight) for hight in range(KEY_BITS + 1)]
+            + [(hight, (path >> hight) ^ 1) for hight in range(KEY_BITS)]
+        )
+        hight = KEY_BITS
+        record = records.get((hight, 0))
+        while record is not None and not _is_leaf(record) and hight:
+            hight -= 1
+            record = records.get((hight, path >> hight))
+
+        proof = SparseProof(key, hight)
+        if record is not None and _leaf_path(record) != path:
+            proof.leaf = record.hex()
+        for hight in range(hight, KEY_BITS):
+            sibling = records.get((hight, (path >> hight) ^ 1))
+            if sibling is not None:
+                proof.bitmap |= 1 << hight
+                proof.siblings.append(sibling[:DIGEST_SIZE].hex())
+        return proof
+
+
+def verify(root: str, key: str, value: bytes or None, proof: SparseProof) -> bool:
+    """Check that key has value under root, None checking that key is unset"""
+    if proof.key != key or not 0 <= proof.hight <= KEY_BITS:
+        return False
+    if proof.bitmap >> KEY_BITS or proof.bitmap & ((1 << proof.hight) - 1):
+        return False
+    if bin(proof.bitmap).count("1") != len(proof.siblings):
+        return False
+    path = key_path(key)
+    # Proofs come from peers, malformed digests fail verification
+    try:
+        siblings = [bytes.fromhex(sibling) for sibling in proof.siblings]
+        leaf = None if proof.leaf is None else bytes.fromhex(proof.leaf)
+    except (TypeError, ValueError):
+        return False
+    if any(len(sibling) != DIGEST_SIZE for sibling in siblings):
+        return False
+
+    if value is not None:
+        if leaf is not None:
+            return False
+        digest = hash_leaf(path, value)
+    elif leaf is None:
+        digest = EMPTY_DIGEST
+    else:
+        # The shortcut leaf of another key in the subtree of the path
+        if len(leaf) != 2 * DIGEST_SIZE:
+            return False
+        leaf_path = _leaf_path(leaf)
+        if leaf_path == path or leaf_path >> proof.hight != path >> proof.hight:
+            return False
+        digest = leaf[:DIGEST_SIZE]
+
+    siblings = iter(siblings)
+    for hight in range(proof.hight, KEY_BITS):
+        if (proof.bitmap >> hight) & 1:
+            sibling = next(siblings)
+        else:
+            sibling = EMPTY_DIGEST
+        if (path >> hight) & 1:
+            digest = _hash_node(hight + 1, sibling, digest)
+        else:
+            digest = _hash_node(hight + 1, digest, sibling)
+    return digest.hex() == root